@@ -1,8 +1,16 @@
 import logging
+import math
 
 from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from aiogram.utils.markdown import hcode, hpre
 from django.conf import settings
 
+from apps.bot.services import loop_monitor as loop_monitor_module
+from apps.bot.services.loop_monitor import LOOP_LAG, LOOP_STALLS
+from apps.bot.services.profiler import PROFILES_WRITTEN, profiler
+
 logger = logging.getLogger(__name__)
 admin_router = Router(name="admin-commands-router")
 
@@ -13,4 +21,53 @@ if settings.ADMIN_ID:
 else:
     logger.warning("ADMIN_ID не указан в .env, админ-команды будут недоступны.")
     # Если ADMIN_ID не найден, этот фильтр будет всегда возвращать False, блокируя доступ.
-    admin_router.message.filter(lambda message: False)
\ No newline at end of file
+    admin_router.message.filter(lambda message: False)
+
+
+@admin_router.message(Command("lag"))
+async def handle_loop_lag(message: Message):
+    """
+    Показывает задержку event loop (p50/p95/p99) и последний снимок стека при блокировке.
+    """
+    quantiles = LOOP_LAG.quantiles()
+    if not quantiles:
+        await message.reply("Мониторинг задержки event loop отключен или еще не собрал данных.")
+        return
+
+    lines = [
+        "⏱ Задержка event loop:",
+        *(f"p{int(q * 100)}: {hcode(f'{value * 1000:.1f} мс')}" for q, value in quantiles.items()),
+        f"Блокировок дольше порога: {int(LOOP_STALLS.value())}",
+    ]
+    monitor = loop_monitor_module.loop_monitor
+    if monitor and monitor.samples:
+        sample = monitor.samples[-1]
+        # Telegram ограничивает длину сообщения, поэтому показываем только конец стека.
+        lines += [f"\nПоследняя блокировка ({sample.blocked_for * 1000:.0f} мс):", hpre(sample.stack[-3000:])]
+    await message.reply("\n".join(lines))
+
+
+@admin_router.message(Command("profile"))
+async def handle_profile(message: Message, command: CommandObject):
+    """
+    Управляет выборочным профилированием: `/profile 0.05` профилирует 5% сообщений,
+    `/profile 0` отключает профилирование, `/profile` без аргумента показывает состояние.
+    """
+    if command.args:
+        try:
+            sample_rate = float(command.args.strip().replace(',', '.'))
+            # `float` принимает nan и inf, а ограничение диапазона в профилировщике nan не отсекает.
+            if not math.isfinite(sample_rate) or not 0 <= sample_rate <= 1:
+                raise ValueError(sample_rate)
+            profiler.sample_rate = sample_rate
+        except ValueError:
+            await message.reply("Укажите долю запросов от 0 до 1, например: /profile 0.05")
+            return
+        logger.info(f"Доля профилируемых сообщений изменена на {profiler.sample_rate}")
+
+    state = f"{profiler.sample_rate:.2%} сообщений" if profiler.sample_rate else "отключено"
+    await message.reply(
+        f"🔬 Профилирование: {hcode(state)}\n"
+        f"Сохранено профилей: {int(PROFILES_WRITTEN.value())}\n"
+        f"Отчет: {hcode('python manage.py profile_report')}"
+    )
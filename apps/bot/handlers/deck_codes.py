@@ -1,24 +1,47 @@
 import re
+import html
+import time
 import logging
 import asyncio
-from typing import List, Tuple, Optional
+from typing import List, Set, Tuple, Optional
 
 from aiogram import Router, F
-from aiogram.enums import ChatType, ParseMode
-from aiogram.filters import Command
+from aiogram.enums import ChatMemberStatus, ChatType, ParseMode
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, BufferedInputFile, InputMediaPhoto
 from aiogram.utils.markdown import hbold, hcode
+from django.conf import settings
 
-from apps.users.models import TelegramUser, Deck, UserActivity
+from apps.users.models import ChatSettings, TelegramUser, Deck, UserActivity
 from apps.cards.models import Card
-from apps.bot.services.hoyolab import decode_deck_code
-from apps.bot.services.deck_utils import calculate_resonances
-from apps.bot.services.image_generator import create_deck_image
-from apps.users.services import log_user_activity
+from apps.bot.services.admission import AdmissionRejected, admission
+from apps.bot.services.catalog import catalog
+from apps.bot.services.chat_settings import get_output_mode, set_output_mode
+from apps.bot.services.db import get_store
+from apps.bot.services.encoder import default_encoder
+from apps.bot.services.deck_utils import (
+    calculate_resonances, get_cards_from_ids_with_duplicates, get_or_create_deck,
+)
+from apps.bot.services.image_generator import create_collage, create_deck_image
+from apps.bot.services.metrics import DECK_ERRORS, MESSAGES_PROCESSED, record_cache, stage_timer
+from apps.bot.services.profiler import profiler
+from apps.bot.services.render_cache import render_cache
+from apps.bot.services.render_queue import render_queue
+from apps.cards.services.invalidation import CardChangeEvent
 
 router = Router(name="deck-codes-router")
 DECK_CODE_REGEX = re.compile(r'([^.,\'\"\s\n\t\r]{68})')
 MAX_CODES_PER_MESSAGE = 20  # Ограничение на количество кодов в одном сообщении для предотвращения спама
+# Сколько самых популярных колод перерисовывать в фоне после инвалидации их изображений (0 — отключено).
+RENDER_REFRESH_TOP_N: int = getattr(settings, 'RENDER_REFRESH_TOP_N', 5)
+PROGRESSIVE_BATCH_SIZE = 3
+PROGRESS_EDIT_INTERVAL = 2.0  # Минимальный интервал между правками сообщения о прогрессе, с.
+RESOLVE_CONCURRENCY = 4  # Сколько кодов одного сообщения раскодируется одновременно.
+CAPTION_LIMIT = 1024  # Ограничение Telegram на длину подписи к фото (без HTML-разметки).
+HTML_TAG_REGEX = re.compile(r'<[^>]+>')
+# Фоновые перерисовки после инвалидации: event loop хранит на задачи только слабые ссылки.
+_refresh_tasks: Set[asyncio.Task] = set()
 
 HELP_TEXT_PRIVATE = (
     f"👋 Привет! Я бот для работы с колодами <b>Genshin Impact TCG</b>.\n\n"
@@ -26,93 +49,139 @@ HELP_TEXT_PRIVATE = (
     f"1. Расшифрую ее состав.\n"
     f"2. Рассчитаю элементальные резонансы.\n"
     f"3. Сгенерирую и пришлю красивое изображение со всеми картами.\n\n"
-    f"Ты можешь отправить до {MAX_CODES_PER_MESSAGE} кодов в одном сообщении, и я обработаю их все!"
+    f"Ты можешь отправить до {MAX_CODES_PER_MESSAGE} кодов в одном сообщении, и я обработаю их все!\n\n"
+    f"Несколько колод можно получить одним изображением: /kkc и коды колод. "
+    f"Способ вывода по умолчанию меняется командой /mode."
 )
+OUTPUT_MODE_NAMES = {
+    ChatSettings.DeckOutput.PROGRESSIVE: "по мере готовности",
+    ChatSettings.DeckOutput.ALBUM: "альбомом",
+    ChatSettings.DeckOutput.COLLAGE: "одним изображением",
+}
 
 
-async def get_cards_from_ids_with_duplicates(card_ids: List[int]) -> List[Card]:
+async def render_deck(deck: Deck) -> Tuple[bytes, List[Card]]:
     """
-    Эффективно получает список объектов Card из списка ID, сохраняя дубликаты
-    и предзагружая связанные теги для оптимизации.
+    Возвращает JPEG-изображение колоды и список карт персонажей (для подписи).
+    Готовые изображения берутся из `render_cache`; при промахе колода рендерится заново —
+    процессами `renderworker`, если включен `BOT_REMOTE_RENDER`, иначе в потоке бота.
     """
-    if not card_ids:
-        return []
+    with stage_timer("card_fetch"):
+        character_cards = await get_cards_from_ids_with_duplicates(deck.character_card_ids)
+
+    cached_image = render_cache.get(deck.deck_code)
+    record_cache("render", hit=cached_image is not None)
+    if cached_image is not None:
+        return cached_image, character_cards
+
+    image = await render_queue.render(deck.deck_code) if render_queue is not None else None
+    if image is None:
+        with stage_timer("card_fetch"):
+            action_cards = await get_cards_from_ids_with_duplicates(deck.action_card_ids)
+        with stage_timer("resonances"):
+            resonances = calculate_resonances(character_cards)
+
+        with stage_timer("render"):
+            image_bytes = await asyncio.to_thread(
+                create_deck_image, character_cards, action_cards, resonances
+            )
+        image = image_bytes.getvalue()
+    render_cache.put(deck.deck_code, [*deck.character_card_ids, *deck.action_card_ids], image)
+    return image, character_cards
 
-    unique_card_ids = set(card_ids)
-    cards_qs = Card.objects.filter(
-        card_id__in=unique_card_ids
-    ).prefetch_related('tags')
-    cards_map = {card.card_id: card async for card in cards_qs}
 
-    result_cards = [cards_map[card_id] for card_id in card_ids if card_id in cards_map]
+async def _refresh_rendered_decks(deck_codes: List[str]) -> None:
+    """Перерисовывает в фоне изображения самых популярных колод после инвалидации."""
+    async for deck in Deck.objects.filter(deck_code__in=deck_codes):
+        try:
+            await render_deck(deck)
+        except Exception:
+            logging.exception(f"Не удалось перерисовать колоду {deck.deck_code}")
+    logging.info(f"Перерисовано колод после изменения карт: {len(deck_codes)}")
 
-    return result_cards
 
+def _on_refresh_done(task: asyncio.Task) -> None:
+    _refresh_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("Ошибка фоновой перерисовки колод", exc_info=task.exception())
 
-async def get_or_create_deck(code: str, user: TelegramUser) -> Tuple[Optional[Deck], Optional[str]]:
+
+def invalidate_rendered_decks(event: CardChangeEvent) -> None:
     """
-    Проверяет наличие колоды в БД (кэш). Если нет - обращается к API,
-    проверяет наличие всех карт в нашей БД и создает новую запись Deck.
-    Возвращает (Deck, None) при успехе или (None, "сообщение об ошибке") при неудаче.
+    Обработчик шины инвалидации: сбрасывает изображения только тех колод, которые
+    содержат измененные карты, и ставит перерисовку самых популярных из них.
     """
+    removed = render_cache.invalidate_cards(event.card_ids)
+    if not removed:
+        return
+    logging.info(f"Сброшено изображений колод из кэша: {len(removed)}")
+
+    hottest = sorted(removed, key=removed.get, reverse=True)[:RENDER_REFRESH_TOP_N]
+    if not hottest:
+        return
     try:
-        deck = await Deck.objects.aget(deck_code=code)
-        return deck, None
-    except Deck.DoesNotExist:
-        pass
+        task = asyncio.get_running_loop().create_task(_refresh_rendered_decks(hottest))
+    except RuntimeError:
+        # Событие пришло не из event loop (например, локальная доставка в синхронном коде).
+        return
+    _refresh_tasks.add(task)
+    task.add_done_callback(_on_refresh_done)
 
-    decoded_deck, error_message = await decode_deck_code(code)
-    if error_message:
-        return None, error_message
-    if not decoded_deck:
-        return None, "API не вернуло данные о колоде."
-
-    all_api_ids = set(decoded_deck.character_ids) | set(decoded_deck.action_ids)
-    cards_in_db_count = await Card.objects.filter(card_id__in=all_api_ids).acount()
-
-    if cards_in_db_count != len(all_api_ids):
-        found_ids = {c.card_id async for c in Card.objects.filter(card_id__in=all_api_ids)}
-        missing_ids = all_api_ids - found_ids
-        logging.warning(f"Не найдены карты с ID: {missing_ids}")
-        return None, f"Некоторые карты отсутствуют в базе. ID: {missing_ids}"
-
-    deck = await Deck.objects.acreate(
-        deck_code=code,
-        owner=user,
-        character_card_ids=decoded_deck.character_ids,
-        action_card_ids=decoded_deck.action_ids
-    )
-    return deck, None
+
+async def process_message_with_codes(message: Message, text_to_parse: str, output: Optional[str] = None):
+    """
+    Пропускает сообщение через контроль допуска: небольшие, закэшированные и личные запросы
+    обрабатываются раньше больших пачек, а при перегрузке пользователь получает просьбу подождать.
+    `output` — способ вывода нескольких колод (`ChatSettings.DeckOutput`); по умолчанию берется из настроек чата.
+    """
+    deck_codes = DECK_CODE_REGEX.findall(text_to_parse)[:MAX_CODES_PER_MESSAGE]
+    cold_codes = sum(1 for code in deck_codes if code not in render_cache)
+    penalty = admission.penalty(cold_codes, group=message.chat.type != ChatType.PRIVATE)
+    try:
+        await admission.run(
+            message.from_user.id, len(deck_codes), penalty,
+            lambda: _process_admitted_message(message, text_to_parse, output),
+        )
+    except AdmissionRejected as e:
+        logging.info(f"Сообщение пользователя {message.from_user.id} отклонено: {e.reason}")
+        await message.reply(e.user_message)
 
 
-async def process_message_with_codes(message: Message, text_to_parse: str):
+async def _process_admitted_message(message: Message, text_to_parse: str, output: Optional[str] = None):
     """
     Основная логика обработки сообщения с кодами, генерации изображений и отправки альбома.
     """
+    async with profiler.maybe_profile("process_message_with_codes") as profile_info:
+        with stage_timer("total"):
+            deck_count = await _process_message_with_codes(message, text_to_parse, output)
+        if profile_info is not None:
+            profile_info.update(deck_count=deck_count, chat_type=message.chat.type)
+
+
+async def _process_message_with_codes(message: Message, text_to_parse: str, output: Optional[str] = None) -> int:
+    """Возвращает количество кодов колод, найденных в сообщении (после ограничения)."""
+    MESSAGES_PROCESSED.inc(message.chat.type)
     user_data = message.from_user
-    user, _ = await TelegramUser.objects.aupdate_or_create(
-        user_id=user_data.id,
-        defaults={
-            'username': user_data.username,
-            'first_name': user_data.first_name,
-            'last_name': user_data.last_name,
-        }
-    )
+    with stage_timer("user_upsert"):
+        user = await get_store().upsert_user(
+            user_data.id, user_data.username, user_data.first_name, user_data.last_name
+        )
 
-    await log_user_activity(
+    await get_store().log_activity(
         user,
         UserActivity.ActivityType.MESSAGE_RECEIVED,
         {'text': message.text or "Сообщение без текста"}
     )
 
-    deck_codes = DECK_CODE_REGEX.findall(text_to_parse)
+    with stage_timer("extract"):
+        deck_codes = DECK_CODE_REGEX.findall(text_to_parse)
     if not deck_codes:
-        await log_user_activity(user, UserActivity.ActivityType.EMPTY_REQUEST, {'text': text_to_parse})
+        await get_store().log_activity(user, UserActivity.ActivityType.EMPTY_REQUEST, {'text': text_to_parse})
         if message.chat.type == ChatType.PRIVATE:
             await message.reply(HELP_TEXT_PRIVATE)
         else:
             await message.reply("Не найдены коды колод в вашем сообщении.")
-        return
+        return 0
 
     if len(deck_codes) > MAX_CODES_PER_MESSAGE:
         await message.reply(
@@ -121,72 +190,272 @@ async def process_message_with_codes(message: Message, text_to_parse: str):
         )
         deck_codes = deck_codes[:MAX_CODES_PER_MESSAGE]
 
-    media_items: List[InputMediaPhoto] = []
-    caption_lines: List[str] = []
-    error_messages: List[str] = []
-
     processing_message = await message.reply(f"Начинаю обработку {len(deck_codes)} колод...")
 
-    for index, code in enumerate(deck_codes):
+    output = output or await get_output_mode(message.chat.id)
+    if len(deck_codes) > 1 and output == ChatSettings.DeckOutput.COLLAGE:
+        await _deliver_collage(message, processing_message, user, deck_codes)
+    elif len(deck_codes) > 1 and output == ChatSettings.DeckOutput.PROGRESSIVE:
+        await _deliver_progressively(message, processing_message, user, deck_codes)
+    else:
+        await _deliver_album(message, processing_message, user, deck_codes)
+    return len(deck_codes)
+
+
+async def _resolve_deck(code: str, user: TelegramUser) -> Tuple[Optional[Deck], Optional[str]]:
+    """
+    Получает колоду по коду и записывает результат в активность пользователя.
+    Возвращает (Deck, None) или (None, "текст ошибки для пользователя").
+    """
+    with stage_timer("get_or_create_deck"):
         deck_obj, error_message = await get_or_create_deck(code, user)
 
-        if error_message:
-            error_text = f"❌ Ошибка с кодом {hcode(code)}:\n   {error_message}"
-            error_messages.append(error_text)
-            await log_user_activity(
-                user,
-                UserActivity.ActivityType.INVALID_CODE,
-                {'code': code, 'error': error_message}
-            )
-            continue
-        if not deck_obj:
-            error_text = f"❌ Неизвестная ошибка с кодом {hcode(code)}"
-            error_messages.append(error_text)
-            await log_user_activity(
-                user,
-                UserActivity.ActivityType.ERROR_OCCURRED,
-                {'code': code, 'context': 'get_or_create_deck_returned_none'}
-            )
-            continue
+    if error_message:
+        DECK_ERRORS.inc("invalid_code")
+        await get_store().log_activity(
+            user,
+            UserActivity.ActivityType.INVALID_CODE,
+            {'code': code, 'error': error_message}
+        )
+        return None, error_message
+    if not deck_obj:
+        DECK_ERRORS.inc("unknown")
+        await get_store().log_activity(
+            user,
+            UserActivity.ActivityType.ERROR_OCCURRED,
+            {'code': code, 'context': 'get_or_create_deck_returned_none'}
+        )
+        return None, "Неизвестная ошибка"
 
-        await log_user_activity(user, UserActivity.ActivityType.DECK_PROCESSED, {'code': code})
+    await get_store().log_activity(user, UserActivity.ActivityType.DECK_PROCESSED, {'code': code})
+    return deck_obj, None
 
-        character_cards = await get_cards_from_ids_with_duplicates(deck_obj.character_card_ids)
-        action_cards = await get_cards_from_ids_with_duplicates(deck_obj.action_card_ids)
 
-        resonances = calculate_resonances(character_cards)
+async def _resolve_all(deck_codes: List[str], user: TelegramUser) -> List[Tuple[Optional[Deck], Optional[str]]]:
+    """Получает колоды по всем кодам сообщения, не более `RESOLVE_CONCURRENCY` одновременно."""
+    semaphore = asyncio.Semaphore(RESOLVE_CONCURRENCY)
 
-        image_bytes = await asyncio.to_thread(
-            create_deck_image, character_cards, action_cards, resonances
-        )
-        photo_file = BufferedInputFile(image_bytes.read(), filename=f"{code}.jpg")
+    async def resolve(code: str) -> Tuple[Optional[Deck], Optional[str]]:
+        async with semaphore:
+            return await _resolve_deck(code, user)
+
+    return await asyncio.gather(*(resolve(code) for code in deck_codes))
+
+
+def _caption_line(index: int, code: str, character_names: List[str]) -> str:
+    caption_chars = ", ".join([hbold(name) for name in character_names])
+    return f"{index}) {caption_chars} {hcode(code)}"
+
+
+def _caption_length(caption: str) -> int:
+    """Длина подписи так, как ее считает Telegram: без HTML-тегов и с раскрытыми сущностями."""
+    return len(html.unescape(HTML_TAG_REGEX.sub("", caption)))
+
+
+async def _send_photos(message: Message, photos: List[InputMediaPhoto], caption: str) -> None:
+    """
+    Отправляет одно фото или альбом (частями по 10) с общей подписью у первого фото.
+    Подпись длиннее `CAPTION_LIMIT` отправляется отдельным сообщением после изображений.
+    """
+    long_caption = None
+    if _caption_length(caption) > CAPTION_LIMIT:
+        long_caption, caption = caption, "Список колод — в следующем сообщении."
+    with stage_timer("send"):
+        if len(photos) == 1:
+            await message.reply_photo(photo=photos[0].media, caption=caption)
+        else:
+            await _send_album(message, photos, caption)
+        if long_caption is not None:
+            await message.reply(long_caption)
+
+
+async def _send_album(message: Message, photos: List[InputMediaPhoto], caption: str) -> None:
+    photos[0].caption = caption
+    photos[0].parse_mode = ParseMode.HTML
 
-        media_items.append(InputMediaPhoto(media=photo_file))
+    # Части альбома отправляются по очереди: подпись в первой части, и порядок колод сохраняется.
+    for i in range(0, len(photos), 10):
+        await message.reply_media_group(media=photos[i:i + 10])
 
+
+async def _deliver_album(
+        message: Message, processing_message: Message, user: TelegramUser, deck_codes: List[str]
+) -> None:
+    """Обрабатывает все коды и отправляет изображения одним альбомом, ошибки — отдельным сообщением."""
+    media_items: List[InputMediaPhoto] = []
+    caption_lines: List[str] = []
+    error_messages: List[str] = []
+
+    for index, code in enumerate(deck_codes):
+        deck_obj, error_message = await _resolve_deck(code, user)
+        if error_message:
+            error_messages.append(f"❌ Ошибка с кодом {hcode(code)}:\n   {error_message}")
+            continue
+
+        image, character_cards = await render_deck(deck_obj)
+        media_items.append(InputMediaPhoto(media=BufferedInputFile(image, filename=f"{code}.{default_encoder().extension}")))
         unique_char_names = sorted(list(set(card.name for card in character_cards)))
-        caption_chars = ", ".join([hbold(name) for name in unique_char_names])
-        caption_lines.append(f"{index + 1}) {caption_chars} {hcode(code)}")
+        caption_lines.append(_caption_line(index + 1, code, unique_char_names))
 
     await processing_message.delete()
 
-    # --- Отправка результатов ---
     if media_items:
-        final_caption = "\n\n".join(caption_lines)
+        await _send_photos(message, media_items, "\n\n".join(caption_lines))
+    if error_messages:
+        await message.reply("Возникли следующие ошибки:\n\n" + "\n".join(error_messages))
+
 
-        if len(media_items) == 1:
-            await message.reply_photo(photo=media_items[0].media, caption=final_caption)
+class _ProgressMessage:
+    """Сообщение «Начинаю обработку...», превращенное в сводку по колодам с прогрессом отправки."""
+
+    def __init__(self, message: Message, summary: str, total: int, live: bool = True):
+        self.message = message
+        self.summary = summary
+        self.total = total
+        # В группах лимит Telegram — 20 сообщений в минуту, и каждая правка отнимает его у фотографий,
+        # поэтому там сводка публикуется один раз, без прогресса.
+        self.live = live
+        self._last_edit = 0.0
+
+    async def update(self, delivered: int, force: bool = False) -> None:
+        if not self.live and self._last_edit:
+            return
+        # Правки сообщения делят лимит чата с фотографиями, поэтому промежуточный прогресс прореживается.
+        now = time.monotonic()
+        if not force and now - self._last_edit < PROGRESS_EDIT_INTERVAL:
+            return
+        self._last_edit = now
+        if not self.total or not self.live:
+            footer = ""
+        elif delivered >= self.total:
+            footer = "\n\n✅ Все изображения отправлены."
         else:
-            media_items[0].caption = final_caption
-            media_items[0].parse_mode = ParseMode.HTML
+            footer = f"\n\n⏳ Изображения: {delivered}/{self.total}"
+        try:
+            await self.message.edit_text(self.summary + footer)
+        except TelegramBadRequest as e:
+            # Например, «message is not modified» или сообщение уже удалено.
+            logging.debug(f"Не удалось обновить сообщение о прогрессе: {e}")
+
 
-            for i in range(0, len(media_items), 10):
-                chunk = media_items[i:i + 10]
-                await message.reply_media_group(media=chunk)
+async def _deliver_progressively(
+        message: Message, processing_message: Message, user: TelegramUser, deck_codes: List[str]
+) -> None:
+    """
+    Прогрессивная отправка: сначала текстовая сводка (имена персонажей из справочника карт),
+    затем изображения небольшими партиями по мере готовности. Первое изображение уходит отдельно,
+    чтобы первый результат появлялся как можно раньше; прогресс отражается в сообщении со сводкой.
+    """
+    resolved = await _resolve_all(deck_codes, user)
+    entries = await catalog.get_many(
+        card_id for deck_obj, _ in resolved if deck_obj for card_id in deck_obj.character_card_ids
+    )
 
+    summary_lines: List[str] = []
+    ready: List[Tuple[str, Deck, str]] = []
+    for index, (code, (deck_obj, error_message)) in enumerate(zip(deck_codes, resolved), start=1):
+        if error_message:
+            summary_lines.append(f"{index}) ❌ {hcode(code)}: {error_message}")
+            continue
+        names = sorted({entries[card_id].name for card_id in deck_obj.character_card_ids if card_id in entries})
+        line = _caption_line(index, code, names)
+        summary_lines.append(line)
+        ready.append((code, deck_obj, line))
+
+    progress = _ProgressMessage(
+        processing_message, "\n".join(summary_lines), len(ready), live=message.chat.type == ChatType.PRIVATE
+    )
+    await progress.update(0, force=True)
+    if not ready:
+        return
+
+    rendered: "asyncio.Queue[Optional[Tuple[InputMediaPhoto, str]]]" = asyncio.Queue()
+
+    async def sender() -> None:
+        delivered = 0
+        pending: List[Tuple[InputMediaPhoto, str]] = []
+        finished = False
+        while not finished or pending:
+            # Первое изображение уходит сразу, дальше — партии не меньше PROGRESSIVE_BATCH_SIZE
+            # плюс все, что успело отрендериться: чем медленнее отправка, тем крупнее партии.
+            need = 1 if delivered == 0 else PROGRESSIVE_BATCH_SIZE
+            while not finished and len(pending) < need:
+                if rendered.empty():
+                    # Пока рендер догоняет, свободный лимит чата тратим на обновление прогресса.
+                    await progress.update(delivered)
+                item = await rendered.get()
+                if item is None:
+                    finished = True
+                else:
+                    pending.append(item)
+            while not finished and not rendered.empty():
+                item = rendered.get_nowait()
+                if item is None:
+                    finished = True
+                else:
+                    pending.append(item)
+
+            batch, pending = pending[:10], pending[10:]
+            if batch:
+                await _send_photos(message, [photo for photo, _ in batch], "\n\n".join(line for _, line in batch))
+                delivered += len(batch)
+        await progress.update(delivered, force=True)
+
+    # Отправка идет параллельно с рендером следующих колод.
+    sender_task = asyncio.create_task(sender())
+    try:
+        for code, deck_obj, line in ready:
+            image, _ = await render_deck(deck_obj)
+            rendered.put_nowait((InputMediaPhoto(media=BufferedInputFile(image, filename=f"{code}.{default_encoder().extension}")), line))
+    finally:
+        rendered.put_nowait(None)
+        await sender_task
+
+
+async def _deliver_collage(
+        message: Message, processing_message: Message, user: TelegramUser, deck_codes: List[str]
+) -> None:
+    """
+    Отправляет все колоды одним изображением-сеткой: колоды в сетке пронумерованы так же,
+    как строки подписи. Изображения колод берутся из `render_cache` (или рендерятся
+    из закэшированных тайлов карт) и только уменьшаются, поэтому коллаж собирается быстро,
+    а вместо альбома из 20 фото загружается один файл.
+    """
+    resolved = await _resolve_all(deck_codes, user)
+    images: List[bytes] = []
+    numbers: List[int] = []
+    caption_lines: List[str] = []
+    error_messages: List[str] = []
+    for index, (code, (deck_obj, error_message)) in enumerate(zip(deck_codes, resolved), start=1):
+        if error_message:
+            error_messages.append(f"❌ Ошибка с кодом {hcode(code)}:\n   {error_message}")
+            continue
+        image, character_cards = await render_deck(deck_obj)
+        images.append(image)
+        numbers.append(index)
+        caption_lines.append(_caption_line(index, code, sorted({card.name for card in character_cards})))
+
+    if len(images) > 1:
+        with stage_timer("collage"):
+            collage = await asyncio.to_thread(create_collage, images, numbers)
+        photo = collage.getvalue()
+    else:
+        photo = images[0] if images else None
+
+    await processing_message.delete()
+
+    if photo is not None:
+        media = InputMediaPhoto(media=BufferedInputFile(photo, filename=f"decks.{default_encoder().extension}"))
+        await _send_photos(message, [media], "\n\n".join(caption_lines))
     if error_messages:
         await message.reply("Возникли следующие ошибки:\n\n" + "\n".join(error_messages))
 
 
+async def _is_chat_admin(message: Message) -> bool:
+    member = await message.bot.get_chat_member(message.chat.id, message.from_user.id)
+    return member.status in (ChatMemberStatus.CREATOR, ChatMemberStatus.ADMINISTRATOR)
+
+
 @router.message(Command("kk", "кк", ignore_case=True), F.chat.type.in_({ChatType.GROUP, ChatType.SUPERGROUP}))
 async def handle_deck_codes_group(message: Message, command: Command):
     """
@@ -199,6 +468,44 @@ async def handle_deck_codes_group(message: Message, command: Command):
     await process_message_with_codes(message, text_to_parse)
 
 
+@router.message(Command("kkc", "ккк", ignore_case=True))
+async def handle_deck_codes_collage(message: Message, command: CommandObject):
+    """
+    Обрабатывает команду /kkc: колоды из сообщения отправляются одним изображением,
+    независимо от способа вывода, выбранного для чата.
+    """
+    if not command.args:
+        await message.reply("Пожалуйста, укажите коды колод после команды /kkc.")
+        return
+    await process_message_with_codes(message, command.args, output=ChatSettings.DeckOutput.COLLAGE)
+
+
+@router.message(Command("mode"))
+async def handle_output_mode(message: Message, command: CommandObject):
+    """
+    Показывает или меняет способ вывода нескольких колод для чата: /mode progressive|album|collage.
+    В группах менять настройку могут только администраторы чата.
+    """
+    current = await get_output_mode(message.chat.id)
+    options = "\n".join(f"{hcode(mode.value)} — {OUTPUT_MODE_NAMES[mode]}" for mode in ChatSettings.DeckOutput)
+    mode = (command.args or "").strip().lower()
+    if not mode:
+        await message.reply(
+            f"Несколько колод сейчас выводятся {hbold(OUTPUT_MODE_NAMES[current])}.\n\n"
+            f"Изменить: /mode и один из вариантов:\n{options}"
+        )
+        return
+    if mode not in ChatSettings.DeckOutput.values:
+        await message.reply(f"Неизвестный способ вывода. Доступные варианты:\n{options}")
+        return
+    if message.chat.type != ChatType.PRIVATE and not await _is_chat_admin(message):
+        await message.reply("Менять способ вывода в группе могут только ее администраторы.")
+        return
+
+    await set_output_mode(message.chat.id, mode)
+    await message.reply(f"Готово: несколько колод теперь выводятся {hbold(OUTPUT_MODE_NAMES[mode])}.")
+
+
 @router.message(F.chat.type == ChatType.PRIVATE, F.text)
 async def handle_deck_codes_private(message: Message):
     """
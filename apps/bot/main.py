@@ -1,30 +1,134 @@
 import asyncio
 import logging
+from typing import Optional
 from django.conf import settings
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
 from apps.bot.handlers import deck_codes, admin_commands
+from apps.bot.services.admission import admission
+from apps.bot.services.catalog import catalog
+from apps.bot.services.db import close_store, open_store
+from apps.bot.services.image_generator import invalidate_card_tiles
+from apps.bot.services.loop_monitor import start_loop_monitor
+from apps.bot.services.metrics import start_metrics_server
+from apps.bot.services.render_queue import render_queue
+from apps.bot.services.send_scheduler import SendScheduler
+from apps.bot.services.snapshot import load_snapshot
+from apps.bot.services.warmup import warm_up
+from apps.bot.services.webhook import run_webhook, webhook_secret
+from apps.cards.services.invalidation import listen_for_card_changes, register_card_change_handler
 
 
-async def main() -> None:
+def create_bot(token: str, session: Optional[BaseSession] = None) -> Bot:
+    """
+    Создает экземпляр бота. `session` позволяет подменить HTTP-сессию,
+    например направить запросы на фейковый Bot API в нагрузочном тесте.
+    """
+    # `DefaultBotProperties` задает `parse_mode` по умолчанию для всех запросов.
+    # Ответ отправляется, даже если исходное сообщение уже удалено (или синтетическое, см. `post_test_update`).
+    bot = Bot(
+        token=token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML, allow_sending_without_reply=True)
+    )
+    # Все исходящие запросы проходят через планировщик с лимитами Telegram и повтором после 429.
+    bot.session.middleware(SendScheduler(
+        global_rate=settings.TELEGRAM_GLOBAL_RATE,
+        chat_rate=settings.TELEGRAM_CHAT_RATE,
+        group_rate=settings.TELEGRAM_GROUP_RATE,
+        chat_burst=settings.TELEGRAM_CHAT_BURST,
+        max_retries=settings.TELEGRAM_MAX_RETRIES,
+    ))
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    """Создает диспетчер со всеми роутерами бота."""
+    dp = Dispatcher()
+    dp.include_router(admin_commands.admin_router)
+    dp.include_router(deck_codes.router)
+    return dp
+
+
+async def main(warmup: Optional[str] = None, warmup_decks: Optional[int] = None) -> None:
     """
     Инициализирует и запускает бота.
+    `warmup` ('off', 'blocking', 'background') и `warmup_decks` переопределяют
+    BOT_WARMUP и BOT_WARMUP_TOP_DECKS (опции команды `startbot`).
     """
     if not settings.BOT_TOKEN:
         logging.error("Необходимо указать BOT_TOKEN в .env файле.")
         return
+    if settings.BOT_MODE == 'webhook' and not settings.WEBHOOK_URL:
+        logging.error("Для BOT_MODE=webhook необходимо указать WEBHOOK_URL в .env файле.")
+        return
     if not settings.ADMIN_ID:
         logging.warning("ADMIN_ID не указан в .env. Админ-команды не будут работать.")
 
-    # Инициализируем бота с `DefaultBotProperties`, чтобы задать `parse_mode` по умолчанию для всех запросов.
-    bot = Bot(
-        token=settings.BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    dp = Dispatcher()
+    bot = create_bot(settings.BOT_TOKEN)
+    dp = create_dispatcher()
+    await open_store()
 
-    dp.include_router(admin_commands.admin_router)
-    dp.include_router(deck_codes.router)
+    # Снимок карт и тайлов: справочник без запросов к БД, тайлы — из атласа в памяти (mmap).
+    if settings.BOT_USE_SNAPSHOT:
+        snapshot = await asyncio.to_thread(load_snapshot)
+        if snapshot is not None:
+            catalog.load_entries(snapshot.catalog_entries())
+
+    # Подписываем in-process кэши на события изменения карт из админки и воркера.
+    register_card_change_handler(invalidate_card_tiles)
+    register_card_change_handler(deck_codes.invalidate_rendered_decks)
+    register_card_change_handler(catalog.invalidate)
+    invalidation_task = asyncio.create_task(listen_for_card_changes())
+    # Уведомления о готовых рендерах от процессов `renderworker`.
+    render_results_task = asyncio.create_task(render_queue.listen()) if render_queue is not None else None
+    metrics_runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+    loop_monitor_task = start_loop_monitor(settings.LOOP_MONITOR_INTERVAL, settings.LOOP_LAG_THRESHOLD)
+
+    # Прогрев кэшей: до приема апдейтов (blocking) или параллельно с ним (background).
+    warmup = warmup or settings.BOT_WARMUP
+    warmup_task = None
+    if warmup != 'off':
+        warmup_coro = warm_up(
+            deck_codes.render_deck,
+            top_decks=settings.BOT_WARMUP_TOP_DECKS if warmup_decks is None else warmup_decks,
+            days=settings.BOT_WARMUP_DAYS,
+        )
+        if warmup == 'blocking':
+            await warmup_coro
+        else:
+            warmup_task = asyncio.create_task(warmup_coro)
 
-    await dp.start_polling(bot)
\ No newline at end of file
+    try:
+        if settings.BOT_MODE == 'webhook':
+            await run_webhook(
+                bot, dp,
+                url=settings.WEBHOOK_URL,
+                path=settings.WEBHOOK_PATH,
+                host=settings.WEBHOOK_HOST,
+                port=settings.WEBHOOK_PORT,
+                secret=webhook_secret(settings.BOT_TOKEN, settings.WEBHOOK_SECRET),
+                drain_timeout=settings.BOT_DRAIN_TIMEOUT,
+            )
+        else:
+            # Telegram не отдает апдейты через getUpdates, пока у бота установлен вебхук.
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        # Дожидаемся сообщений, уже принятых в очередь обработки.
+        await admission.drain(settings.BOT_DRAIN_TIMEOUT)
+        invalidation_task.cancel()
+        if warmup_task:
+            warmup_task.cancel()
+        if render_results_task:
+            render_results_task.cancel()
+        if loop_monitor_task:
+            loop_monitor_task.cancel()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await close_store()
+        if settings.BOT_MODE == 'webhook':
+            # В режиме polling сессию закрывает `start_polling`, а обработчик вебхука ее не закрывает.
+            await bot.session.close()
\ No newline at end of file
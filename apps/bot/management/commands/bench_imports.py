@@ -0,0 +1,50 @@
+from typing import Any, List
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from apps.bot.services.import_benchmark import ImportProfile, command_modules, measure_import
+
+
+class Command(BaseCommand):
+    """
+    Измеряет время холодного запуска management-команд: `django.setup()` и импорт
+    модуля каждой команды в отдельном процессе (`python -X importtime`).
+    Для каждой команды выводятся самые тяжелые пакеты верхнего уровня, которые она загружает.
+
+    Тяжелые зависимости (aiogram, aiohttp) должны импортироваться внутри функций,
+    которым они нужны, а не на уровне модулей, используемых короткими командами.
+
+    Примеры использования:
+        docker compose run --rm web python manage.py bench_imports
+        docker compose run --rm web python manage.py bench_imports --module apps.bot.main --top 10
+    """
+    help = "Измеряет время импорта management-команд и самые тяжелые зависимости."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--module', action='append', default=None,
+            help="Измерить указанный модуль вместо всех команд проекта (можно повторять)."
+        )
+        parser.add_argument('--top', type=int, default=3, help="Сколько самых тяжелых пакетов показать.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        modules = options['module'] or list(command_modules().values())
+        profiles: List[ImportProfile] = []
+        for module in modules:
+            try:
+                profiles.append(measure_import(module))
+            except RuntimeError as error:
+                raise CommandError(str(error))
+
+        if profiles:
+            setup = min(profile.setup_seconds for profile in profiles)
+            self.stdout.write(self.style.SUCCESS(f"django.setup(): {setup * 1000:.0f} мс"))
+        self.stdout.write(f"{'модуль':<48}{'импорт':>10}  тяжелые пакеты")
+        for profile in sorted(profiles, key=lambda p: p.import_seconds, reverse=True):
+            heaviest = ", ".join(
+                f"{package} {seconds * 1000:.0f} мс"
+                for package, seconds in list(profile.packages.items())[:options['top']]
+                if seconds >= 0.001
+            )
+            name = profile.module if options['module'] else profile.module.rsplit('.', 1)[-1]
+            self.stdout.write(f"{name:<48}{profile.import_seconds * 1000:>7.0f} мс  {heaviest}")
@@ -0,0 +1,169 @@
+import resource
+import sys
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from statistics import mean
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from apps.bot.services.image_generator import clear_tile_cache
+from apps.bot.services.render_benchmark import (
+    GOLDEN_DIR, GOLDEN_TOLERANCE, benchmark_encoders, compare_goldens, has_real_art, load_sample_decks,
+    render_sample, synthetic_media_root, write_goldens,
+)
+
+PHASES = ('load', 'resize', 'paste', 'draw', 'encode')
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss возвращается в килобайтах в Linux и в байтах в macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Command(BaseCommand):
+    """
+    Офлайн-бенчмарк рендера изображений колод и проверка по эталонным изображениям.
+
+    Колоды берутся из `data/decks.csv`; база данных и сеть не нужны. Если скачанных
+    изображений карт нет, используется синтетический арт (`--art synthetic`).
+    Выводит скорость рендера, перцентили времени, разбивку по фазам
+    (загрузка, уменьшение, вставка, отрисовка текста, кодирование JPEG) и пиковый RSS.
+
+    Примеры использования:
+        docker compose run --rm web python manage.py bench_render --decks 200
+        docker compose run --rm web python manage.py bench_render --cold --art synthetic
+        docker compose run --rm web python manage.py bench_render --check-golden
+        docker compose run --rm web python manage.py bench_render --encoders --uplink-mbps 20
+        docker compose run --rm web python manage.py bench_render --update-golden --golden-count 6
+    """
+    help = "Измеряет скорость рендера изображений колод и сверяет рендер с эталонами."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--path', type=str, default='data/decks.csv', help="CSV с колодами относительно корня проекта.")
+        parser.add_argument('--decks', type=int, default=50, help="Сколько колод рендерить.")
+        parser.add_argument('--iterations', type=int, default=1, help="Сколько раз повторить набор колод.")
+        parser.add_argument(
+            '--art', choices=['auto', 'real', 'synthetic'], default='auto',
+            help="Изображения карт: скачанные, синтетические или 'auto' (синтетические, если скачаны не все)."
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help="Очищать кэш тайлов перед каждым рендером (замер без кэша)."
+        )
+        parser.add_argument(
+            '--encoders', action='store_true',
+            help="Сравнить варианты кодирования изображений: время кодирования, размер и время загрузки."
+        )
+        parser.add_argument(
+            '--uplink-mbps', type=float, default=10.0,
+            help="Скорость канала до Telegram (Мбит/с) для оценки времени загрузки в режиме --encoders."
+        )
+        parser.add_argument('--check-golden', action='store_true', help="Сверить рендер с эталонами и выйти.")
+        parser.add_argument('--update-golden', action='store_true', help="Перерисовать эталонные изображения.")
+        parser.add_argument('--golden-count', type=int, default=4, help="Сколько колод взять в эталоны.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        csv_path: Path = settings.BASE_DIR / options['path']
+        if not csv_path.is_file():
+            raise CommandError(f"Файл с колодами не найден: {csv_path}")
+
+        if options['update_golden']:
+            decks = load_sample_decks(csv_path, options['golden_count'])
+            paths = write_goldens(decks)
+            self.stdout.write(self.style.SUCCESS(f"Эталоны обновлены ({len(paths)} шт.) в {GOLDEN_DIR}"))
+            return
+        if options['check_golden']:
+            self._check_goldens()
+            return
+
+        decks = load_sample_decks(csv_path, options['decks'])
+        if not decks:
+            raise CommandError("В файле нет корректных колод.")
+        card_ids = [card_id for deck in decks for card_id in deck.card_ids]
+
+        art = options['art']
+        if art == 'auto':
+            art = 'real' if has_real_art(card_ids) else 'synthetic'
+        elif art == 'real' and not has_real_art(card_ids):
+            raise CommandError("Скачаны не все изображения карт. Запустите populate_db или используйте --art synthetic.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Рендер {len(decks)} колод x {options['iterations']} (арт: {art}, кэш тайлов: "
+            f"{'очищается' if options['cold'] else 'включен'})"
+        ))
+        media = synthetic_media_root(card_ids) if art == 'synthetic' else nullcontext()
+        with media:
+            if options['encoders']:
+                self._run_encoders(decks, options['uplink_mbps'])
+            else:
+                self._run(decks, options['iterations'], options['cold'])
+
+    def _run(self, decks, iterations: int, cold: bool) -> None:
+        clear_tile_cache()
+        phase_totals: Dict[str, float] = {}
+        durations: List[float] = []
+        sizes: List[int] = []
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            for deck in decks:
+                if cold:
+                    clear_tile_cache()
+                render_started = time.perf_counter()
+                image = render_sample(deck, phase_totals)
+                durations.append(time.perf_counter() - render_started)
+                sizes.append(len(image))
+        elapsed = time.perf_counter() - started
+
+        durations.sort()
+        percentile = lambda q: durations[min(len(durations) - 1, int(q * len(durations)))]
+        self.stdout.write(f"Рендеров: {len(durations)} за {elapsed:.2f} с — {len(durations) / elapsed:.1f} рендеров/с")
+        self.stdout.write(
+            f"Время рендера: среднее {mean(durations) * 1000:.1f} мс, p50 {percentile(0.5) * 1000:.1f} мс, "
+            f"p95 {percentile(0.95) * 1000:.1f} мс, max {durations[-1] * 1000:.1f} мс"
+        )
+        self.stdout.write(f"Средний размер JPEG: {mean(sizes) / 1024:.0f} КБ")
+        self.stdout.write(f"Пиковый RSS процесса: {_peak_rss_mb():.0f} МБ")
+
+        phases_total = sum(phase_totals.values()) or 1e-9
+        self.stdout.write("Время по фазам:")
+        for phase in PHASES:
+            value = phase_totals.get(phase, 0.0)
+            self.stdout.write(
+                f"  {phase:<8} {value * 1000 / len(durations):8.2f} мс/рендер ({value / phases_total:6.1%})"
+            )
+
+    def _run_encoders(self, decks, uplink_mbps: float) -> None:
+        results = benchmark_encoders(decks)
+        bytes_per_second = uplink_mbps * 1_000_000 / 8
+        self.stdout.write(
+            f"{'вариант':<18} {'кодирование':>12} {'средний размер':>15} {'максимум':>10} "
+            f"{'загрузка':>10} {'итого':>9}"
+        )
+        for result in results:
+            upload = result.mean_bytes / bytes_per_second
+            self.stdout.write(
+                f"{result.name:<18} {result.mean_encode_seconds * 1000:9.1f} мс {result.mean_bytes / 1024:12.0f} КБ "
+                f"{result.max_bytes / 1024:7.0f} КБ {upload * 1000:7.0f} мс "
+                f"{(upload + result.mean_encode_seconds) * 1000:6.0f} мс"
+            )
+        self.stdout.write(f"Загрузка оценена для канала {uplink_mbps:g} Мбит/с.")
+
+    def _check_goldens(self) -> None:
+        results = compare_goldens()
+        if not results:
+            raise CommandError(f"Эталоны не найдены в {GOLDEN_DIR}. Создайте их: bench_render --update-golden")
+
+        failed = 0
+        for deck, diff in results:
+            ok = diff <= GOLDEN_TOLERANCE
+            failed += not ok
+            style = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(style(f"{'OK  ' if ok else 'FAIL'} {deck.deck_code}: разница {diff:.2f}"))
+        if failed:
+            raise CommandError(f"Рендер отличается от эталона для {failed} из {len(results)} колод.")
+        self.stdout.write(self.style.SUCCESS(f"Все {len(results)} эталонов совпадают (допуск {GOLDEN_TOLERANCE})."))
@@ -0,0 +1,31 @@
+import logging
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from apps.bot.services.snapshot import CardSnapshot, snapshot_dir, write_snapshot
+
+
+class Command(BaseCommand):
+    """
+    Записывает снимок справочника карт и тайлов (`MEDIA_ROOT/snapshot`), который бот
+    и процессы `renderworker` отображают в память при запуске. Обычно снимок пишется
+    автоматически после обновления карт; команда нужна после ручной правки карт или
+    при первом развертывании.
+
+    Пример использования:
+        docker compose run --rm web python manage.py build_snapshot
+    """
+    help = "Записывает снимок справочника карт и тайлов для быстрого запуска бота."
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+        stats = write_snapshot()
+        snapshot = CardSnapshot.open()
+        if snapshot is None:
+            self.stderr.write(self.style.ERROR(f"Снимок записан, но не читается: {snapshot_dir()}"))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Снимок записан в {snapshot_dir()}: {stats.cards} карт ({stats.cards_bytes / 1024:.0f} КБ), "
+            f"{stats.tiles} тайлов ({stats.tiles_bytes / 1024 / 1024:.1f} МБ) за {stats.seconds:.1f} с."
+        ))
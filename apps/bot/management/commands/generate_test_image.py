@@ -6,8 +6,7 @@ from typing import Optional, List
 from django.core.management.base import BaseCommand
 from django.conf import settings
 
-from apps.bot.handlers.deck_codes import get_or_create_deck, get_cards_from_ids_with_duplicates
-from apps.bot.services.deck_utils import calculate_resonances
+from apps.bot.services.deck_utils import calculate_resonances, get_cards_from_ids_with_duplicates, get_or_create_deck
 from apps.bot.services.image_generator import create_deck_image
 from apps.bot.tests.test_data import DECK_TEST_CASES
 from apps.users.models import TelegramUser
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from contextlib import nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from apps.bot.services.metrics import STAGE_DURATION, percentile
+from apps.bot.services.render_benchmark import has_real_art, load_sample_decks, synthetic_media_root
+from apps.cards.models import Card
+
+if TYPE_CHECKING:
+    from apps.bot.services.loadtest import LoadTestResult, UpdateRecord
+
+REPORT_STAGES = ('admission_wait', 'get_or_create_deck', 'hoyolab_decode', 'card_fetch', 'render', 'send', 'total')
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест бота: настоящий диспетчер из `apps.bot.main` работает против фейкового
+    Telegram Bot API и заглушки Hoyolab, поднятых в том же процессе. Коды колод берутся
+    из `data/decks.csv`; сообщения бывают с одним или несколькими кодами, из личных чатов
+    и из групп (`/kk`). Выводит пропускную способность, перцентили задержки и долю ошибок.
+
+    Использует настоящую базу данных (колоды и пользователи создаются как при обычной работе),
+    поэтому запускать его стоит на отдельной базе.
+
+    Примеры использования:
+        docker compose run --rm web python manage.py loadtest --messages 300 --rate 20
+        docker compose run --rm web python manage.py loadtest --multi-ratio 1 --group-ratio 0 --api-latency 0.1
+        docker compose run --rm web python manage.py loadtest --seed-cards --art synthetic
+        docker compose run --rm web python manage.py loadtest --mode webhook --rate 50
+    """
+    help = "Нагрузочный тест бота на фейковом Telegram Bot API и заглушке Hoyolab."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--path', type=str, default='data/decks.csv', help="CSV с колодами относительно корня проекта.")
+        parser.add_argument('--codes', type=int, default=200, help="Сколько разных кодов колод взять из файла.")
+        parser.add_argument('--messages', type=int, default=100, help="Сколько сообщений отправить боту.")
+        parser.add_argument('--rate', type=float, default=10.0, help="Сообщений в секунду (0 — все сразу).")
+        parser.add_argument('--multi-ratio', type=float, default=0.2, help="Доля сообщений с несколькими кодами.")
+        parser.add_argument('--multi-size', type=int, default=20, help="Кодов в сообщении с несколькими кодами.")
+        parser.add_argument('--group-ratio', type=float, default=0.3, help="Доля сообщений из групп (/kk).")
+        parser.add_argument('--users', type=int, default=50, help="Количество разных пользователей.")
+        parser.add_argument('--api-latency', type=float, default=0.0, help="Задержка ответов Bot API, с.")
+        parser.add_argument('--hoyolab-latency', type=float, default=0.0, help="Задержка ответов Hoyolab, с.")
+        parser.add_argument(
+            '--flood-ratio', type=float, default=0.0,
+            help="Доля отправок, на которые фейковый Bot API отвечает 429 (retry_after)."
+        )
+        parser.add_argument(
+            '--mode', choices=['polling', 'webhook'], default='polling',
+            help="Доставка апдейтов боту: long polling или вебхук."
+        )
+        parser.add_argument('--timeout', type=float, default=300.0, help="Максимальное время ожидания обработки, с.")
+        parser.add_argument('--seed', type=int, default=42, help="Seed генератора нагрузки.")
+        parser.add_argument(
+            '--seed-cards', action='store_true',
+            help="Создать в БД недостающие карты-заглушки для используемых колод."
+        )
+        parser.add_argument(
+            '--art', choices=['auto', 'real', 'synthetic'], default='auto',
+            help="Изображения карт: скачанные, синтетические или 'auto'."
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        # Сервис нагрузочного теста тянет aiogram (несколько секунд импорта) — `--help` без него.
+        from apps.bot.services.loadtest import LoadTestConfig, run_load_test
+
+        logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+        csv_path: Path = settings.BASE_DIR / options['path']
+        if not csv_path.is_file():
+            raise CommandError(f"Файл с колодами не найден: {csv_path}")
+
+        decks = load_sample_decks(csv_path, options['codes'])
+        if not decks:
+            raise CommandError("В файле нет корректных колод.")
+        card_ids = {card_id for deck in decks for card_id in deck.card_ids}
+        if options['seed_cards']:
+            self._seed_cards(card_ids)
+
+        config = LoadTestConfig(
+            messages=options['messages'], rate=options['rate'], multi_ratio=options['multi_ratio'],
+            multi_size=options['multi_size'], group_ratio=options['group_ratio'], users=options['users'],
+            api_latency=options['api_latency'], hoyolab_latency=options['hoyolab_latency'],
+            flood_ratio=options['flood_ratio'], mode=options['mode'],
+            timeout=options['timeout'], seed=options['seed'],
+        )
+        art = options['art']
+        if art == 'auto':
+            art = 'real' if has_real_art(card_ids) else 'synthetic'
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Нагрузочный тест: {config.messages} сообщений, {config.rate or 'все сразу'} сообщ./с, "
+            f"{len(decks)} кодов, арт: {art}, режим: {config.mode}"
+        ))
+        with synthetic_media_root(card_ids) if art == 'synthetic' else nullcontext():
+            result = asyncio.run(run_load_test(config, decks))
+        self._report(result)
+
+    def _seed_cards(self, card_ids) -> None:
+        existing = set(Card.objects.filter(card_id__in=card_ids).values_list('card_id', flat=True))
+        missing = sorted(set(card_ids) - existing)
+        Card.objects.bulk_create([
+            Card(
+                card_id=card_id,
+                name=f"Card {card_id}",
+                # ID карт персонажей четырехзначные, карт действий — шестизначные.
+                card_type=Card.CardType.CHARACTER if card_id < 100000 else Card.CardType.ACTION,
+            )
+            for card_id in missing
+        ], ignore_conflicts=True)
+        self.stdout.write(f"Создано карт-заглушек: {len(missing)}")
+
+    def _report(self, result: 'LoadTestResult') -> None:
+        completed = result.completed
+        self.stdout.write("-" * 30)
+        self.stdout.write(
+            f"Обработано: {len(completed)}/{len(result.records)} за {result.elapsed:.1f} с "
+            f"({len(completed) / max(result.elapsed, 1e-9):.1f} сообщ./с, "
+            f"{sum(r.codes for r in completed) / max(result.elapsed, 1e-9):.1f} колод/с)"
+        )
+
+        groups: Dict[str, List['UpdateRecord']] = {'all': result.records}
+        for record in result.records:
+            groups.setdefault(record.kind, []).append(record)
+
+        self.stdout.write(
+            f"{'тип':<16}{'сообщ.':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'1-е фото p95':>14}"
+            f"{'исключ.':>9}{'ош. колод':>11}{'отказы':>9}"
+        )
+        for kind, records in groups.items():
+            latencies = [r.latency for r in records if r.latency is not None]
+            first_photo = [r.time_to_first_photo for r in records if r.time_to_first_photo is not None]
+            exceptions = sum(1 for r in records if r.exception)
+            codes = sum(r.codes for r in records) or 1
+            deck_errors = sum(r.deck_errors for r in records)
+            rejected = sum(1 for r in records if r.rejected)
+            self.stdout.write(
+                f"{kind:<16}{len(records):>8}"
+                + "".join(f"{percentile(latencies, q) * 1000:>7.0f}мс" for q in (0.5, 0.95, 0.99, 1.0))
+                + f"{percentile(first_photo, 0.95) * 1000:>12.0f}мс"
+                + f"{exceptions / len(records):>9.1%}{deck_errors / codes:>11.1%}{rejected / len(records):>9.1%}"
+            )
+
+        self.stdout.write("Вызовы Bot API: " + ", ".join(f"{m}={n}" for m, n in sorted(result.api_calls.items())))
+        self.stdout.write(f"Загружено изображений: {result.uploaded_bytes / (1024 * 1024):.1f} МБ")
+        if result.flood_responses:
+            self.stdout.write(f"Ответов 429 от фейкового Bot API: {result.flood_responses}")
+        self.stdout.write("Этапы обработки (p50/p95):")
+        for stage in REPORT_STAGES:
+            quantiles = STAGE_DURATION.quantiles(stage)
+            if quantiles:
+                self.stdout.write(f"  {stage:<20} {quantiles[0.5] * 1000:8.1f} / {quantiles[0.95] * 1000:8.1f} мс")
+
+        failures = [r for r in result.records if r.exception][:5]
+        for record in failures:
+            self.stderr.write(self.style.ERROR(f"Исключение ({record.kind}): {record.exception}"))
@@ -0,0 +1,123 @@
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from apps.bot.services.metrics import percentile
+from apps.bot.services.render_benchmark import load_sample_decks
+
+
+class Command(BaseCommand):
+    """
+    Отправляет синтетические апдейты Telegram на вебхук запущенного бота (BOT_MODE=webhook),
+    как это делал бы сам Telegram: POST с JSON апдейта и заголовком секрета. Позволяет проверить
+    вебхук локально, без публичного адреса, и измерить время ответа обработчика.
+
+    Бот отвечает в указанный чат через настоящий Bot API, поэтому `--chat-id` должен быть
+    чатом, в котором бот может писать (по умолчанию — ADMIN_ID).
+
+    Примеры использования:
+        docker compose exec bot python manage.py post_test_update
+        docker compose exec bot python manage.py post_test_update --text "/start"
+        docker compose exec bot python manage.py post_test_update --count 50 --codes 3 --concurrency 10
+    """
+    help = "Отправляет синтетические апдейты на вебхук бота."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--url', type=str, default=None,
+            help="Адрес вебхука (по умолчанию http://127.0.0.1:WEBHOOK_PORT + WEBHOOK_PATH)."
+        )
+        parser.add_argument('--secret', type=str, default=None, help="Секрет вебхука (по умолчанию из настроек).")
+        parser.add_argument('--chat-id', type=int, default=settings.ADMIN_ID, help="Чат, из которого «пришло» сообщение.")
+        parser.add_argument('--text', type=str, default=None, help="Текст сообщения (по умолчанию — коды колод).")
+        parser.add_argument('--codes', type=int, default=1, help="Сколько кодов из data/decks.csv положить в сообщение.")
+        parser.add_argument('--count', type=int, default=1, help="Сколько апдейтов отправить.")
+        parser.add_argument('--concurrency', type=int, default=1, help="Сколько запросов держать одновременно.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        chat_id: Optional[int] = options['chat_id']
+        if chat_id is None:
+            raise CommandError("Укажите --chat-id или ADMIN_ID в .env.")
+        if not options['secret'] and not (settings.BOT_TOKEN or settings.WEBHOOK_SECRET):
+            raise CommandError("Не удалось определить секрет вебхука: укажите --secret, WEBHOOK_SECRET или BOT_TOKEN.")
+
+        url = options['url'] or f"http://127.0.0.1:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}"
+        secret = options['secret'] or self._default_secret()
+        texts = self._texts(options)
+
+        statuses, durations = asyncio.run(
+            self._post_all(url, secret, chat_id, texts, options['count'], options['concurrency'])
+        )
+
+        self.stdout.write(f"Отправлено апдейтов: {options['count']} на {url}")
+        self.stdout.write("Ответы: " + ", ".join(f"{status}={n}" for status, n in sorted(statuses.items())))
+        self.stdout.write(
+            f"Время ответа вебхука: p50 {percentile(durations, 0.5) * 1000:.1f} мс, "
+            f"p95 {percentile(durations, 0.95) * 1000:.1f} мс, max {percentile(durations, 1.0) * 1000:.1f} мс"
+        )
+        if set(statuses) != {200}:
+            self.stderr.write(self.style.WARNING("Не все апдейты приняты (403 — неверный секрет, 503 — бот останавливается)."))
+
+    @staticmethod
+    def _default_secret() -> str:
+        # Модуль вебхука импортирует aiogram; без явного секрета он нужен, чтобы вывести его из токена.
+        from apps.bot.services.webhook import webhook_secret
+        return webhook_secret(settings.BOT_TOKEN or '', settings.WEBHOOK_SECRET)
+
+    @staticmethod
+    def _texts(options: Dict[str, Any]) -> List[str]:
+        if options['text']:
+            return [options['text']]
+        csv_path = settings.BASE_DIR / 'data' / 'decks.csv'
+        if not csv_path.is_file():
+            raise CommandError(f"Файл с колодами не найден: {csv_path}. Укажите текст через --text.")
+        codes = [deck.deck_code for deck in load_sample_decks(csv_path, max(options['codes'], 1) * 50)]
+        if not codes:
+            raise CommandError("В файле нет корректных колод.")
+        size = max(options['codes'], 1)
+        return ["\n".join(codes[i:i + size]) for i in range(0, len(codes) - size + 1, size)]
+
+    async def _post_all(
+            self, url: str, secret: str, chat_id: int, texts: List[str], count: int, concurrency: int
+    ) -> Tuple[Dict[int, int], List[float]]:
+        statuses: Dict[int, int] = {}
+        durations: List[float] = []
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        # ID апдейтов и сообщений должны отличаться от настоящих, чтобы их было легко узнать в логах.
+        ids = itertools.count(int(time.time()))
+        in_group = chat_id < 0
+        # В личном чате его ID совпадает с ID пользователя; в группе «автором» считается администратор.
+        user_id = (settings.ADMIN_ID or 1) if in_group else chat_id
+
+        async with aiohttp.ClientSession() as session:
+            async def post(text: str) -> None:
+                update_id = next(ids)
+                text = f"/kk {text}" if in_group and not text.startswith('/') else text
+                update = {
+                    'update_id': update_id,
+                    'message': {
+                        'message_id': update_id,
+                        'date': int(time.time()),
+                        'chat': {'id': chat_id, 'type': 'supergroup' if in_group else 'private'},
+                        'from': {'id': user_id, 'is_bot': False, 'first_name': 'Webhook test'},
+                        'text': text,
+                    },
+                }
+                async with semaphore:
+                    started = time.perf_counter()
+                    async with session.post(
+                            url, data=json.dumps(update),
+                            headers={'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': secret},
+                    ) as response:
+                        await response.read()
+                        durations.append(time.perf_counter() - started)
+                        statuses[response.status] = statuses.get(response.status, 0) + 1
+
+            await asyncio.gather(*(post(texts[i % len(texts)]) for i in range(count)))
+        return statuses, durations
@@ -0,0 +1,109 @@
+import io
+import json
+import pstats
+from datetime import timedelta
+from pathlib import Path
+from statistics import mean
+from typing import Any, Dict, List
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+
+from apps.bot.services.profiler import PROFILES_DIR
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class Command(BaseCommand):
+    """
+    Строит сводный отчет по профилям, собранным выборочным профилировщиком бота
+    (`BOT_PROFILE_SAMPLE_RATE` или админ-команда `/profile`).
+
+    Все файлы `.prof` из `MEDIA_ROOT/profiles/` объединяются через `pstats`,
+    после чего выводятся самые «горячие» функции и средние длительности этапов.
+
+    Примеры использования:
+        docker compose exec bot python manage.py profile_report
+        docker compose exec bot python manage.py profile_report --top 40 --sort tottime --hours 24
+    """
+    help = "Показывает самые затратные функции по профилям обработки сообщений."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--top', type=int, default=25, help="Сколько функций показать.")
+        parser.add_argument(
+            '--sort', choices=SORT_KEYS, default='cumulative',
+            help="Сортировка: суммарное время с вложенными вызовами, собственное время или число вызовов."
+        )
+        parser.add_argument(
+            '--hours', type=float, default=None,
+            help="Учитывать только профили за последние N часов."
+        )
+        parser.add_argument(
+            '--min-decks', type=int, default=0,
+            help="Учитывать только сообщения, в которых было не меньше N колод."
+        )
+        parser.add_argument(
+            '--dir', type=str, default=None,
+            help="Каталог с профилями (по умолчанию MEDIA_ROOT/profiles)."
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help="Удалить учтенные профили после построения отчета."
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        profiles_dir = Path(options['dir']) if options['dir'] else PROFILES_DIR
+        profile_paths = self._select_profiles(profiles_dir, options['hours'], options['min_decks'])
+        if not profile_paths:
+            raise CommandError(f"В {profiles_dir} нет подходящих профилей.")
+
+        metadata = [self._read_metadata(path) for path in profile_paths]
+        self._write_summary(metadata)
+
+        stream = io.StringIO()
+        stats = pstats.Stats(*(str(path) for path in profile_paths), stream=stream)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+        self.stdout.write(stream.getvalue())
+
+        if options['clear']:
+            for path in profile_paths:
+                path.unlink(missing_ok=True)
+                path.with_suffix('.json').unlink(missing_ok=True)
+            self.stdout.write(self.style.WARNING(f"Удалено профилей: {len(profile_paths)}"))
+
+    def _select_profiles(self, profiles_dir: Path, hours: float, min_decks: int) -> List[Path]:
+        paths = sorted(profiles_dir.glob('*.prof')) if profiles_dir.is_dir() else []
+        if hours is not None:
+            threshold = (timezone.now() - timedelta(hours=hours)).timestamp()
+            paths = [path for path in paths if path.stat().st_mtime >= threshold]
+        if min_decks:
+            paths = [path for path in paths if self._read_metadata(path).get('deck_count', 0) >= min_decks]
+        return paths
+
+    @staticmethod
+    def _read_metadata(profile_path: Path) -> Dict[str, Any]:
+        try:
+            return json.loads(profile_path.with_suffix('.json').read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def _write_summary(self, metadata: List[Dict[str, Any]]) -> None:
+        durations = [item['duration'] for item in metadata if 'duration' in item]
+        deck_counts = [item['deck_count'] for item in metadata if 'deck_count' in item]
+        self.stdout.write(self.style.SUCCESS(f"Профилей в отчете: {len(metadata)}"))
+        if durations:
+            self.stdout.write(
+                f"Время обработки: среднее {mean(durations) * 1000:.0f} мс, максимум {max(durations) * 1000:.0f} мс"
+            )
+        if deck_counts:
+            self.stdout.write(f"Колод в сообщении: в среднем {mean(deck_counts):.1f}, максимум {max(deck_counts)}")
+
+        stage_values: Dict[str, List[float]] = {}
+        for item in metadata:
+            for stage, value in item.get('stages', {}).items():
+                stage_values.setdefault(stage, []).append(value)
+        if stage_values:
+            self.stdout.write("Средняя длительность этапов:")
+            for stage, values in sorted(stage_values.items(), key=lambda kv: -mean(kv[1])):
+                self.stdout.write(f"  {stage:<20} {mean(values) * 1000:8.1f} мс")
+        self.stdout.write("")
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from apps.bot.services.image_generator import invalidate_card_tiles
+from apps.bot.services.render_queue import POLL_INTERVAL, process_next_render_job, run_render_worker
+from apps.bot.services.snapshot import load_snapshot
+from apps.cards.services.invalidation import listen_for_card_changes, register_card_change_handler
+
+
+class Command(BaseCommand):
+    """
+    Процесс-рендерер: забирает задачи рендера колод из таблицы `RenderJob` и возвращает
+    готовые изображения боту (при `BOT_REMOTE_RENDER=True`). Процессов может быть несколько,
+    в том числе на других машинах с доступом к базе: задачи распределяются через `SKIP LOCKED`.
+
+    Примеры использования:
+        docker compose up -d --scale renderworker=4
+        docker compose run --rm web python manage.py renderworker --concurrency 2
+        docker compose run --rm web python manage.py renderworker --once
+    """
+    help = "Запускает процесс рендера изображений колод для бота."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help="Сколько колод рендерить одновременно в этом процессе (потоки)."
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=POLL_INTERVAL,
+            help="Интервал проверки очереди без уведомлений, в секундах."
+        )
+        parser.add_argument('--once', action='store_true', help="Выполнить все задачи из очереди и завершиться.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        )
+        # Тайлы из снимка делятся с ботом и другими рендерерами через page cache.
+        if settings.BOT_USE_SNAPSHOT:
+            load_snapshot()
+        if options['once']:
+            processed = 0
+            while process_next_render_job() is not None:
+                processed += 1
+            self.stdout.write(self.style.SUCCESS(f"Выполнено задач рендера: {processed}"))
+            return
+
+        # Кэш тайлов воркера сбрасывается по тем же событиям изменения карт, что и у бота.
+        register_card_change_handler(invalidate_card_tiles)
+        self.stdout.write(self.style.SUCCESS(f"Рендерер запущен (потоков: {options['concurrency']})."))
+        try:
+            asyncio.run(self._run(options['concurrency'], options['poll_interval']))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Рендерер остановлен вручную."))
+
+    @staticmethod
+    async def _run(concurrency: int, poll_interval: float) -> None:
+        await asyncio.gather(listen_for_card_changes(), run_render_worker(concurrency, poll_interval))
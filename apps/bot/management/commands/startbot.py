@@ -1,12 +1,24 @@
 import asyncio
 import logging
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandParser
 import django
 
+WARMUP_CHOICES = ('off', 'blocking', 'background')
+
 
 class Command(BaseCommand):
     help = "Запускает телеграм-бота"
 
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--warmup', choices=WARMUP_CHOICES, default=None,
+            help="Прогрев кэшей при запуске: выключен, до приема апдейтов или в фоне (по умолчанию BOT_WARMUP)."
+        )
+        parser.add_argument(
+            '--warmup-decks', type=int, default=None,
+            help="Сколько популярных колод отрендерить при прогреве (по умолчанию BOT_WARMUP_TOP_DECKS)."
+        )
+
     def handle(self, *args, **options):
         logging.basicConfig(
             level=logging.INFO,
@@ -22,7 +34,7 @@ class Command(BaseCommand):
         from apps.bot.main import main
 
         try:
-            asyncio.run(main())
+            asyncio.run(main(warmup=options['warmup'], warmup_decks=options['warmup_decks']))
         except KeyboardInterrupt:
             self.stdout.write(self.style.WARNING("Бот остановлен вручную."))
         except Exception as e:
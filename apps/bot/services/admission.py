@@ -0,0 +1,184 @@
+"""
+Контроль допуска сообщений с кодами колод к обработке.
+
+Перед обработкой сообщение проходит два фильтра: ведро токенов пользователя (стоимость —
+число кодов в сообщении) и ограниченная по размеру общая очередь. Если ведро пусто или
+очередь заполнена, сообщение отклоняется с `AdmissionRejected`, и бот отвечает «попробуйте
+позже» вместо того, чтобы копить работу. Принятые сообщения обрабатывают `workers` задач.
+
+Очередь приоритетная: сообщению назначается «срок» = время постановки + штраф. Штраф растет
+с числом кодов, которых нет в кэше изображений, и для групповых чатов, поэтому небольшие,
+закэшированные и личные запросы обслуживаются раньше больших «холодных» пачек. Штраф
+ограничен, так что большие пачки не голодают: через несколько секунд они обходят новые
+мелкие запросы.
+"""
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional
+
+from django.conf import settings
+
+from apps.bot.services.metrics import STAGE_DURATION, registry
+from apps.bot.services.rate_limit import BucketRegistry, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Штраф приоритета в секундах за каждый код без готового изображения и за групповой чат.
+COLD_CODE_PENALTY = 0.25
+GROUP_PENALTY = 1.0
+
+BUSY_TEXT = "⏳ Бот сейчас перегружен. Пожалуйста, попробуйте чуть позже."
+USER_RATE_TEXT = "⏳ Вы отправляете слишком много кодов. Пожалуйста, попробуйте снова через {seconds} с."
+
+ADMISSION_REJECTED = registry.counter(
+    "kkbot_admission_rejected_total", "Сообщения, отклоненные контролем допуска", ["reason"]
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge("kkbot_admission_queue_depth", "Сообщения в очереди на обработку")
+ADMISSION_IN_FLIGHT = registry.gauge("kkbot_admission_in_flight", "Сообщения, обрабатываемые прямо сейчас")
+
+
+class AdmissionRejected(Exception):
+    """Сообщение не принято к обработке: `reason` — 'user_rate', 'queue_full' или 'shutdown'."""
+
+    def __init__(self, reason: str, retry_after: Optional[float] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def user_message(self) -> str:
+        if self.reason == 'user_rate' and self.retry_after is not None:
+            return USER_RATE_TEXT.format(seconds=max(1, round(self.retry_after)))
+        return BUSY_TEXT
+
+
+@dataclass(order=True)
+class _QueuedJob:
+    deadline: float
+    seq: int
+    run: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: "asyncio.Future[Any]" = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class AdmissionController:
+    """
+    Очередь обработки сообщений с лимитом на пользователя. Рабочие задачи запускаются
+    при первой постановке в очередь в текущем event loop. `workers=0` отключает контроль:
+    задачи выполняются сразу, без очереди и лимитов.
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 200, user_rate: float = 0.5, user_burst: float = 40.0):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.user_burst = user_burst
+        self.user_buckets: BucketRegistry[int] = BucketRegistry(lambda _: TokenBucket(user_rate, user_burst))
+        self._seq = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional["asyncio.PriorityQueue[_QueuedJob]"] = None
+        self._tasks: List[asyncio.Task] = []
+        self._in_flight = 0
+        self._draining = False
+
+    @staticmethod
+    def penalty(cold_codes: int, group: bool) -> float:
+        return cold_codes * COLD_CODE_PENALTY + (GROUP_PENALTY if group else 0.0)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Новый event loop (перезапуск бота, тесты): очередь и рабочие прежнего loop непригодны.
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self._draining = False
+        self._in_flight = 0
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def run(self, user_id: int, cost: float, penalty: float, job: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ставит `job` в очередь и ждет его результата. Бросает `AdmissionRejected`, если
+        у пользователя кончились токены или очередь заполнена.
+        """
+        if self.workers <= 0:
+            return await job()
+        self._ensure_started()
+        if self._draining:
+            ADMISSION_REJECTED.inc('shutdown')
+            raise AdmissionRejected('shutdown')
+        if self._queue.qsize() >= self.queue_size:
+            ADMISSION_REJECTED.inc('queue_full')
+            raise AdmissionRejected('queue_full')
+        # Сообщение дороже всего ведра иначе никогда бы не прошло.
+        cost = min(cost, self.user_burst)
+        bucket = self.user_buckets.get(user_id)
+        if not bucket.try_acquire(cost):
+            ADMISSION_REJECTED.inc('user_rate')
+            raise AdmissionRejected('user_rate', retry_after=bucket.delay(cost))
+
+        now = self._loop.time()
+        future = self._loop.create_future()
+        self._queue.put_nowait(_QueuedJob(now + penalty, next(self._seq), job, future, now))
+        ADMISSION_QUEUE_DEPTH.set(self._queue.qsize())
+        return await future
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        while True:
+            item = await queue.get()
+            ADMISSION_QUEUE_DEPTH.set(queue.qsize())
+            try:
+                if item.future.cancelled():
+                    continue
+                STAGE_DURATION.observe(self._loop.time() - item.enqueued_at, "admission_wait")
+                self._in_flight += 1
+                ADMISSION_IN_FLIGHT.set(self._in_flight)
+                try:
+                    result = await item.run()
+                except asyncio.CancelledError:
+                    item.future.cancel()
+                    raise
+                except Exception as e:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                else:
+                    if not item.future.done():
+                        item.future.set_result(result)
+                finally:
+                    self._in_flight -= 1
+                    ADMISSION_IN_FLIGHT.set(self._in_flight)
+            finally:
+                queue.task_done()
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """
+        Перестает принимать новые сообщения и ждет (не дольше `timeout`), пока очередь
+        и обрабатываемые сообщения закончатся, затем останавливает рабочие задачи.
+        """
+        if self._queue is None or self._loop is not asyncio.get_running_loop():
+            return
+        self._draining = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Очередь обработки не опустела за {timeout} с: осталось {self._queue.qsize()} сообщений.")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        self._queue = None
+
+
+admission = AdmissionController(
+    workers=settings.ADMISSION_WORKERS,
+    queue_size=settings.ADMISSION_QUEUE_SIZE,
+    user_rate=settings.ADMISSION_USER_RATE,
+    user_burst=settings.ADMISSION_USER_BURST,
+)
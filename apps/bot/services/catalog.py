@@ -0,0 +1,100 @@
+"""
+In-memory справочник карт бота: ID → имя и тип.
+
+Нужен там, где достаточно имени карты и не требуется полный объект `Card` с тегами
+и изображением — например, для текстовой сводки по колодам до того, как готовы
+изображения. Справочник загружается целиком при первом обращении, а при изменении
+карт (шина инвалидации) затронутые записи удаляются и подгружаются заново по запросу.
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from apps.bot.services.metrics import record_cache
+from apps.cards.models import Card
+from apps.cards.services.invalidation import CardChangeEvent
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogEntry(NamedTuple):
+    name: str
+    card_type: str
+
+
+class CardCatalog:
+    """Справочник карт с ленивой полной загрузкой и точечной инвалидацией."""
+
+    def __init__(self):
+        self._entries: Dict[int, CatalogEntry] = {}
+        self._loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+        # Инвалидация может прийти из потока (сигналы админки), а чтение — из event loop.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def _fetch(self, card_ids: Optional[Iterable[int]] = None) -> Dict[int, CatalogEntry]:
+        queryset = Card.objects.all()
+        if card_ids is not None:
+            queryset = queryset.filter(card_id__in=list(card_ids))
+        return {
+            card_id: CatalogEntry(name, card_type)
+            async for card_id, name, card_type in queryset.values_list('card_id', 'name', 'card_type')
+        }
+
+    async def load(self) -> int:
+        """Загружает справочник целиком (повторные вызовы перечитывают его). Возвращает число карт."""
+        entries = await self._fetch()
+        with self._lock:
+            self._entries = entries
+            self._loaded = True
+        logger.info(f"Справочник карт загружен: {len(entries)} карт.")
+        return len(entries)
+
+    def load_entries(self, entries: Dict[int, CatalogEntry]) -> None:
+        """Заполняет справочник готовыми записями (например, из снимка) без запроса к БД."""
+        with self._lock:
+            self._entries = dict(entries)
+            self._loaded = True
+
+    async def get_many(self, card_ids: Iterable[int]) -> Dict[int, CatalogEntry]:
+        """Возвращает записи для известных карт; отсутствующие в справочнике дочитываются из БД."""
+        if not self._loaded:
+            # Один общий замок на loop: параллельные первые запросы не грузят справочник несколько раз.
+            if self._load_lock is None:
+                self._load_lock = asyncio.Lock()
+            async with self._load_lock:
+                if not self._loaded:
+                    await self.load()
+
+        card_ids = set(card_ids)
+        with self._lock:
+            found = {card_id: self._entries[card_id] for card_id in card_ids if card_id in self._entries}
+        missing = card_ids - found.keys()
+        record_cache("catalog", hit=not missing)
+        if missing:
+            fetched = await self._fetch(missing)
+            with self._lock:
+                self._entries.update(fetched)
+            found.update(fetched)
+        return found
+
+    async def names(self, card_ids: Iterable[int]) -> List[str]:
+        """Отсортированные уникальные имена карт (неизвестные карты пропускаются)."""
+        return sorted({entry.name for entry in (await self.get_many(card_ids)).values()})
+
+    def invalidate(self, event: CardChangeEvent) -> None:
+        """Обработчик шины инвалидации: удаляет измененные карты, они будут перечитаны при обращении."""
+        with self._lock:
+            for card_id in event.card_ids:
+                self._entries.pop(card_id, None)
+
+
+catalog = CardCatalog()
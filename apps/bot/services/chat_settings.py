@@ -0,0 +1,45 @@
+"""
+Настройки чатов (способ вывода нескольких колод) с кэшем в памяти бота.
+
+Настройка читается на каждое сообщение с кодами, а меняется редко — командой `/mode`
+(обновляет кэш сразу) или в админке (бот подхватит изменение через `CACHE_TTL` секунд).
+"""
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from apps.users.models import ChatSettings
+
+CACHE_TTL = 300.0
+
+_cache: Dict[int, Tuple[float, Optional[str]]] = {}
+
+
+def default_output() -> str:
+    return (
+        ChatSettings.DeckOutput.PROGRESSIVE if settings.BOT_PROGRESSIVE_DELIVERY
+        else ChatSettings.DeckOutput.ALBUM
+    )
+
+
+async def get_output_mode(chat_id: int) -> str:
+    """Способ вывода нескольких колод для чата: из настроек чата или по умолчанию для бота."""
+    cached = _cache.get(chat_id)
+    now = time.monotonic()
+    if cached is not None and cached[0] > now:
+        mode = cached[1]
+    else:
+        chat_settings = await ChatSettings.objects.filter(chat_id=chat_id).afirst()
+        mode = chat_settings.deck_output if chat_settings else None
+        _cache[chat_id] = (now + CACHE_TTL, mode)
+    return mode or default_output()
+
+
+async def set_output_mode(chat_id: int, mode: str) -> None:
+    await ChatSettings.objects.aupdate_or_create(chat_id=chat_id, defaults={'deck_output': mode})
+    _cache[chat_id] = (time.monotonic() + CACHE_TTL, mode)
+
+
+def clear_cache() -> None:
+    _cache.clear()
@@ -0,0 +1,258 @@
+"""
+Доступ к базе данных на горячем пути бота.
+
+Обработчики сообщений работают через «хранилище» с небольшим набором операций:
+поиск и создание колоды, загрузка карт с тегами, upsert пользователя и запись активности.
+
+- `OrmBotStore` (по умолчанию) использует Django ORM. Асинхронные методы ORM выполняют
+  запросы в отдельном потоке через `sync_to_async`, поэтому каждая операция платит
+  за переключение потоков и разбор queryset.
+- `PostgresBotStore` (`BOT_NATIVE_DB=True`) выполняет те же операции нативно через
+  `psycopg` с пулом асинхронных соединений (`psycopg_pool.AsyncConnectionPool`),
+  подготовленными запросами и без перехода в поток. Результаты превращаются в обычные
+  экземпляры моделей (`Model.from_db`), так что остальной код бота не меняется.
+
+Админка и management-команды по-прежнему работают только через ORM.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from django.conf import settings
+from django.db import IntegrityError
+
+from apps.cards.models import Card, Tag
+from apps.cards.services.invalidation import build_conninfo
+from apps.users.models import Deck, DeckCard, TelegramUser, UserActivity
+from apps.users.services import log_user_activity
+
+logger = logging.getLogger(__name__)
+
+
+class OrmBotStore:
+    """Операции горячего пути бота через Django ORM."""
+
+    async def get_deck(self, code: str) -> Optional[Deck]:
+        return await Deck.objects.filter(deck_code=code).afirst()
+
+    async def create_deck(
+            self, code: str, owner: TelegramUser, character_ids: List[int], action_ids: List[int]
+    ) -> Deck:
+        try:
+            return await Deck.objects.acreate(
+                deck_code=code,
+                owner=owner,
+                character_card_ids=character_ids,
+                action_card_ids=action_ids
+            )
+        except IntegrityError:
+            # Тот же код одновременно обработан другим сообщением — используем уже созданную колоду.
+            return await Deck.objects.aget(deck_code=code)
+
+    async def existing_card_ids(self, card_ids: Iterable[int]) -> Set[int]:
+        ids_qs = Card.objects.filter(card_id__in=set(card_ids)).values_list('card_id', flat=True)
+        return {card_id async for card_id in ids_qs}
+
+    async def get_cards(self, card_ids: Iterable[int]) -> Dict[int, Card]:
+        """Возвращает карты по ID с предзагруженными тегами."""
+        cards_qs = Card.objects.filter(card_id__in=set(card_ids)).prefetch_related('tags')
+        return {card.card_id: card async for card in cards_qs}
+
+    async def upsert_user(self, user_id: int, username: Optional[str], first_name: str,
+                          last_name: Optional[str]) -> TelegramUser:
+        user, _ = await TelegramUser.objects.aupdate_or_create(
+            user_id=user_id,
+            defaults={'username': username, 'first_name': first_name, 'last_name': last_name},
+        )
+        return user
+
+    async def log_activity(
+            self, user: TelegramUser, activity_type: UserActivity.ActivityType, details: Dict[str, Any]
+    ) -> None:
+        await log_user_activity(user, activity_type, details)
+
+    async def close(self) -> None:
+        pass
+
+
+def _columns(model) -> Tuple[List[str], str]:
+    """Возвращает имена атрибутов и SQL-список колонок модели (в одном порядке)."""
+    fields = model._meta.concrete_fields
+    return [field.attname for field in fields], ", ".join(f'"{field.column}"' for field in fields)
+
+
+def _card_from_row(row: Tuple[Any, ...], card_attnames: List[str]) -> Card:
+    """
+    Создает `Card` из строки запроса, последний столбец которой — список пар (id, name) тегов.
+    Теги кладутся в кэш prefetch, поэтому `card.tags.all()` не обращается к базе.
+    """
+    *values, tag_pairs = row
+    card = Card.from_db('default', card_attnames, values)
+    tags = [Tag.from_db('default', ['id', 'name'], pair) for pair in tag_pairs]
+    tags_qs = card.tags.get_queryset()
+    tags_qs._result_cache = tags
+    tags_qs._prefetch_done = True
+    card._prefetched_objects_cache = {'tags': tags_qs}
+    return card
+
+
+class PostgresBotStore:
+    """
+    Те же операции, что и `OrmBotStore`, но нативно через пул `psycopg`.
+    Все запросы выполняются в режиме autocommit; `prepare_threshold=0` заставляет psycopg
+    готовить каждый запрос на сервере с первого выполнения на соединении.
+    Несовместимо с пулерами в режиме transaction (pgbouncer), где подготовленные запросы теряются.
+    """
+
+    _deck_attnames, _deck_columns = _columns(Deck)
+    _card_attnames, _card_columns = _columns(Card)
+    _user_attnames, _user_columns = _columns(TelegramUser)
+
+    def __init__(self, conninfo: str, min_size: int = 2, max_size: int = 10):
+        from psycopg_pool import AsyncConnectionPool
+
+        self.pool = AsyncConnectionPool(
+            conninfo,
+            min_size=min_size,
+            max_size=max_size,
+            kwargs={'autocommit': True, 'prepare_threshold': 0},
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+            name='kkbot',
+        )
+        deck_table = Deck._meta.db_table
+        tags_field = Card._meta.get_field('tags')
+        tags_through = tags_field.remote_field.through._meta.db_table
+
+        self._sql_get_deck = f'SELECT {self._deck_columns} FROM "{deck_table}" WHERE "deck_code" = %s'
+        self._sql_create_deck = f'''
+            WITH inserted AS (
+                INSERT INTO "{deck_table}" (
+                    "deck_code", "owner_id", "character_card_ids", "action_card_ids",
+                    "resonances", "usage_count", "is_anonymous", "created_at"
+                )
+                VALUES (%s, %s, %s, %s, '[]'::jsonb, 0, false, now())
+                ON CONFLICT ("deck_code") DO NOTHING
+                RETURNING {self._deck_columns}
+            ), indexed AS (
+                INSERT INTO "{DeckCard._meta.db_table}" ("deck_id", "card_id")
+                SELECT inserted."id", card_id FROM inserted, unnest(%s::integer[]) AS card_id
+                ON CONFLICT DO NOTHING
+            )
+            SELECT {self._deck_columns} FROM inserted
+        '''
+        self._sql_existing_cards = f'SELECT "card_id" FROM "{Card._meta.db_table}" WHERE "card_id" = ANY(%s)'
+        card_columns = ", ".join(f'c.{column}' for column in self._card_columns.split(", "))
+        self._sql_get_cards = f'''
+            SELECT {card_columns},
+                   COALESCE(
+                       json_agg(json_build_array(t."id", t."name") ORDER BY t."name")
+                       FILTER (WHERE t."id" IS NOT NULL),
+                       '[]'::json
+                   )
+            FROM "{Card._meta.db_table}" c
+            LEFT JOIN "{tags_through}" ct ON ct."{tags_field.m2m_column_name()}" = c."card_id"
+            LEFT JOIN "{Tag._meta.db_table}" t ON t."id" = ct."{tags_field.m2m_reverse_name()}"
+            WHERE c."card_id" = ANY(%s)
+            GROUP BY c."card_id"
+        '''
+        self._sql_upsert_user = f'''
+            INSERT INTO "{TelegramUser._meta.db_table}" ("user_id", "username", "first_name", "last_name", "created_at")
+            VALUES (%s, %s, %s, %s, now())
+            ON CONFLICT ("user_id") DO UPDATE SET
+                "username" = EXCLUDED."username",
+                "first_name" = EXCLUDED."first_name",
+                "last_name" = EXCLUDED."last_name"
+            RETURNING {self._user_columns}
+        '''
+        self._sql_log_activity = f'''
+            INSERT INTO "{UserActivity._meta.db_table}" ("user_id", "activity_type", "details", "created_at")
+            VALUES (%s, %s, %s, now())
+        '''
+
+    async def open(self, timeout: float = 30.0) -> None:
+        await self.pool.open(wait=True, timeout=timeout)
+        logger.info(f"Пул соединений с PostgreSQL открыт ({self.pool.min_size}–{self.pool.max_size}).")
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    async def _fetchone(self, query: str, params: Tuple[Any, ...]) -> Optional[Tuple[Any, ...]]:
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(query, params)
+            return await cursor.fetchone()
+
+    async def _fetchall(self, query: str, params: Tuple[Any, ...]) -> List[Tuple[Any, ...]]:
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(query, params)
+            return await cursor.fetchall()
+
+    async def get_deck(self, code: str) -> Optional[Deck]:
+        row = await self._fetchone(self._sql_get_deck, (code,))
+        return Deck.from_db('default', self._deck_attnames, row) if row else None
+
+    async def create_deck(
+            self, code: str, owner: TelegramUser, character_ids: List[int], action_ids: List[int]
+    ) -> Deck:
+        from psycopg.types.json import Jsonb
+
+        card_ids = sorted(set(character_ids) | set(action_ids))
+        row = await self._fetchone(
+            self._sql_create_deck, (code, owner.pk, Jsonb(character_ids), Jsonb(action_ids), card_ids)
+        )
+        if row is None:
+            # Колоду с этим кодом уже создал параллельный запрос.
+            return await self.get_deck(code)
+        return Deck.from_db('default', self._deck_attnames, row)
+
+    async def existing_card_ids(self, card_ids: Iterable[int]) -> Set[int]:
+        rows = await self._fetchall(self._sql_existing_cards, (list(set(card_ids)),))
+        return {row[0] for row in rows}
+
+    async def get_cards(self, card_ids: Iterable[int]) -> Dict[int, Card]:
+        rows = await self._fetchall(self._sql_get_cards, (list(set(card_ids)),))
+        cards = (_card_from_row(row, self._card_attnames) for row in rows)
+        return {card.card_id: card for card in cards}
+
+    async def upsert_user(self, user_id: int, username: Optional[str], first_name: str,
+                          last_name: Optional[str]) -> TelegramUser:
+        row = await self._fetchone(self._sql_upsert_user, (user_id, username, first_name, last_name))
+        return TelegramUser.from_db('default', self._user_attnames, row)
+
+    async def log_activity(
+            self, user: TelegramUser, activity_type: UserActivity.ActivityType, details: Dict[str, Any]
+    ) -> None:
+        from psycopg.types.json import Jsonb
+
+        async with self.pool.connection() as conn:
+            await conn.execute(self._sql_log_activity, (user.pk, str(activity_type), Jsonb(details)))
+
+
+_store: Union[OrmBotStore, PostgresBotStore] = OrmBotStore()
+
+
+def get_store() -> Union[OrmBotStore, PostgresBotStore]:
+    """Возвращает активное хранилище бота (`OrmBotStore` или `PostgresBotStore`)."""
+    return _store
+
+
+async def open_store() -> None:
+    """
+    Включает нативный слой PostgreSQL, если задан `BOT_NATIVE_DB`.
+    Вызывается при старте бота; без настройки остается хранилище на ORM.
+    """
+    global _store
+    if not getattr(settings, 'BOT_NATIVE_DB', False):
+        return
+    store = PostgresBotStore(
+        build_conninfo(),
+        min_size=settings.BOT_DB_POOL_MIN_SIZE,
+        max_size=settings.BOT_DB_POOL_MAX_SIZE,
+    )
+    await store.open()
+    _store = store
+
+
+async def close_store() -> None:
+    global _store
+    await _store.close()
+    _store = OrmBotStore()
@@ -1,6 +1,11 @@
+import logging
 from collections import Counter
-from typing import List, Set
+from typing import List, Optional, Set, Tuple
 from apps.cards.models import Card
+from apps.users.models import Deck, TelegramUser
+from apps.bot.services.db import get_store
+from apps.bot.services.hoyolab import decode_deck_code
+from apps.bot.services.metrics import record_cache, stage_timer
 
 RESONANCE_TAGS: Set[str] = {
     # Элементы
@@ -39,4 +44,50 @@ def calculate_resonances(character_cards: List[Card]) -> List[str]:
             resonances.append(tag)
 
     # Сортируем для предсказуемого порядка на изображении и в тестах.
-    return sorted(resonances)
\ No newline at end of file
+    return sorted(resonances)
+
+
+async def get_cards_from_ids_with_duplicates(card_ids: List[int]) -> List[Card]:
+    """
+    Эффективно получает список объектов Card из списка ID, сохраняя дубликаты
+    и предзагружая связанные теги для оптимизации.
+    """
+    if not card_ids:
+        return []
+
+    cards_map = await get_store().get_cards(card_ids)
+
+    result_cards = [cards_map[card_id] for card_id in card_ids if card_id in cards_map]
+
+    return result_cards
+
+
+async def get_or_create_deck(code: str, user: TelegramUser) -> Tuple[Optional[Deck], Optional[str]]:
+    """
+    Проверяет наличие колоды в БД (кэш). Если нет - обращается к API,
+    проверяет наличие всех карт в нашей БД и создает новую запись Deck.
+    Возвращает (Deck, None) при успехе или (None, "сообщение об ошибке") при неудаче.
+    """
+    store = get_store()
+    deck = await store.get_deck(code)
+    record_cache("deck", hit=deck is not None)
+    if deck is not None:
+        return deck, None
+
+    with stage_timer("hoyolab_decode"):
+        decoded_deck, error_message = await decode_deck_code(code)
+    if error_message:
+        return None, error_message
+    if not decoded_deck:
+        return None, "API не вернуло данные о колоде."
+
+    all_api_ids = set(decoded_deck.character_ids) | set(decoded_deck.action_ids)
+    found_ids = await store.existing_card_ids(all_api_ids)
+
+    if found_ids != all_api_ids:
+        missing_ids = all_api_ids - found_ids
+        logging.warning(f"Не найдены карты с ID: {missing_ids}")
+        return None, f"Некоторые карты отсутствуют в базе. ID: {missing_ids}"
+
+    deck = await store.create_deck(code, user, decoded_deck.character_ids, decoded_deck.action_ids)
+    return deck, None
@@ -0,0 +1,111 @@
+"""
+Кодирование готовых изображений (колод и коллажей) перед отправкой в Telegram.
+
+Размер файла напрямую определяет время загрузки фото, поэтому параметры кодирования
+настраиваются (`RENDER_FORMAT`, `RENDER_QUALITY`, `RENDER_SUBSAMPLING`, `RENDER_OPTIMIZE`),
+а при заданном бюджете `RENDER_MAX_BYTES` качество подбирается двоичным поиском:
+берется наибольшее качество не ниже `min_quality`, при котором файл укладывается в бюджет.
+Сравнить варианты по времени кодирования и размеру можно командой `bench_render --encoders`.
+"""
+import io
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from PIL import Image
+from django.conf import settings
+
+from apps.bot.services.metrics import registry
+
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+# Значения параметра `subsampling` кодировщика JPEG в Pillow.
+JPEG_SUBSAMPLING = {'4:4:4': 0, '4:2:2': 1, '4:2:0': 2}
+
+ENCODED_BYTES = registry.histogram(
+    "kkbot_encoded_image_bytes", "Размер закодированных изображений колод", ["format"],
+    buckets=(64_000, 128_000, 192_000, 256_000, 384_000, 512_000, 768_000, 1_048_576, 2_097_152),
+)
+QUALITY_SEARCHES = registry.counter(
+    "kkbot_encode_quality_search_total", "Подбор качества под бюджет размера файла", ["result"]
+)
+
+
+@dataclass(frozen=True)
+class EncoderConfig:
+    """Параметры кодирования. `max_bytes=0` — без бюджета, качество всегда `quality`."""
+    format: str = 'JPEG'
+    quality: int = 90
+    optimize: bool = True
+    subsampling: str = '4:2:0'
+    max_bytes: int = 0
+    min_quality: int = 50
+
+    def __post_init__(self):
+        if self.format not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Неподдерживаемый формат изображения: {self.format}")
+        if self.subsampling not in JPEG_SUBSAMPLING:
+            raise ValueError(f"Неподдерживаемая субдискретизация цвета: {self.subsampling}")
+
+    @property
+    def extension(self) -> str:
+        return FORMAT_EXTENSIONS[self.format]
+
+
+@lru_cache(maxsize=1)
+def default_encoder() -> EncoderConfig:
+    """Параметры кодирования из настроек проекта."""
+    return EncoderConfig(
+        format=settings.RENDER_FORMAT.upper(),
+        quality=settings.RENDER_QUALITY,
+        optimize=settings.RENDER_OPTIMIZE,
+        subsampling=settings.RENDER_SUBSAMPLING,
+        max_bytes=settings.RENDER_MAX_BYTES,
+    )
+
+
+def _save(image: Image.Image, config: EncoderConfig, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if config.format == 'WEBP':
+        # method=4 — компромисс скорости и размера по умолчанию в libwebp; 6 заметно медленнее.
+        image.save(buffer, format='WEBP', quality=quality, method=4)
+    else:
+        # optimize строит оптимальные таблицы Хаффмана: файл меньше без потери качества.
+        image.save(
+            buffer, format='JPEG', quality=quality, optimize=config.optimize,
+            subsampling=JPEG_SUBSAMPLING[config.subsampling],
+        )
+    return buffer.getvalue()
+
+
+def encode_image(image: Image.Image, config: Optional[EncoderConfig] = None) -> bytes:
+    """Кодирует RGB-изображение; при заданном бюджете подбирает качество двоичным поиском."""
+    config = config or default_encoder()
+    data = _save(image, config, config.quality)
+    if config.max_bytes and len(data) > config.max_bytes:
+        data = _fit_budget(image, config, data)
+    ENCODED_BYTES.observe(len(data), config.format)
+    return data
+
+
+def _fit_budget(image: Image.Image, config: EncoderConfig, data: bytes) -> bytes:
+    best: Optional[bytes] = None
+    smallest = data
+    low, high = config.min_quality, config.quality - 1
+    while low <= high:
+        quality = (low + high) // 2
+        candidate = _save(image, config, quality)
+        if len(candidate) <= config.max_bytes:
+            best, low = candidate, quality + 1
+        else:
+            smallest, high = candidate, quality - 1
+    if best is None:
+        # Бюджет недостижим даже при минимальном качестве — отправляем самый маленький вариант.
+        QUALITY_SEARCHES.inc('over_budget')
+        logging.warning(
+            f"Изображение не уложилось в {config.max_bytes} байт (минимум {len(smallest)} байт "
+            f"при качестве {config.min_quality})."
+        )
+        return smallest
+    QUALITY_SEARCHES.inc('fit')
+    return best
@@ -1,11 +1,24 @@
 import io
 import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import replace
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from PIL import Image, ImageDraw, ImageFont
 from django.conf import settings
+from apps.bot.services.encoder import EncoderConfig, default_encoder, encode_image
+from apps.bot.services.metrics import record_cache
 from apps.cards.models import Card
+from apps.cards.services.invalidation import CardChangeEvent
+
+if TYPE_CHECKING:
+    from apps.bot.services.snapshot import CardSnapshot
 
 # --- Константы для отрисовки ---
 BG_SIZE = (801, 1430)
@@ -21,6 +34,14 @@ CARDS_PER_ROW = 6
 RESONANCE_TEXT_COLOR = (80, 56, 30)
 NO_RESONANCE_TEXT = "No Resonance"
 DEFAULT_RESONANCE_COLOR = (128, 128, 128)
+# Полоса фона, в которой рисуются резонансы (между картами персонажей и картами действий).
+RESONANCE_STRIP_HEIGHT = 50
+RESONANCE_STRIP_TOP = Y_RESONANCE - RESONANCE_STRIP_HEIGHT // 2
+RESONANCE_STRIP_CACHE_SIZE = 128
+# Верхняя часть изображения (карты персонажей и резонансы) одинакова у колод с одними персонажами.
+# Строки выше карт персонажей — чистый фон, поэтому полоса начинается с Y_CHAR.
+TOP_BAND_TOP = Y_CHAR
+TOP_BAND_BOTTOM = RESONANCE_STRIP_TOP + RESONANCE_STRIP_HEIGHT
 
 RESONANCE_COLORS = {
     # Элементы
@@ -40,7 +61,37 @@ BG_PATH = ASSETS_DIR / "images" / "background.png"
 BORDER_PATH = ASSETS_DIR / "images" / "border.png"
 FONT_PATH = ASSETS_DIR / "fonts" / "gi_font.ttf"
 
+# Кэш готовых тайлов карт (изображение карты, уменьшенное до нужного размера, с наложенной рамкой).
+# Ключ — (card_id, размер). Записи сбрасываются по событиям шины инвалидации, поэтому TTL не нужен.
+TILE_CACHE_SIZE: int = getattr(settings, 'RENDER_TILE_CACHE_SIZE', 1024)
+_tile_cache: "OrderedDict[Tuple[int, Tuple[int, int]], Image.Image]" = OrderedDict()
+# Рендер выполняется в пуле потоков (`asyncio.to_thread`), поэтому доступ к кэшу защищен блокировкой.
+_tile_cache_lock = threading.Lock()
+
+# Кэш верхних полос (карты персонажей + резонансы) по ключу (ID персонажей по порядку, резонансы).
+# Полоса хранится в RGB (~0,8 МБ), поэтому кэш заметно меньше кэша тайлов.
+TOP_BAND_CACHE_SIZE: int = getattr(settings, 'RENDER_TOP_BAND_CACHE_SIZE', 64)
+_top_band_cache: "OrderedDict[Tuple[Tuple[int, ...], Tuple[str, ...]], Image.Image]" = OrderedDict()
+
+# Снимок с готовыми тайлами, отображенными в память (см. `snapshot.py`). Промах кэша тайлов
+# сначала ищется в снимке и только затем строится из исходного изображения карты.
+_tile_snapshot: Optional["CardSnapshot"] = None
+
+
+@contextmanager
+def _phase(timings: Optional[Dict[str, float]], name: str) -> Iterator[None]:
+    """Суммирует время фазы рендера в `timings`, если словарь передан (используется бенчмарком)."""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
 
+@lru_cache(maxsize=8)
 def _get_font(size: int) -> ImageFont.FreeTypeFont:
     """Загружает шрифт или возвращает шрифт по умолчанию."""
     try:
@@ -50,48 +101,176 @@ def _get_font(size: int) -> ImageFont.FreeTypeFont:
         return ImageFont.load_default(size)
 
 
-def _paste_card(
-        base_image: Image.Image, card: Card, position: tuple[int, int],
-        size: tuple[int, int], border_img: Image.Image
-) -> None:
-    """Вставляет изображение карты с рамкой на основное изображение."""
+@lru_cache(maxsize=8)
+def _get_border(size: tuple[int, int]) -> Image.Image:
+    """Загружает рамку карты, уменьшенную до нужного размера (один раз на размер)."""
+    try:
+        with Image.open(BORDER_PATH) as border_img:
+            return border_img.convert("RGBA").resize(size, Image.Resampling.LANCZOS)
+    except FileNotFoundError as e:
+        logging.error(f"Не найдена рамка карты: {e}")
+        return Image.new("RGBA", size, (0, 0, 0, 0))
+
+
+def _build_tile(
+        card: Card, size: tuple[int, int], timings: Optional[Dict[str, float]] = None
+) -> Optional[Image.Image]:
+    """Загружает изображение карты, уменьшает его и накладывает рамку."""
     card_path = card.local_image_path
     if not card_path.exists():
         logging.warning(f"Изображение для карты '{card.name}' ({card.card_id}) не найдено: {card_path}")
-        return
+        return None
+
+    with Image.open(card_path) as card_img:
+        with _phase(timings, "load"):
+            card_rgba = card_img.convert("RGBA")
+    with _phase(timings, "resize"):
+        tile = card_rgba.resize(size, Image.Resampling.LANCZOS)
+        border = _get_border(size)
+        tile.paste(border, (0, 0), border)
+    return tile
 
-    with Image.open(card_path).convert("RGBA") as card_img:
-        card_resized = card_img.resize(size, Image.Resampling.LANCZOS)
-        border_resized = border_img.resize(size, Image.Resampling.LANCZOS)
-        card_resized.paste(border_resized, (0, 0), border_resized)
-        base_image.paste(card_resized, position, card_resized)
+
+def get_card_tile(
+        card: Card, size: tuple[int, int], timings: Optional[Dict[str, float]] = None
+) -> Optional[Image.Image]:
+    """Возвращает готовый тайл карты из кэша или строит его. Тайл нельзя изменять на месте."""
+    key = (card.card_id, size)
+    with _tile_cache_lock:
+        tile = _tile_cache.get(key)
+        if tile is not None:
+            _tile_cache.move_to_end(key)
+            return tile
+
+    tile = _tile_snapshot.tile(card.card_id, size) if _tile_snapshot is not None else None
+    if tile is None:
+        tile = _build_tile(card, size, timings)
+    if tile is None:
+        # Отсутствующие изображения не кэшируем: файл может появиться после скачивания.
+        return None
+
+    with _tile_cache_lock:
+        _tile_cache[key] = tile
+        _tile_cache.move_to_end(key)
+        while len(_tile_cache) > TILE_CACHE_SIZE:
+            _tile_cache.popitem(last=False)
+    return tile
+
+
+def set_tile_snapshot(snapshot: Optional["CardSnapshot"]) -> None:
+    """Подключает снимок тайлов (None — отключает). Кэш тайлов очищается, чтобы не смешивать источники."""
+    global _tile_snapshot
+    _tile_snapshot = snapshot
+    clear_tile_cache()
+
+
+def preload_card_tiles(cards: Iterable[Card]) -> int:
+    """Заранее строит тайлы карт нужного размера и фон (прогрев при запуске). Возвращает число тайлов."""
+    _load_background()
+    built = 0
+    for card in cards:
+        size = CHAR_CARD_SIZE if card.card_type == Card.CardType.CHARACTER else ACTION_CARD_SIZE
+        built += get_card_tile(card, size) is not None
+    return built
+
+
+def clear_tile_cache() -> None:
+    """Полностью очищает кэш тайлов (например, для замеров «холодного» рендера)."""
+    with _tile_cache_lock:
+        _tile_cache.clear()
+        _top_band_cache.clear()
+
+
+def invalidate_card_tiles(event: CardChangeEvent) -> None:
+    """Обработчик шины инвалидации: удаляет тайлы измененных карт и верхние полосы с ними."""
+    with _tile_cache_lock:
+        stale_keys = [key for key in _tile_cache if key[0] in event.card_ids]
+        for key in stale_keys:
+            del _tile_cache[key]
+        stale_bands = [key for key in _top_band_cache if event.card_ids.intersection(key[0])]
+        for key in stale_bands:
+            del _top_band_cache[key]
+    if _tile_snapshot is not None:
+        _tile_snapshot.discard(event.card_ids)
+    if stale_keys or stale_bands:
+        logging.info(f"Сброшено из кэша тайлов: {len(stale_keys)}, верхних полос: {len(stale_bands)}")
+
+
+def _paste_card(
+        base_image: Image.Image, card: Card, position: tuple[int, int], size: tuple[int, int],
+        timings: Optional[Dict[str, float]] = None,
+) -> bool:
+    """Вставляет изображение карты с рамкой на основное изображение. False — изображения карты нет."""
+    tile = get_card_tile(card, size, timings)
+    if tile is None:
+        return False
+    with _phase(timings, "paste"):
+        base_image.paste(tile, position, tile)
+    return True
 
 
 def create_deck_image(
-        character_cards: List[Card], action_cards: List[Card], resonances: List[str]
+        character_cards: List[Card], action_cards: List[Card], resonances: List[str],
+        timings: Optional[Dict[str, float]] = None, encoder: Optional[EncoderConfig] = None,
 ) -> io.BytesIO:
-    """Создает изображение колоды и возвращает его в виде байтового потока."""
+    """
+    Создает изображение колоды и возвращает его в виде байтового потока
+    (формат и качество — `encoder`, по умолчанию из настроек).
+    Если передан словарь `timings`, в него суммируется время фаз рендера
+    (`load`, `resize`, `paste`, `draw`, `encode`) в секундах.
+    """
+    image = compose_deck_image(character_cards, action_cards, resonances, timings)
+    with _phase(timings, "encode"):
+        data = encode_image(image.convert("RGB"), encoder)
+    return io.BytesIO(data)
+
+
+@lru_cache(maxsize=1)
+def _load_background() -> Image.Image:
+    """Фон колоды загружается один раз; каждый рендер работает с его копией."""
     try:
-        bg_image = Image.open(BG_PATH).convert("RGBA")
-        border_image = Image.open(BORDER_PATH).convert("RGBA")
+        with Image.open(BG_PATH) as bg_img:
+            return bg_img.convert("RGBA")
     except FileNotFoundError as e:
         logging.error(f"Не найдены базовые ассеты: {e}")
-        bg_image = Image.new("RGB", BG_SIZE, "grey")
-        border_image = Image.new("RGBA", (1, 1), (0, 0, 0, 0))
+        return Image.new("RGB", BG_SIZE, "grey")
 
-    draw = ImageDraw.Draw(bg_image)
-    center_x = bg_image.width // 2
 
-    # 1. Отрисовка карт персонажей
-    unique_character_cards = list({card.card_id: card for card in character_cards}.values())
-    total_chars_width = len(unique_character_cards) * CHAR_CARD_SIZE[0] + (
-                len(unique_character_cards) - 1) * CHAR_SPACING
-    start_x_char = center_x - total_chars_width // 2
-    for i, char_card in enumerate(unique_character_cards):
-        x = start_x_char + i * (CHAR_CARD_SIZE[0] + CHAR_SPACING)
-        _paste_card(bg_image, char_card, (x, Y_CHAR), CHAR_CARD_SIZE, border_image)
-
-    # 2. Отрисовка резонансов
+@lru_cache(maxsize=16)
+def _character_positions(width: int, count: int) -> Tuple[Tuple[int, int], ...]:
+    """Координаты карт персонажей: ряд по центру изображения."""
+    total_width = count * CHAR_CARD_SIZE[0] + (count - 1) * CHAR_SPACING
+    start_x = width // 2 - total_width // 2
+    return tuple((start_x + i * (CHAR_CARD_SIZE[0] + CHAR_SPACING), Y_CHAR) for i in range(count))
+
+
+@lru_cache(maxsize=64)
+def _action_positions(width: int, count: int) -> Tuple[Tuple[int, int], ...]:
+    """Координаты карт действий: сетка по CARDS_PER_ROW в ряд."""
+    total_row_width = CARDS_PER_ROW * ACTION_CARD_SIZE[0] + (CARDS_PER_ROW - 1) * ACTION_X_SPACING
+    start_x = width // 2 - total_row_width // 2
+    return tuple(
+        (
+            start_x + (i % CARDS_PER_ROW) * (ACTION_CARD_SIZE[0] + ACTION_X_SPACING),
+            Y_ACTION_START + (i // CARDS_PER_ROW) * (ACTION_CARD_SIZE[1] + ACTION_Y_SPACING),
+        )
+        for i in range(count)
+    )
+
+
+@lru_cache(maxsize=RESONANCE_STRIP_CACHE_SIZE)
+def _resonance_strip(resonances: Tuple[str, ...]) -> Image.Image:
+    """
+    Полоса фона с нарисованными резонансами. Комбинаций резонансов немного, поэтому полосы
+    рисуются один раз на комбинацию и при рендере просто вставляются поверх фона.
+    Ключ — отсортированный кортеж резонансов. Результат нельзя изменять на месте.
+    """
+    background = _load_background()
+    strip = background.crop((0, RESONANCE_STRIP_TOP, background.width, RESONANCE_STRIP_TOP + RESONANCE_STRIP_HEIGHT))
+    draw = ImageDraw.Draw(strip)
+    center_x = strip.width // 2
+    y_pos = Y_RESONANCE - RESONANCE_STRIP_TOP
+
     font_res = _get_font(22)
     spacing_res = 35
     circle_text_gap = 12
@@ -115,8 +294,6 @@ def create_deck_image(
     current_x = center_x - total_res_width // 2
 
     for item in items_to_draw:
-        y_pos = Y_RESONANCE
-
         if item["color"]:
             y_circle_start = y_pos - circle_diameter // 2
             x_circle_end = current_x + circle_diameter
@@ -132,19 +309,122 @@ def create_deck_image(
 
         draw.text((current_x, y_pos), item["text"], font=font_res, fill=RESONANCE_TEXT_COLOR, anchor="lm")
         current_x += item["width"] - (circle_diameter + circle_text_gap if item["color"] else 0) + spacing_res
+    return strip
 
-    # 3. Отрисовка карт действий
-    total_row_width = CARDS_PER_ROW * ACTION_CARD_SIZE[0] + (CARDS_PER_ROW - 1) * ACTION_X_SPACING
-    start_x_action = center_x - total_row_width // 2
-    for i, action_card in enumerate(action_cards):
-        row = i // CARDS_PER_ROW
-        col = i % CARDS_PER_ROW
-        x = start_x_action + col * (ACTION_CARD_SIZE[0] + ACTION_X_SPACING)
-        y = Y_ACTION_START + row * (ACTION_CARD_SIZE[1] + ACTION_Y_SPACING)
-        _paste_card(bg_image, action_card, (x, y), ACTION_CARD_SIZE, border_image)
-
-    # 4. Сохранение в байтовый поток
-    image_bytes = io.BytesIO()
-    bg_image.convert("RGB").save(image_bytes, format='JPEG', quality=90)
-    image_bytes.seek(0)
-    return image_bytes
\ No newline at end of file
+
+def _build_top_band(
+        character_cards: List[Card], resonances: Tuple[str, ...], timings: Optional[Dict[str, float]] = None,
+) -> Tuple[Image.Image, bool]:
+    """Рисует верхнюю полосу. Возвращает ее и признак того, что все изображения карт найдены."""
+    background = _load_background()
+    band = background.crop((0, TOP_BAND_TOP, background.width, TOP_BAND_BOTTOM))
+    positions = _character_positions(band.width, len(character_cards))
+    complete = True
+    for char_card, (x, y) in zip(character_cards, positions):
+        complete &= _paste_card(band, char_card, (x, y - TOP_BAND_TOP), CHAR_CARD_SIZE, timings)
+    with _phase(timings, "draw"):
+        band.paste(_resonance_strip(resonances), (0, RESONANCE_STRIP_TOP - TOP_BAND_TOP))
+    # Альфа-канал при итоговом конвертировании в RGB все равно отбрасывается.
+    return band.convert("RGB"), complete
+
+
+def get_top_band(
+        character_cards: List[Card], resonances: Tuple[str, ...], timings: Optional[Dict[str, float]] = None,
+) -> Image.Image:
+    """Возвращает верхнюю полосу из кэша или строит ее. Полосу нельзя изменять на месте."""
+    key = (tuple(card.card_id for card in character_cards), resonances)
+    with _tile_cache_lock:
+        band = _top_band_cache.get(key)
+        if band is not None:
+            _top_band_cache.move_to_end(key)
+    record_cache("top_band", hit=band is not None)
+    if band is not None:
+        return band
+
+    band, complete = _build_top_band(character_cards, resonances, timings)
+    if complete and TOP_BAND_CACHE_SIZE > 0:
+        # Полосы с недостающими картами не кэшируем: изображения могут появиться после скачивания.
+        with _tile_cache_lock:
+            _top_band_cache[key] = band
+            _top_band_cache.move_to_end(key)
+            while len(_top_band_cache) > TOP_BAND_CACHE_SIZE:
+                _top_band_cache.popitem(last=False)
+    return band
+
+
+def compose_deck_image(
+        character_cards: List[Card], action_cards: List[Card], resonances: List[str],
+        timings: Optional[Dict[str, float]] = None,
+) -> Image.Image:
+    """
+    Собирает изображение колоды без кодирования (RGBA или RGB, если фон не найден)
+    из готовых частей: копии фона, верхней полосы (персонажи и резонансы) из кэша
+    и тайлов карт действий по заранее рассчитанным координатам.
+    """
+    with _phase(timings, "load"):
+        bg_image = _load_background().copy()
+
+    # 1. Карты персонажей и резонансы
+    unique_character_cards = list({card.card_id: card for card in character_cards}.values())
+    top_band = get_top_band(unique_character_cards, tuple(sorted(resonances)), timings)
+    with _phase(timings, "paste"):
+        bg_image.paste(top_band, (0, TOP_BAND_TOP))
+
+    # 2. Карты действий
+    for action_card, position in zip(action_cards, _action_positions(bg_image.width, len(action_cards))):
+        _paste_card(bg_image, action_card, position, ACTION_CARD_SIZE, timings)
+
+    return bg_image
+
+
+COLLAGE_CELL_WIDTH = 400
+COLLAGE_GAP = 12
+COLLAGE_BG_COLOR = (40, 34, 28)
+COLLAGE_BADGE_SIZE = 48
+# Ячейки коллажа — уменьшенные копии уже сжатых изображений, поэтому качество выше этого не нужно.
+COLLAGE_MAX_QUALITY = 85
+
+
+def collage_grid(count: int) -> Tuple[int, int]:
+    """Число колонок и строк сетки: изображения колод вытянуты по вертикали, поэтому колонок больше, чем строк."""
+    aspect = BG_SIZE[1] / BG_SIZE[0]
+    cols = max(1, min(count, round(math.sqrt(count * aspect))))
+    return cols, math.ceil(count / cols)
+
+
+def create_collage(
+        deck_images: List[bytes], numbers: List[int], cell_width: int = COLLAGE_CELL_WIDTH,
+        encoder: Optional[EncoderConfig] = None,
+) -> io.BytesIO:
+    """
+    Собирает готовые изображения колод в одну сетку и подписывает каждую колоду номером
+    (тем же, что в подписи к сообщению). Возвращает изображение в байтовом потоке.
+    """
+    cell_height = round(cell_width * BG_SIZE[1] / BG_SIZE[0])
+    cols, rows = collage_grid(len(deck_images))
+    canvas = Image.new(
+        "RGB",
+        (cols * cell_width + (cols + 1) * COLLAGE_GAP, rows * cell_height + (rows + 1) * COLLAGE_GAP),
+        COLLAGE_BG_COLOR,
+    )
+    draw = ImageDraw.Draw(canvas)
+    font = _get_font(28)
+
+    for i, (data, number) in enumerate(zip(deck_images, numbers)):
+        with Image.open(io.BytesIO(data)) as image:
+            # JPEG сразу декодируется в уменьшенном масштабе — это в разы быстрее полного декодирования.
+            image.draft("RGB", (cell_width, cell_height))
+            cell = image.convert("RGB").resize((cell_width, cell_height), Image.Resampling.LANCZOS)
+        x = COLLAGE_GAP + (i % cols) * (cell_width + COLLAGE_GAP)
+        y = COLLAGE_GAP + (i // cols) * (cell_height + COLLAGE_GAP)
+        canvas.paste(cell, (x, y))
+
+        badge = (x + 8, y + 8, x + 8 + COLLAGE_BADGE_SIZE, y + 8 + COLLAGE_BADGE_SIZE)
+        draw.rounded_rectangle(badge, radius=10, fill=(250, 244, 230), outline=RESONANCE_TEXT_COLOR, width=3)
+        draw.text(
+            ((badge[0] + badge[2]) // 2, (badge[1] + badge[3]) // 2), str(number),
+            font=font, fill=RESONANCE_TEXT_COLOR, anchor="mm",
+        )
+
+    encoder = encoder or default_encoder()
+    return io.BytesIO(encode_image(canvas, replace(encoder, quality=min(encoder.quality, COLLAGE_MAX_QUALITY))))
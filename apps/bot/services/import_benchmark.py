@@ -0,0 +1,91 @@
+"""
+Измерение времени импорта модулей проекта.
+
+Каждый модуль импортируется в отдельном процессе `python -X importtime` после `django.setup()`,
+поэтому результаты не зависят от уже загруженных модулей. Из журнала `-X importtime`
+берется собственное время импорта каждого модуля; оно суммируется по пакетам верхнего уровня,
+чтобы было видно, какие зависимости (aiogram, aiohttp, Pillow...) утяжеляют запуск.
+Используется командой `bench_imports`.
+"""
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.management import get_commands
+
+# Маркер в stderr отделяет импорты `django.setup()` от импортов измеряемого модуля.
+TARGET_MARKER = "--- import target ---"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+_PROBE = (
+    "import sys, time, importlib, django\n"
+    "started = time.perf_counter()\n"
+    "django.setup()\n"
+    "setup = time.perf_counter() - started\n"
+    "sys.stderr.write({marker!r} + '\\n')\n"
+    "started = time.perf_counter()\n"
+    "importlib.import_module({module!r})\n"
+    "print(setup, time.perf_counter() - started)\n"
+)
+
+
+class ImportRecord(NamedTuple):
+    """Строка журнала `-X importtime`: время в микросекундах и глубина вложенности импорта."""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+class ImportProfile(NamedTuple):
+    module: str
+    setup_seconds: float
+    import_seconds: float
+    packages: Dict[str, float]  # Пакет верхнего уровня -> собственное время импорта его модулей, с.
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """Разбирает журнал `-X importtime`; посторонние строки пропускаются."""
+    records: List[ImportRecord] = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        records.append(ImportRecord(module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return records
+
+
+def package_totals(records: List[ImportRecord]) -> Dict[str, float]:
+    """Суммарное собственное время импорта по пакетам верхнего уровня в секундах, по убыванию."""
+    totals: Dict[str, float] = defaultdict(float)
+    for record in records:
+        totals[record.module.split('.')[0]] += record.self_us / 1_000_000
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def measure_import(module: str, settings_module: Optional[str] = None) -> ImportProfile:
+    """Импортирует модуль в чистом процессе и возвращает время `django.setup()` и импорта модуля."""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module or os.environ['DJANGO_SETTINGS_MODULE']}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE.format(marker=TARGET_MARKER, module=module)],
+        capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Не удалось импортировать {module}: {result.stderr.strip().splitlines()[-1:]}")
+    setup_seconds, import_seconds = map(float, result.stdout.split()[-2:])
+    _, _, target_log = result.stderr.partition(TARGET_MARKER)
+    return ImportProfile(module, setup_seconds, import_seconds, package_totals(parse_importtime(target_log)))
+
+
+def command_modules() -> Dict[str, str]:
+    """Модули management-команд приложений проекта: имя команды -> путь модуля."""
+    return {
+        name: f"{app}.management.commands.{name}"
+        for name, app in sorted(get_commands().items())
+        if app.startswith('apps.')
+    }
@@ -0,0 +1,443 @@
+"""
+Нагрузочный тест бота без Telegram и Hoyolab.
+
+Поднимает в процессе два HTTP-сервера на aiohttp:
+  - фейковый Telegram Bot API (`getUpdates`, `sendMessage`, `sendPhoto`, `sendMediaGroup`,
+    `deleteMessage` и т.д.), который отдает боту сгенерированные сообщения и фиксирует ответы;
+  - заглушку Hoyolab, раскодирующую коды колод из `data/decks.csv`.
+
+Бот работает на настоящем диспетчере из `apps.bot.main` в режиме polling или вебхука
+(апдейты отправляются POST-запросами на обработчик из `apps.bot.services.webhook`), поэтому
+измеряется весь путь обработки: доставка апдейта, БД, рендер и отправка ответов.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Update
+import aiohttp
+from aiohttp import web
+
+from apps.bot.services import hoyolab
+from apps.bot.services.render_benchmark import SampleDeck
+
+logger = logging.getLogger(__name__)
+
+LOADTEST_BOT_TOKEN = "123456789:LOADTEST"
+LOADTEST_WEBHOOK_PATH = "/webhook"
+LOADTEST_WEBHOOK_SECRET = "loadtest-secret"
+HOYOLAB_DECODE_PATH = "/event/cardsquare/decode_card_code"
+# Методы Bot API, ответ на которые — отправленное сообщение (или список сообщений).
+SEND_METHODS = {'sendMessage', 'sendPhoto', 'sendMediaGroup'}
+
+
+@dataclass
+class LoadTestConfig:
+    """Параметры генерируемой нагрузки."""
+    messages: int = 100
+    # Скорость подачи сообщений в секунду; 0 — все сообщения сразу.
+    rate: float = 10.0
+    # Доля сообщений с `multi_size` кодами (остальные — с одним кодом).
+    multi_ratio: float = 0.2
+    multi_size: int = 20
+    # Доля сообщений из групп (`/kk <коды>`), остальные — из личных чатов.
+    group_ratio: float = 0.3
+    users: int = 50
+    groups: int = 5
+    # Искусственная задержка ответов фейкового Bot API и Hoyolab (в секундах).
+    api_latency: float = 0.0
+    hoyolab_latency: float = 0.0
+    # Доля запросов на отправку, на которые фейковый Bot API отвечает 429 (retry_after).
+    flood_ratio: float = 0.0
+    flood_retry_after: int = 1
+    timeout: float = 300.0
+    seed: int = 42
+    # Способ доставки апдейтов боту: 'polling' (getUpdates) или 'webhook'.
+    mode: str = 'polling'
+
+
+@dataclass
+class UpdateRecord:
+    """Судьба одного сгенерированного сообщения."""
+    kind: str
+    codes: int
+    enqueued_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    first_photo_at: Optional[float] = None
+    photos: int = 0
+    deck_errors: int = 0
+    rejected: bool = False
+    exception: Optional[str] = None
+
+    @property
+    def latency(self) -> Optional[float]:
+        return self.finished_at - self.enqueued_at if self.finished_at else None
+
+    @property
+    def time_to_first_photo(self) -> Optional[float]:
+        return self.first_photo_at - self.enqueued_at if self.first_photo_at else None
+
+
+@dataclass
+class LoadTestResult:
+    records: List[UpdateRecord]
+    elapsed: float
+    api_calls: Dict[str, int] = field(default_factory=dict)
+    uploaded_bytes: int = 0
+    flood_responses: int = 0
+
+    @property
+    def completed(self) -> List[UpdateRecord]:
+        return [record for record in self.records if record.finished_at is not None]
+
+
+class FakeTelegramServer:
+    """
+    Минимальная имитация Telegram Bot API. Апдейты, добавленные через `push_update`,
+    отдаются боту через long polling `getUpdates`; ответы бота сопоставляются
+    с исходными сообщениями по `reply_to_message_id`.
+    """
+
+    def __init__(self, api_latency: float = 0.0, flood_ratio: float = 0.0, flood_retry_after: int = 1,
+                 seed: int = 0):
+        self.api_latency = api_latency
+        self.flood_ratio = flood_ratio
+        self.flood_retry_after = flood_retry_after
+        self.flood_responses = 0
+        self._random = random.Random(seed)
+        self.records: Dict[int, UpdateRecord] = {}
+        self._replies: Dict[int, UpdateRecord] = {}
+        self.api_calls: Dict[str, int] = {}
+        self.uploaded_bytes = 0
+        self._updates: List[Dict[str, Any]] = []
+        self._new_update = asyncio.Event()
+        self._next_update_id = 1
+        self._next_message_id = 1
+
+    def routes(self) -> List[web.RouteDef]:
+        return [web.post('/bot{token}/{method}', self._handle)]
+
+    def next_message_id(self) -> int:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    def track(self, message: Dict[str, Any], record: UpdateRecord) -> Dict[str, Any]:
+        """Регистрирует входящее сообщение для сопоставления ответов. Возвращает апдейт с ним."""
+        update_id = self._next_update_id
+        self._next_update_id += 1
+        self.records[message['message_id']] = record
+        return {'update_id': update_id, 'message': message}
+
+    def push_update(self, update: Dict[str, Any]) -> None:
+        """Ставит апдейт в очередь `getUpdates`."""
+        self._updates.append(update)
+        self._new_update.set()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.api_calls[method] = self.api_calls.get(method, 0) + 1
+        params: Dict[str, Any] = {}
+        if request.can_read_body:
+            form = await request.post()
+            for key, value in form.items():
+                if isinstance(value, web.FileField):
+                    self.uploaded_bytes += len(value.file.read())
+                else:
+                    params[key] = value
+
+        if method == 'getUpdates':
+            return self._ok(await self._get_updates(params))
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        if method == 'getMe':
+            return self._ok({'id': 123456789, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'loadtest_bot'})
+        if method == 'editMessageText':
+            self._edit(params)
+            return self._ok(True)
+        if method in SEND_METHODS:
+            if self.flood_ratio and self._random.random() < self.flood_ratio:
+                self.flood_responses += 1
+                return web.json_response({
+                    'ok': False, 'error_code': 429,
+                    'description': f"Too Many Requests: retry after {self.flood_retry_after}",
+                    'parameters': {'retry_after': self.flood_retry_after},
+                })
+            return self._ok(self._send(method, params))
+        # deleteMessage, deleteWebhook и прочие служебные методы.
+        return self._ok(True)
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get('offset') or 0)
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout=float(params.get('timeout') or 0))
+            except asyncio.TimeoutError:
+                pass
+        return list(self._updates)
+
+    def _send(self, method: str, params: Dict[str, Any]) -> Any:
+        chat_id = int(params['chat_id'])
+        record = self.records.get(self._reply_to(params))
+        now = time.perf_counter()
+
+        if method == 'sendMessage':
+            if record and params.get('text', '').startswith("Возникли следующие ошибки"):
+                record.deck_errors += params['text'].count("❌")
+            if record and params.get('text', '').startswith("⏳"):
+                record.rejected = True
+            reply = self._message(chat_id, text=params.get('text', ''))
+            if record:
+                self._replies[reply['message_id']] = record
+            return reply
+
+        photos = len(json.loads(params['media'])) if method == 'sendMediaGroup' else 1
+        if record:
+            record.photos += photos
+            record.first_photo_at = record.first_photo_at or now
+        photo = [{'file_id': 'loadtest', 'file_unique_id': 'loadtest', 'width': 801, 'height': 1430}]
+        if method == 'sendMediaGroup':
+            return [self._message(chat_id, photo=photo) for _ in range(photos)]
+        return self._message(chat_id, photo=photo)
+
+    def _edit(self, params: Dict[str, Any]) -> None:
+        # В прогрессивном режиме ошибки по кодам попадают в сводку, которая редактируется по ходу отправки.
+        record = self._replies.get(int(params.get('message_id') or 0))
+        if record:
+            record.deck_errors = max(record.deck_errors, params.get('text', '').count("❌"))
+
+    @staticmethod
+    def _reply_to(params: Dict[str, Any]) -> Optional[int]:
+        if params.get('reply_to_message_id'):
+            return int(params['reply_to_message_id'])
+        if params.get('reply_parameters'):
+            return json.loads(params['reply_parameters']).get('message_id')
+        return None
+
+    def _message(self, chat_id: int, **content: Any) -> Dict[str, Any]:
+        chat_type = 'supergroup' if chat_id < 0 else 'private'
+        return {
+            'message_id': self.next_message_id(),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': chat_type},
+            **content,
+        }
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+
+class HoyolabStub:
+    """Заглушка API Hoyolab: раскодирует известные коды колод, на остальные отвечает ошибкой."""
+
+    def __init__(self, decks: List[SampleDeck], latency: float = 0.0):
+        self.decks = {deck.deck_code: deck for deck in decks}
+        self.latency = latency
+        self.calls = 0
+
+    def routes(self) -> List[web.RouteDef]:
+        return [web.post(HOYOLAB_DECODE_PATH, self._decode)]
+
+    async def _decode(self, request: web.Request) -> web.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        payload = json.loads(await request.text())
+        deck = self.decks.get(payload.get('code'))
+        if deck is None:
+            return web.json_response({'retcode': -1, 'message': 'Invalid deck code', 'data': None})
+        return web.json_response({'retcode': 0, 'message': 'OK', 'data': {
+            'role_cards': [{'basic': {'item_id': card_id}} for card_id in deck.character_card_ids],
+            'action_cards': [{'basic': {'item_id': card_id}} for card_id in deck.action_card_ids],
+        }})
+
+
+class TrafficGenerator:
+    """Формирует входящие сообщения: один или много кодов, личный чат или группа."""
+
+    def __init__(
+            self,
+            config: LoadTestConfig,
+            deck_codes: List[str],
+            server: FakeTelegramServer,
+            deliver: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.config = config
+        self.deck_codes = deck_codes
+        self.server = server
+        self.deliver = deliver or server.push_update
+        self.random = random.Random(config.seed)
+
+    def make_message(self) -> Tuple[Dict[str, Any], UpdateRecord]:
+        config = self.config
+        multi = self.random.random() < config.multi_ratio
+        in_group = self.random.random() < config.group_ratio
+        count = min(config.multi_size, len(self.deck_codes)) if multi else 1
+        codes = self.random.sample(self.deck_codes, count)
+
+        user_id = 1_000_000 + self.random.randrange(config.users)
+        if in_group:
+            chat = {'id': -1_000_000 - self.random.randrange(config.groups), 'type': 'supergroup', 'title': 'Load'}
+            text = "/kk " + " ".join(codes)
+        else:
+            chat = {'id': user_id, 'type': 'private'}
+            text = "\n".join(codes)
+
+        kind = f"{'multi' if multi else 'single'}-{'group' if in_group else 'private'}"
+        message = {
+            'message_id': self.server.next_message_id(),
+            'date': int(time.time()),
+            'chat': chat,
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Load', 'username': f'load{user_id}'},
+            'text': text,
+        }
+        return message, UpdateRecord(kind=kind, codes=count, enqueued_at=time.perf_counter())
+
+    async def run(self) -> List[UpdateRecord]:
+        records: List[UpdateRecord] = []
+        interval = 1 / self.config.rate if self.config.rate > 0 else 0
+        started = time.perf_counter()
+        for i in range(self.config.messages):
+            if interval:
+                # Открытая модель нагрузки: сообщения подаются по расписанию, не дожидаясь ответов.
+                await asyncio.sleep(max(0.0, started + i * interval - time.perf_counter()))
+            message, record = self.make_message()
+            self.deliver(self.server.track(message, record))
+            records.append(record)
+        return records
+
+
+def _tracking_middleware(
+        server: FakeTelegramServer, done: Callable[[], None]
+) -> Callable[..., Awaitable[Any]]:
+    """Outer-middleware диспетчера: отмечает начало и конец обработки каждого апдейта."""
+    async def middleware(handler, event: Update, data: Dict[str, Any]) -> Any:
+        record = server.records.get(event.message.message_id) if event.message else None
+        if record:
+            record.started_at = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            if record:
+                record.exception = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if record:
+                record.finished_at = time.perf_counter()
+                done()
+    return middleware
+
+
+class WebhookDelivery:
+    """Доставляет апдейты на вебхук бота так же, как Telegram: POST с секретом, не дожидаясь обработки."""
+
+    def __init__(self, url: str, secret: str):
+        self.url = url
+        self.secret = secret
+        self.statuses: Dict[int, int] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _post(self, update: Dict[str, Any]) -> None:
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        async with self._session.post(
+                self.url, json=update, headers={'X-Telegram-Bot-Api-Secret-Token': self.secret}
+        ) as response:
+            self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+
+    def __call__(self, update: Dict[str, Any]) -> None:
+        task = asyncio.create_task(self._post(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+
+async def _start_site(routes: List[web.RouteDef]) -> Tuple[web.AppRunner, str]:
+    app = web.Application(client_max_size=50 * 1024 * 1024)
+    app.add_routes(routes)
+    return await _start_app(app)
+
+
+async def _start_app(app: web.Application) -> Tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+async def run_load_test(config: LoadTestConfig, decks: List[SampleDeck]) -> LoadTestResult:
+    """Запускает бота против фейковых Telegram и Hoyolab и прогоняет сгенерированную нагрузку."""
+    from apps.bot.main import create_bot, create_dispatcher
+    from apps.bot.services.webhook import create_webhook_app
+
+    server = FakeTelegramServer(config.api_latency, config.flood_ratio, config.flood_retry_after, config.seed)
+    hoyolab_stub = HoyolabStub(decks, config.hoyolab_latency)
+    telegram_runner, telegram_url = await _start_site(server.routes())
+    hoyolab_runner, hoyolab_url = await _start_site(hoyolab_stub.routes())
+
+    original_hoyolab_url = hoyolab.HOYOLAB_API_URL
+    hoyolab.HOYOLAB_API_URL = f"{hoyolab_url}{HOYOLAB_DECODE_PATH}?lang=en-us"
+
+    all_done = asyncio.Event()
+    finished = 0
+
+    def done() -> None:
+        nonlocal finished
+        finished += 1
+        if finished >= config.messages:
+            all_done.set()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(telegram_url))
+    bot = create_bot(LOADTEST_BOT_TOKEN, session=session)
+    dp = create_dispatcher()
+    dp.update.outer_middleware(_tracking_middleware(server, done))
+    polling: Optional[asyncio.Task] = None
+    webhook_app: Optional[web.Application] = None
+    webhook_runner: Optional[web.AppRunner] = None
+    delivery: Optional[WebhookDelivery] = None
+    if config.mode == 'webhook':
+        webhook_app = create_webhook_app(bot, dp, LOADTEST_WEBHOOK_PATH, LOADTEST_WEBHOOK_SECRET)
+        webhook_runner, webhook_url = await _start_app(webhook_app)
+        delivery = WebhookDelivery(f"{webhook_url}{LOADTEST_WEBHOOK_PATH}", LOADTEST_WEBHOOK_SECRET)
+    else:
+        polling = asyncio.create_task(dp.start_polling(bot, polling_timeout=1, handle_signals=False))
+
+    started = time.perf_counter()
+    try:
+        records = await TrafficGenerator(config, [deck.deck_code for deck in decks], server, delivery).run()
+        try:
+            await asyncio.wait_for(all_done.wait(), timeout=config.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не все сообщения обработаны за {config.timeout} с: {finished}/{config.messages}")
+        elapsed = time.perf_counter() - started
+    finally:
+        if polling is not None:
+            await dp.stop_polling()
+            await polling
+        if webhook_runner is not None:
+            await delivery.close()
+            await webhook_app['webhook_handler'].drain(timeout=config.timeout)
+            await webhook_runner.cleanup()
+            await bot.session.close()
+        hoyolab.HOYOLAB_API_URL = original_hoyolab_url
+        await telegram_runner.cleanup()
+        await hoyolab_runner.cleanup()
+
+    return LoadTestResult(records, elapsed, dict(server.api_calls), server.uploaded_bytes, server.flood_responses)
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, NamedTuple, Optional
+
+from apps.bot.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = registry.histogram(
+    "kkbot_event_loop_lag_seconds",
+    "Задержка планирования в event loop бота",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_STALLS = registry.counter(
+    "kkbot_event_loop_stalls_total", "Количество блокировок event loop дольше порога"
+)
+
+
+class StallSample(NamedTuple):
+    """Снимок стека потока event loop, сделанный во время его блокировки."""
+    captured_at: float
+    blocked_for: float
+    stack: str
+
+
+class LoopLagMonitor:
+    """
+    Измеряет задержку планирования event loop: корутина засыпает на `interval`
+    и замеряет, насколько позже ее разбудили. Отдельный поток-сторож следит
+    за «пульсом» этой корутины и, если loop не отвечает дольше `threshold`,
+    снимает стек потока loop — так видно, какой синхронный вызов его блокирует.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, samples_to_keep: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples: Deque[StallSample] = deque(maxlen=samples_to_keep)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    async def run(self) -> None:
+        """Фоновая задача измерения задержки. Работает до отмены."""
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Мониторинг задержки event loop запущен (порог {self.threshold * 1000:.0f} мс).")
+
+        try:
+            while True:
+                expected_wakeup = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                lag = max(0.0, loop.time() - expected_wakeup)
+                self._heartbeat = time.monotonic()
+                LOOP_LAG.observe(lag)
+                if lag > self.threshold:
+                    LOOP_STALLS.inc()
+                    logger.warning(f"Event loop был заблокирован на {lag * 1000:.0f} мс.")
+        finally:
+            self._stopped.set()
+
+    def _watch(self) -> None:
+        """Поток-сторож: снимает стек потока loop, пока тот заблокирован (один снимок на блокировку)."""
+        sampled_heartbeat = None
+        while not self._stopped.wait(self.interval / 2):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.threshold or heartbeat == sampled_heartbeat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            sampled_heartbeat = heartbeat
+            stack = "".join(traceback.format_stack(frame))
+            self.samples.append(StallSample(time.time(), blocked_for, stack))
+            logger.warning(f"Event loop заблокирован уже {blocked_for * 1000:.0f} мс. Стек потока loop:\n{stack}")
+
+
+loop_monitor: Optional[LoopLagMonitor] = None
+
+
+def start_loop_monitor(interval: float, threshold: float) -> Optional[asyncio.Task]:
+    """Создает глобальный монитор и запускает его как фоновую задачу. `interval <= 0` отключает мониторинг."""
+    global loop_monitor
+    if interval <= 0:
+        return None
+    loop_monitor = LoopLagMonitor(interval=interval, threshold=threshold)
+    return asyncio.create_task(loop_monitor.run())
@@ -0,0 +1,292 @@
+"""
+Метрики бота в формате Prometheus.
+
+Небольшая самодостаточная реализация счетчиков и гистограмм (без внешних зависимостей)
+и HTTP-эндпоинт `/metrics` на aiohttp, который поднимается внутри процесса бота.
+Помимо бакетов гистограмм для каждого набора меток отдаются квантили p50/p95/p99,
+посчитанные по скользящему окну последних наблюдений.
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES: Tuple[float, ...] = (0.5, 0.95, 0.99)
+# Размер скользящего окна наблюдений для расчета квантилей.
+QUANTILE_WINDOW = 2048
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Монотонно растущий счетчик с метками."""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Текущее значение (глубина очереди, число задач в работе) с метками."""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ('bucket_counts', 'sum', 'count', 'window')
+
+    def __init__(self, bucket_count: int):
+        self.bucket_counts: List[int] = [0] * bucket_count
+        self.sum = 0.0
+        self.count = 0
+        self.window: Deque[float] = deque(maxlen=QUANTILE_WINDOW)
+
+
+class Histogram:
+    """
+    Гистограмма с метками. Экспортируется как стандартная Prometheus-гистограмма
+    (`_bucket`, `_sum`, `_count`) и дополнительно как summary `<name>_quantiles`
+    с p50/p95/p99 по последним наблюдениям.
+    """
+
+    def __init__(
+            self, name: str, documentation: str, label_names: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = _HistogramSeries(len(self.buckets))
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    series.bucket_counts[i] += 1
+                    break
+            series.sum += value
+            series.count += 1
+            series.window.append(value)
+
+    def quantiles(self, *label_values: str) -> Dict[float, float]:
+        """Возвращает квантили по скользящему окну наблюдений для набора меток."""
+        with self._lock:
+            series = self._series.get(label_values)
+            window = sorted(series.window) if series else []
+        if not window:
+            return {}
+        return {q: window[min(len(window) - 1, int(q * len(window)))] for q in QUANTILES}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: (list(s.bucket_counts), s.sum, s.count) for labels, s in self._series.items()}
+        for label_values, (bucket_counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(upper_bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, le)} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+
+        summary_name = f"{self.name}_quantiles"
+        lines += [
+            f"# HELP {summary_name} {self.documentation} (p50/p95/p99 за последние {QUANTILE_WINDOW} наблюдений)",
+            f"# TYPE {summary_name} summary",
+        ]
+        for label_values in sorted(snapshot):
+            for q, value in self.quantiles(*label_values).items():
+                quantile = f'quantile="{q}"'
+                lines.append(
+                    f"{summary_name}{_format_labels(self.label_names, label_values, quantile)} {_format_value(value)}"
+                )
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса; отдает их все в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._metrics.get(name) or self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._metrics.get(name) or self.register(Gauge(name, documentation, label_names))
+
+    def histogram(
+            self, name: str, documentation: str, label_names: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._metrics.get(name) or self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- Метрики конвейера обработки сообщений ---
+STAGE_DURATION = registry.histogram(
+    "kkbot_stage_duration_seconds", "Длительность этапов обработки сообщения с кодами колод", ["stage"]
+)
+STAGE_ERRORS = registry.counter(
+    "kkbot_stage_errors_total", "Количество исключений на этапах обработки", ["stage"]
+)
+CACHE_REQUESTS = registry.counter(
+    "kkbot_cache_requests_total", "Обращения к кэшам бота", ["cache", "result"]
+)
+DECK_ERRORS = registry.counter(
+    "kkbot_deck_errors_total", "Ошибки обработки отдельных кодов колод", ["reason"]
+)
+MESSAGES_PROCESSED = registry.counter(
+    "kkbot_messages_total", "Обработанные сообщения с кодами колод", ["chat_type"]
+)
+
+
+# Если задан словарь, `stage_timer` дополнительно суммирует в него длительности этапов
+# текущей задачи (используется профилировщиком, чтобы приложить тайминги к профилю).
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def collect_stage_timings() -> Iterator[Dict[str, float]]:
+    """Собирает длительности этапов, выполненных внутри блока (в текущем контексте asyncio)."""
+    timings: Dict[str, float] = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    Измеряет длительность этапа и записывает ее в `kkbot_stage_duration_seconds`.
+    Исключения учитываются в `kkbot_stage_errors_total` и пробрасываются дальше.
+    Подходит и для асинхронного кода: `with stage_timer(...): await ...`.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_DURATION.observe(duration, stage)
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + duration
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль выборки (ближайший ранг); 0 для пустой выборки."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _metrics_view(request: "web.Request") -> "web.Response":
+    from aiohttp import web
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> Optional["web.AppRunner"]:
+    """Запускает HTTP-сервер с эндпоинтом `/metrics`. Порт 0 отключает сервер."""
+    if not port:
+        return None
+    # aiohttp импортируется только здесь: метрики используются и в коротких командах (рендер, бенчмарки).
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_view)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики Prometheus доступны на http://{host}:{port}/metrics")
+    return runner
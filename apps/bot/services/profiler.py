@@ -0,0 +1,106 @@
+"""
+Выборочное профилирование обработки сообщений в рабочем процессе бота.
+
+Профилируется только доля запросов, заданная `sample_rate` (`BOT_PROFILE_SAMPLE_RATE`
+или админ-команда `/profile`). При нулевой доле обертка сводится к одной проверке
+числа, так что в обычном режиме накладные расходы незаметны.
+
+Каждый профиль сохраняется в `MEDIA_ROOT/profiles/` как файл `.prof` (формат `pstats`)
+и JSON-файл с метаданными: количество колод в сообщении, общее время и длительности
+этапов. Сводный отчет по самым «горячим» функциям строит команда `profile_report`.
+
+Ограничение: `cProfile` снимает вызовы только в потоке event loop, поэтому рендер
+в `asyncio.to_thread` виден как ожидание, а во время профиля в него попадают
+и шаги других корутин, выполнявшихся параллельно.
+"""
+import asyncio
+import cProfile
+import json
+import logging
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+from django.conf import settings
+
+from apps.bot.services.metrics import collect_stage_timings, registry
+
+logger = logging.getLogger(__name__)
+
+PROFILES_DIR: Path = settings.MEDIA_ROOT / 'profiles'
+
+PROFILES_WRITTEN = registry.counter(
+    "kkbot_profiles_written_total", "Количество сохраненных профилей обработки сообщений"
+)
+
+
+class SamplingProfiler:
+    """
+    Профилирует случайную долю вызовов. Одновременно активен не больше одного профиля:
+    `cProfile` глобален для потока, а все обработчики выполняются в одном event loop.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, output_dir: Path = PROFILES_DIR):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self._active = False
+
+    @property
+    def sample_rate(self) -> float:
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value: float) -> None:
+        self._sample_rate = min(max(float(value), 0.0), 1.0)
+
+    def _should_sample(self) -> bool:
+        return not self._active and random.random() < self._sample_rate
+
+    @asynccontextmanager
+    async def maybe_profile(self, label: str) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Профилирует блок, если запрос попал в выборку. Отдает словарь метаданных,
+        который вызывающий код может дополнить (или `None`, если профиль не снимается).
+        """
+        if self._sample_rate <= 0 or not self._should_sample():
+            yield None
+            return
+
+        self._active = True
+        metadata: Dict[str, Any] = {'label': label}
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            with collect_stage_timings() as timings:
+                profile.enable()
+                try:
+                    yield metadata
+                finally:
+                    profile.disable()
+        finally:
+            self._active = False
+
+        metadata['duration'] = time.perf_counter() - started
+        metadata['stages'] = timings
+        metadata['created_at'] = datetime.now(timezone.utc).isoformat()
+        try:
+            await asyncio.to_thread(self._dump, profile, metadata)
+        except OSError:
+            logger.exception("Не удалось сохранить профиль обработки сообщения")
+
+    def _dump(self, profile: cProfile.Profile, metadata: Dict[str, Any]) -> Path:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{datetime.now(timezone.utc):%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        profile_path = self.output_dir / f"{name}.prof"
+        profile.dump_stats(str(profile_path))
+        profile_path.with_suffix('.json').write_text(json.dumps(metadata, ensure_ascii=False), encoding='utf-8')
+        PROFILES_WRITTEN.inc()
+        logger.info(f"Сохранен профиль {profile_path.name} ({metadata['duration'] * 1000:.0f} мс)")
+        return profile_path
+
+
+profiler = SamplingProfiler(getattr(settings, 'BOT_PROFILE_SAMPLE_RATE', 0.0))
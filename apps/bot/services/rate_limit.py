@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Callable, Dict, Generic, Hashable, TypeVar
+
+
+class TokenBucket:
+    """
+    Асинхронный «ведро токенов»: `rate` токенов в секунду, не больше `capacity` в запасе.
+    Ожидающие `acquire` обслуживаются по очереди (FIFO), а `pause` полностью блокирует
+    ведро на заданное время (например, на `retry_after` из ответа Telegram 429).
+    Рассчитан на работу в одном event loop, поэтому обходится без потоковых блокировок.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> float:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def delay(self, cost: float = 1.0) -> float:
+        """Сколько секунд осталось ждать, пока в ведре наберется `cost` токенов."""
+        now = self._refill()
+        wait = max(0.0, self._paused_until - now)
+        if self._tokens < cost:
+            wait = max(wait, (cost - self._tokens) / self.rate)
+        return wait
+
+    def try_acquire(self, cost: float = 1.0) -> bool:
+        """Забирает токены без ожидания. Возвращает False, если их недостаточно."""
+        if self._lock.locked() or self.delay(cost) > 0:
+            return False
+        self._tokens -= cost
+        return True
+
+    async def acquire(self, cost: float = 1.0) -> float:
+        """Ждет, пока наберется `cost` токенов, и забирает их. Возвращает время ожидания."""
+        started = self._clock()
+        async with self._lock:
+            while (wait := self.delay(cost)) > 0:
+                await asyncio.sleep(wait)
+            self._tokens -= cost
+        return self._clock() - started
+
+    def pause(self, seconds: float) -> None:
+        """Блокирует выдачу токенов на `seconds` секунд от текущего момента."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        """Ведро полное, не на паузе и никто его не ждет — его можно удалить без потери состояния."""
+        return not self._lock.locked() and self.delay(self.capacity) == 0
+
+
+K = TypeVar('K', bound=Hashable)
+
+
+class BucketRegistry(Generic[K]):
+    """Набор ведер по ключу (чат, пользователь). Простаивающие ведра периодически удаляются."""
+
+    def __init__(self, factory: Callable[[K], TokenBucket], max_idle_buckets: int = 10000):
+        self._factory = factory
+        self._buckets: Dict[K, TokenBucket] = {}
+        self._max_idle_buckets = max_idle_buckets
+
+    def get(self, key: K) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self._max_idle_buckets:
+                self._prune()
+            bucket = self._buckets[key] = self._factory(key)
+        return bucket
+
+    def _prune(self) -> None:
+        for key in [key for key, bucket in self._buckets.items() if bucket.idle]:
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
@@ -0,0 +1,252 @@
+"""
+Офлайн-бенчмарк рендера изображений колод и регрессионная проверка по эталонам.
+
+Колоды берутся из `data/decks.csv`, карты создаются как несохраненные объекты `Card`,
+поэтому база данных и сеть не нужны. Если изображений карт нет в `MEDIA_ROOT`
+(или эталоны строятся заново), используется детерминированный синтетический арт.
+
+Эталонные изображения (`apps/bot/tests/golden/`) хранятся в оттенках серого в уменьшенном
+размере и сравниваются с текущим рендером по «перцептивной» разнице: средняя абсолютная
+разница яркости после уменьшения и размытия, что сглаживает различия антиалиасинга шрифтов.
+"""
+import csv
+import hashlib
+import io
+import json
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageStat
+from django.conf import settings
+
+from apps.bot.services.encoder import EncoderConfig, encode_image
+from apps.bot.services.image_generator import BG_SIZE, clear_tile_cache, compose_deck_image, create_deck_image
+from apps.cards.models import Card
+from apps.users.services import open_deck_file, parse_deck_row
+
+SAMPLE_DECKS_PATH: Path = settings.BASE_DIR / 'data' / 'decks.csv'
+GOLDEN_DIR: Path = Path(__file__).resolve().parent.parent / 'tests' / 'golden'
+GOLDEN_MANIFEST = 'manifest.json'
+# Эталоны хранятся в трети исходного размера: этого достаточно, чтобы заметить сдвиг или пропажу карты.
+GOLDEN_SIZE = (BG_SIZE[0] // 3, BG_SIZE[1] // 3)
+# Допустимая средняя разница яркости (0–255) между рендером и эталоном.
+GOLDEN_TOLERANCE = 1.0
+SYNTHETIC_ART_SIZE = (420, 720)
+
+# Варианты кодирования для сравнения (`bench_render --encoders`). Первый — прежнее поведение бота.
+ENCODER_PRESETS: Dict[str, EncoderConfig] = {
+    'jpeg-q90': EncoderConfig(quality=90, optimize=False),
+    'jpeg-q90-opt': EncoderConfig(quality=90),
+    'jpeg-q90-opt-444': EncoderConfig(quality=90, subsampling='4:4:4'),
+    'jpeg-q85-opt': EncoderConfig(quality=85),
+    'jpeg-q80-opt': EncoderConfig(quality=80),
+    'jpeg-q90-120k': EncoderConfig(quality=90, max_bytes=120 * 1024),
+    'webp-q90': EncoderConfig(format='WEBP', quality=90),
+    'webp-q80': EncoderConfig(format='WEBP', quality=80),
+}
+
+
+class SampleDeck(NamedTuple):
+    """Колода для бенчмарка: состав и резонансы без обращения к БД."""
+    deck_code: str
+    character_card_ids: List[int]
+    action_card_ids: List[int]
+    resonances: List[str]
+
+    @property
+    def card_ids(self) -> List[int]:
+        return [*self.character_card_ids, *self.action_card_ids]
+
+    def cards(self) -> Tuple[List[Card], List[Card]]:
+        """Возвращает несохраненные объекты карт персонажей и действий (с дубликатами)."""
+        def build(ids: Iterable[int], card_type: str) -> List[Card]:
+            return [Card(card_id=card_id, name=str(card_id), card_type=card_type) for card_id in ids]
+        return (
+            build(self.character_card_ids, Card.CardType.CHARACTER),
+            build(self.action_card_ids, Card.CardType.ACTION),
+        )
+
+
+def load_sample_decks(path: Path = SAMPLE_DECKS_PATH, limit: Optional[int] = None) -> List[SampleDeck]:
+    """Читает первые `limit` корректных колод из CSV-файла формата `data/decks.csv`."""
+    decks: List[SampleDeck] = []
+    with open_deck_file(path, 'r') as f:
+        for raw_row in csv.DictReader(f):
+            try:
+                row = parse_deck_row(raw_row)
+            except (ValueError, TypeError, KeyError, AttributeError):
+                continue
+            if not row.character_card_ids:
+                continue
+            decks.append(SampleDeck(row.deck_code, row.character_card_ids, row.action_card_ids, row.resonances))
+            if limit is not None and len(decks) >= limit:
+                break
+    return decks
+
+
+def synthetic_card_art(card_id: int) -> Image.Image:
+    """Детерминированная «картинка карты»: градиент и фигуры, цвета которых зависят от ID."""
+    seed = hashlib.sha256(str(card_id).encode()).digest()
+    width, height = SYNTHETIC_ART_SIZE
+    top, bottom = seed[0:3], seed[3:6]
+    gradient = Image.new("RGB", (1, height))
+    for y in range(height):
+        t = y / (height - 1)
+        gradient.putpixel((0, y), tuple(int(a + (b - a) * t) for a, b in zip(top, bottom)))
+    image = gradient.resize((width, height))
+
+    draw = ImageDraw.Draw(image)
+    for i in range(4):
+        x0, y0 = seed[6 + i] % (width // 2), seed[10 + i] % (height // 2)
+        size = 80 + seed[14 + i] % 160
+        draw.ellipse((x0, y0, x0 + size, y0 + size), fill=tuple(seed[18 + i * 3:21 + i * 3]))
+    draw.rectangle((20, height - 120, width - 20, height - 40), fill=(240, 240, 240))
+    return image
+
+
+def ensure_card_art(card_ids: Iterable[int], media_root: Path, overwrite: bool = False) -> int:
+    """Создает синтетические изображения карт в `media_root/card_images`. Возвращает их количество."""
+    images_dir = media_root / 'card_images'
+    images_dir.mkdir(parents=True, exist_ok=True)
+    created = 0
+    for card_id in set(card_ids):
+        path = images_dir / f"{card_id}.webp"
+        if overwrite or not path.exists():
+            synthetic_card_art(card_id).save(path, format='WEBP', quality=80)
+            created += 1
+    return created
+
+
+def has_real_art(card_ids: Iterable[int]) -> bool:
+    """Проверяет, что для всех карт есть скачанные изображения в `MEDIA_ROOT`."""
+    images_dir = settings.MEDIA_ROOT / 'card_images'
+    return all((images_dir / f"{card_id}.webp").exists() for card_id in set(card_ids))
+
+
+@contextmanager
+def _media_root(path: Path) -> Iterator[None]:
+    # Без `django.test.override_settings`: модуль используется командами `bench_render` и `loadtest`,
+    # которым тестовый фреймворк не нужен. Рендер читает `settings.MEDIA_ROOT` при каждом обращении.
+    previous = settings.MEDIA_ROOT
+    settings.MEDIA_ROOT = path
+    try:
+        yield
+    finally:
+        settings.MEDIA_ROOT = previous
+
+
+@contextmanager
+def synthetic_media_root(card_ids: Iterable[int]) -> Iterator[Path]:
+    """
+    Временно подменяет `MEDIA_ROOT` каталогом с синтетическим артом для указанных карт.
+    Кэш тайлов очищается на входе и выходе, чтобы не смешивать реальный и синтетический арт.
+    """
+    with tempfile.TemporaryDirectory(prefix='kkbot-render-') as tmp:
+        media_root = Path(tmp)
+        ensure_card_art(card_ids, media_root)
+        clear_tile_cache()
+        try:
+            with _media_root(media_root):
+                yield media_root
+        finally:
+            clear_tile_cache()
+
+
+def render_sample(deck: SampleDeck, timings: Optional[Dict[str, float]] = None) -> bytes:
+    """Рендерит колоду тем же кодом, что и бот, и возвращает JPEG."""
+    character_cards, action_cards = deck.cards()
+    return create_deck_image(character_cards, action_cards, deck.resonances, timings).getvalue()
+
+
+class EncoderResult(NamedTuple):
+    name: str
+    mean_encode_seconds: float
+    mean_bytes: float
+    max_bytes: int
+
+
+def benchmark_encoders(
+        decks: List[SampleDeck], presets: Dict[str, EncoderConfig] = ENCODER_PRESETS
+) -> List[EncoderResult]:
+    """Собирает изображения колод один раз и кодирует каждое всеми вариантами из `presets`."""
+    images = []
+    for deck in decks:
+        character_cards, action_cards = deck.cards()
+        images.append(compose_deck_image(character_cards, action_cards, deck.resonances).convert("RGB"))
+
+    results: List[EncoderResult] = []
+    for name, config in presets.items():
+        durations, sizes = [], []
+        for image in images:
+            started = time.perf_counter()
+            sizes.append(len(encode_image(image, config)))
+            durations.append(time.perf_counter() - started)
+        results.append(EncoderResult(name, sum(durations) / len(images), sum(sizes) / len(images), max(sizes)))
+    return results
+
+
+def to_golden(image_bytes: bytes) -> Image.Image:
+    """Приводит рендер к виду эталона: оттенки серого, уменьшенный размер."""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return image.convert("L").resize(GOLDEN_SIZE, Image.Resampling.LANCZOS)
+
+
+def perceptual_diff(image: Image.Image, reference: Image.Image) -> float:
+    """Средняя абсолютная разница яркости (0–255) после приведения к размеру эталона и размытия."""
+    def normalize(img: Image.Image) -> Image.Image:
+        img = img.convert("L")
+        if img.size != GOLDEN_SIZE:
+            img = img.resize(GOLDEN_SIZE, Image.Resampling.LANCZOS)
+        return img.filter(ImageFilter.GaussianBlur(1))
+
+    difference = ImageChops.difference(normalize(image), normalize(reference))
+    return ImageStat.Stat(difference).mean[0]
+
+
+def golden_file_name(deck_code: str) -> str:
+    # Коды колод содержат '/' и '+', поэтому в имени файла используется хэш кода.
+    return f"{hashlib.sha1(deck_code.encode()).hexdigest()[:12]}.png"
+
+
+def load_golden_manifest(golden_dir: Path = GOLDEN_DIR) -> List[Tuple[SampleDeck, Path]]:
+    """Возвращает колоды из манифеста эталонов и пути к их изображениям."""
+    manifest_path = golden_dir / GOLDEN_MANIFEST
+    if not manifest_path.exists():
+        return []
+    entries = json.loads(manifest_path.read_text(encoding='utf-8'))
+    return [
+        (SampleDeck(e['deck_code'], e['character_card_ids'], e['action_card_ids'], e['resonances']),
+         golden_dir / e['file'])
+        for e in entries
+    ]
+
+
+def write_goldens(decks: List[SampleDeck], golden_dir: Path = GOLDEN_DIR) -> List[Path]:
+    """Перерисовывает эталоны для колод (на синтетическом арте) и переписывает манифест."""
+    golden_dir.mkdir(parents=True, exist_ok=True)
+    for stale in golden_dir.glob('*.png'):
+        stale.unlink()
+
+    entries, paths = [], []
+    with synthetic_media_root(card_id for deck in decks for card_id in deck.card_ids):
+        for deck in decks:
+            path = golden_dir / golden_file_name(deck.deck_code)
+            to_golden(render_sample(deck)).save(path, format='PNG', optimize=True)
+            entries.append({**deck._asdict(), 'file': path.name})
+            paths.append(path)
+    (golden_dir / GOLDEN_MANIFEST).write_text(json.dumps(entries, indent=2), encoding='utf-8')
+    return paths
+
+
+def compare_goldens(golden_dir: Path = GOLDEN_DIR) -> List[Tuple[SampleDeck, float]]:
+    """Рендерит колоды из манифеста на синтетическом арте и возвращает разницу с эталонами."""
+    goldens = load_golden_manifest(golden_dir)
+    results: List[Tuple[SampleDeck, float]] = []
+    with synthetic_media_root(card_id for deck, _ in goldens for card_id in deck.card_ids):
+        for deck, path in goldens:
+            with Image.open(path) as reference:
+                results.append((deck, perceptual_diff(to_golden(render_sample(deck)), reference)))
+    return results
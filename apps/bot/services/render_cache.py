@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+from django.conf import settings
+
+
+@dataclass
+class RenderedDeck:
+    """Отрендеренное изображение колоды и набор карт, из которых оно собрано."""
+    image: bytes
+    card_ids: FrozenSet[int]
+    hits: int = 0
+
+
+class RenderCache:
+    """
+    LRU-кэш готовых изображений колод (ключ — код колоды) с обратным индексом
+    card_id → коды колод. Индекс позволяет при изменении карты сбросить только
+    изображения, в которых она используется, а не весь кэш.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, RenderedDeck]" = OrderedDict()
+        self._by_card: Dict[int, Set[str]] = {}
+        # Кэш используется и из event loop, и из потоков рендера.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, deck_code: str) -> bool:
+        return deck_code in self._entries
+
+    def get(self, deck_code: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(deck_code)
+            if entry is None:
+                return None
+            entry.hits += 1
+            self._entries.move_to_end(deck_code)
+            return entry.image
+
+    def put(self, deck_code: str, card_ids: Iterable[int], image: bytes) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            previous = self._remove(deck_code)
+            entry = RenderedDeck(image=image, card_ids=frozenset(card_ids), hits=previous.hits if previous else 0)
+            self._entries[deck_code] = entry
+            for card_id in entry.card_ids:
+                self._by_card.setdefault(card_id, set()).add(deck_code)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, deck_code: str) -> Optional[RenderedDeck]:
+        entry = self._entries.pop(deck_code, None)
+        if entry is None:
+            return None
+        for card_id in entry.card_ids:
+            codes = self._by_card.get(card_id)
+            if codes is not None:
+                codes.discard(deck_code)
+                if not codes:
+                    del self._by_card[card_id]
+        return entry
+
+    def invalidate_cards(self, card_ids: Iterable[int]) -> Dict[str, int]:
+        """
+        Удаляет изображения колод, содержащих любую из указанных карт.
+        Возвращает словарь {код колоды: число попаданий} для удаленных записей.
+        """
+        with self._lock:
+            affected: Set[str] = set()
+            for card_id in card_ids:
+                affected |= self._by_card.get(card_id, set())
+            removed = {code: self._remove(code) for code in affected}
+        return {code: entry.hits for code, entry in removed.items() if entry}
+
+
+render_cache = RenderCache(max_size=getattr(settings, 'RENDER_CACHE_SIZE', 256))
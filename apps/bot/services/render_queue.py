@@ -0,0 +1,233 @@
+"""
+Вынос рендера изображений колод в отдельные процессы через таблицу `RenderJob`.
+
+Бот (фронт-процесс) раскодирует колоды сам — это сетевые запросы, — а рендер, который
+упирается в CPU, ставит в очередь: создает `RenderJob` и будит рендереров уведомлением
+`kkbot_render_jobs`. Процессы `renderworker` (их может быть сколько угодно и на любых
+машинах с доступом к БД) забирают задачи через `SELECT ... FOR UPDATE SKIP LOCKED`,
+рендерят колоду и сообщают о готовности через `kkbot_render_done`. Если уведомление
+потерялось, бот и воркеры периодически проверяют таблицу сами; если воркеры не успели
+за `REMOTE_RENDER_TIMEOUT`, бот рендерит колоду локально.
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from apps.bot.services.deck_utils import calculate_resonances
+from apps.bot.services.image_generator import create_deck_image
+from apps.bot.services.metrics import STAGE_DURATION, registry
+from apps.cards.models import Card
+from apps.cards.services.invalidation import pg_listen
+from apps.jobs.models import RenderJob
+from apps.users.models import Deck
+
+logger = logging.getLogger(__name__)
+
+RENDER_JOBS_CHANNEL = "kkbot_render_jobs"
+RENDER_DONE_CHANNEL = "kkbot_render_done"
+# Как часто бот и воркеры проверяют таблицу без уведомлений (на случай потерянного NOTIFY).
+POLL_INTERVAL = 1.0
+# Задачи старше этого срока (брошенные ботом или зависшие у упавшего воркера) удаляются.
+STALE_JOB_AGE = timedelta(minutes=10)
+
+REMOTE_RENDERS = registry.counter(
+    "kkbot_remote_render_total", "Рендеры, отправленные в процессы renderworker", ["result"]
+)
+
+
+def _worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _notify(channel: str, payload: str = "") -> None:
+    # NOTIFY транзакционный: уведомление уходит только после фиксации записи задачи.
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [channel, payload])
+
+
+class RenderQueueClient:
+    """Сторона бота: ставит задачи рендера и ждет их результат."""
+
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+        self._waiters: Dict[int, asyncio.Future] = {}
+
+    def _create_job(self, deck_code: str) -> int:
+        with transaction.atomic():
+            job = RenderJob.objects.create(deck_code=deck_code)
+            _notify(RENDER_JOBS_CHANNEL)
+        return job.pk
+
+    def _take_result(self, job_id: int, cancel: bool = False) -> Optional[RenderJob]:
+        """Забирает завершенную задачу (и удаляет ее). При `cancel` удаляет задачу в любом статусе."""
+        with transaction.atomic():
+            job = RenderJob.objects.select_for_update().filter(pk=job_id).first()
+            if job is None:
+                return None
+            if job.status in (RenderJob.Status.DONE, RenderJob.Status.FAILED) or cancel:
+                job.delete()
+                return job
+            return None
+
+    def on_done(self, payload: str) -> None:
+        """Обработчик `kkbot_render_done`: будит ожидающую корутину."""
+        try:
+            future = self._waiters.get(int(payload))
+        except ValueError:
+            return
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def render(self, deck_code: str) -> Optional[bytes]:
+        """
+        Рендерит колоду в процессе-воркере. Возвращает JPEG или None, если воркеры
+        не справились (ошибка, таймаут) — тогда колоду нужно отрендерить локально.
+        """
+        loop = asyncio.get_running_loop()
+        job_id = await asyncio.to_thread(self._create_job, deck_code)
+        future = self._waiters[job_id] = loop.create_future()
+        deadline = loop.time() + self.timeout
+        started = loop.time()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), timeout=POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                timed_out = loop.time() >= deadline
+                job = await asyncio.to_thread(self._take_result, job_id, timed_out)
+                if job is not None and job.status == RenderJob.Status.DONE:
+                    REMOTE_RENDERS.inc('done')
+                    STAGE_DURATION.observe(loop.time() - started, "remote_render")
+                    return bytes(job.image)
+                if job is not None and job.status == RenderJob.Status.FAILED:
+                    REMOTE_RENDERS.inc('failed')
+                    logger.warning(f"Воркер не смог отрендерить колоду {deck_code}: {job.error}")
+                    return None
+                if timed_out:
+                    REMOTE_RENDERS.inc('timeout')
+                    logger.warning(f"Рендер колоды {deck_code} не выполнен воркерами за {self.timeout} с.")
+                    return None
+                if future.done():
+                    # Уведомление пришло, но задача еще не завершена (например, повтор NOTIFY) — ждем дальше.
+                    future = self._waiters[job_id] = loop.create_future()
+        finally:
+            self._waiters.pop(job_id, None)
+
+    async def listen(self) -> None:
+        """Фоновая задача бота: получает уведомления о готовых рендерах."""
+        await pg_listen({RENDER_DONE_CHANNEL: self.on_done})
+
+
+def render_deck_image(deck: Deck) -> bytes:
+    """Синхронный рендер колоды по ее составу из БД (для процессов-воркеров)."""
+    card_ids = {*deck.character_card_ids, *deck.action_card_ids}
+    cards_map = {card.card_id: card for card in Card.objects.filter(card_id__in=card_ids).prefetch_related('tags')}
+    character_cards = [cards_map[card_id] for card_id in deck.character_card_ids if card_id in cards_map]
+    action_cards = [cards_map[card_id] for card_id in deck.action_card_ids if card_id in cards_map]
+    resonances = calculate_resonances(character_cards)
+    return create_deck_image(character_cards, action_cards, resonances).getvalue()
+
+
+def claim_render_job(worker: Optional[str] = None) -> Optional[RenderJob]:
+    """Атомарно забирает самую старую задачу рендера. `SKIP LOCKED` позволяет запускать много воркеров."""
+    with transaction.atomic():
+        job = (
+            RenderJob.objects.select_for_update(skip_locked=True)
+            .filter(status=RenderJob.Status.PENDING)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = RenderJob.Status.RUNNING
+        job.worker = worker or _worker_name()
+        job.save(update_fields=['status', 'worker'])
+        return job
+
+
+def process_render_job(job: RenderJob) -> RenderJob:
+    """Рендерит колоду задачи и записывает результат; бот получает уведомление о готовности."""
+    try:
+        deck = Deck.objects.get(deck_code=job.deck_code)
+        job.image = render_deck_image(deck)
+        job.status = RenderJob.Status.DONE
+    except Exception as e:
+        logger.exception(f"Ошибка рендера колоды {job.deck_code} (задача {job.pk})")
+        job.status = RenderJob.Status.FAILED
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    with transaction.atomic():
+        # Бот мог удалить задачу, не дождавшись результата, — тогда сохранять нечего.
+        updated = RenderJob.objects.filter(pk=job.pk).update(
+            status=job.status, image=job.image, error=job.error, finished_at=job.finished_at
+        )
+        if updated:
+            _notify(RENDER_DONE_CHANNEL, str(job.pk))
+    return job
+
+
+def process_next_render_job(worker: Optional[str] = None) -> Optional[RenderJob]:
+    """Забирает и выполняет одну задачу. Возвращает ее или None, если очередь пуста."""
+    close_old_connections()
+    job = claim_render_job(worker)
+    if job is not None:
+        process_render_job(job)
+    return job
+
+
+def purge_stale_render_jobs(max_age: timedelta = STALE_JOB_AGE) -> int:
+    """Удаляет задачи, которые бот уже не заберет (брошенные или зависшие у упавшего воркера)."""
+    deleted, _ = RenderJob.objects.filter(created_at__lt=timezone.now() - max_age).delete()
+    return deleted
+
+
+async def run_render_worker(concurrency: int = 1, poll_interval: float = POLL_INTERVAL) -> None:
+    """
+    Цикл процесса-рендерера: `concurrency` потоков забирают задачи, пока очередь не пуста,
+    и засыпают до уведомления `kkbot_render_jobs` (или до `poll_interval`).
+    """
+    wakeup = asyncio.Event()
+    worker = _worker_name()
+
+    def on_new_job(payload: str) -> None:
+        wakeup.set()
+
+    async def loop() -> None:
+        while True:
+            # Сбрасываем флаг до проверки очереди, чтобы не пропустить уведомление, пришедшее во время нее.
+            wakeup.clear()
+            job = await asyncio.to_thread(process_next_render_job, worker)
+            if job is not None:
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def purge() -> None:
+        while True:
+            deleted = await asyncio.to_thread(purge_stale_render_jobs)
+            if deleted:
+                logger.info(f"Удалено устаревших задач рендера: {deleted}")
+            await asyncio.sleep(STALE_JOB_AGE.total_seconds() / 2)
+
+    await asyncio.gather(
+        pg_listen({RENDER_JOBS_CHANNEL: on_new_job}),
+        purge(),
+        *(loop() for _ in range(max(concurrency, 1))),
+    )
+
+
+render_queue: Optional[RenderQueueClient] = (
+    RenderQueueClient(settings.REMOTE_RENDER_TIMEOUT) if settings.BOT_REMOTE_RENDER else None
+)
@@ -0,0 +1,98 @@
+"""
+Планировщик исходящих запросов к Telegram Bot API.
+
+Подключается как middleware HTTP-сессии aiogram, поэтому через него проходят все вызовы
+бота, включая `message.reply*`. Запросы, отправляющие или изменяющие сообщения,
+ждут токены из глобального ведра (лимит Telegram на весь бот) и из ведра конкретного
+чата (в группах лимит строже, чем в личных чатах). На ответ 429 планировщик ставит
+на паузу ведро чата на `retry_after` секунд и повторяет запрос, так что всплески
+нагрузки приводят к задержкам, а не к ошибкам.
+"""
+import logging
+from typing import Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from apps.bot.services.metrics import registry
+from apps.bot.services.rate_limit import BucketRegistry, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Методы, на которые распространяются лимиты Telegram на отправку сообщений.
+RATE_LIMITED_METHODS = {
+    'sendMessage', 'sendPhoto', 'sendMediaGroup', 'sendDocument', 'sendAnimation',
+    'copyMessage', 'forwardMessage', 'editMessageText', 'editMessageCaption', 'editMessageMedia',
+}
+
+SEND_WAIT = registry.histogram(
+    "kkbot_send_wait_seconds", "Ожидание исходящего запроса в ограничителе скорости",
+    ["method"], buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+SEND_RETRIES = registry.counter(
+    "kkbot_send_retry_after_total", "Ответы Telegram 429 (retry_after), после которых запрос повторен", ["method"]
+)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Middleware сессии aiogram: глобальный лимит, лимиты на чат и повтор после 429.
+    ID групп и каналов в Telegram отрицательные, поэтому тип чата определяется по знаку ID.
+    """
+
+    def __init__(
+            self,
+            global_rate: float = 30.0,
+            chat_rate: float = 1.0,
+            group_rate: float = 20 / 60,
+            chat_burst: float = 5.0,
+            max_retries: int = 3,
+    ):
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, 1.0))
+        self.chat_buckets: BucketRegistry[Union[int, str]] = BucketRegistry(
+            lambda chat_id: TokenBucket(group_rate if self._is_group(chat_id) else chat_rate, chat_burst)
+        )
+        self.max_retries = max_retries
+
+    @staticmethod
+    def _is_group(chat_id: Union[int, str]) -> bool:
+        # Строковые chat_id — это @username каналов и супергрупп.
+        return isinstance(chat_id, str) or chat_id < 0
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        api_method = method.__api_method__
+        chat_id: Optional[Union[int, str]] = getattr(method, 'chat_id', None)
+        limited = api_method in RATE_LIMITED_METHODS
+
+        attempt = 0
+        while True:
+            if limited:
+                waited = 0.0
+                if chat_id is not None:
+                    waited += await self.chat_buckets.get(chat_id).acquire()
+                waited += await self.global_bucket.acquire()
+                SEND_WAIT.observe(waited, api_method)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                SEND_RETRIES.inc(api_method)
+                logger.warning(
+                    f"Telegram ограничил {api_method} для чата {chat_id}: повтор через {e.retry_after} с "
+                    f"(попытка {attempt}/{self.max_retries})."
+                )
+                bucket = self.chat_buckets.get(chat_id) if chat_id is not None else self.global_bucket
+                bucket.pause(e.retry_after)
+                if not limited:
+                    # Нелимитированные методы не ждут ведро сами, поэтому ждем паузу явно.
+                    await bucket.acquire(0)
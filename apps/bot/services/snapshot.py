@@ -0,0 +1,328 @@
+"""
+Снимок справочника карт и тайлов для быстрого запуска бота и процессов рендера.
+
+Снимок пишется после каждого обновления карт (этап `snapshot` задачи обновления)
+или командой `build_snapshot` в каталог `MEDIA_ROOT/snapshot` и состоит из двух файлов:
+
+- `cards.bin` — компактная таблица карт: ID, тип, имя, битовая маска тегов
+  и версия изображения (mtime файла в наносекундах);
+- `tiles.bin` — атлас готовых тайлов (уменьшенные изображения с рамкой) в сыром RGBA.
+
+При запуске процесс читает таблицу карт (десятки килобайт) и отображает атлас в память
+через `mmap`: тайлы не декодируются и не уменьшаются, страницы подгружаются по мере
+обращения, а несколько процессов (бот, `renderworker`) делят их через page cache ОС.
+Файлы заменяются атомарно (`os.replace`), поэтому уже открытый снимок остается целым.
+
+Формат (little-endian):
+    cards.bin: заголовок CARDS_HEADER, имена тегов (u8 длина + UTF-8),
+               записи CARD_RECORD + маска тегов, затем блок имен карт в UTF-8;
+    tiles.bin: заголовок TILES_HEADER, индекс TILE_RECORD, данные тайлов с границы страницы.
+Оба заголовка содержат один и тот же `snapshot_id`: файлы от разных снимков не смешиваются.
+
+Заголовок `cards.bin` содержит также хэш справочника (ID, тип, имя и теги всех карт). Снимок
+переписывается только задачей обновления карт и `build_snapshot`, поэтому правки в админке, сделанные
+пока бот остановлен, в нем не отражены: при подключении хэш сверяется с БД, и при расхождении
+измененные и удаленные карты исключаются из снимка (справочник и тайлы для них берутся из БД и изображений).
+"""
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from PIL import Image
+from django.conf import settings
+
+from apps.bot.services.catalog import CatalogEntry
+from apps.bot.services.image_generator import ACTION_CARD_SIZE, CHAR_CARD_SIZE, _build_tile, set_tile_snapshot
+from apps.cards.models import Card
+
+logger = logging.getLogger(__name__)
+
+CARDS_FILE = 'cards.bin'
+TILES_FILE = 'tiles.bin'
+FORMAT_VERSION = 2
+CARDS_MAGIC = b'KKCS'
+TILES_MAGIC = b'KKTA'
+# magic, версия, snapshot_id, число карт, число тегов, размер маски тегов в байтах, хэш справочника
+CARDS_HEADER = struct.Struct('<4sHQIHHQ')
+# card_id, тип (0 — персонаж, 1 — действие), версия изображения, смещение и длина имени
+CARD_RECORD = struct.Struct('<IBqIH')
+# magic, версия, snapshot_id, число тайлов, смещение начала данных
+TILES_HEADER = struct.Struct('<4sHQIQ')
+# card_id, ширина, высота, смещение данных
+TILE_RECORD = struct.Struct('<IHHQ')
+PAGE_SIZE = mmap.PAGESIZE
+BUILD_THREADS = 4
+
+CARD_TYPES = (Card.CardType.CHARACTER, Card.CardType.ACTION)
+
+
+class SnapshotCard(NamedTuple):
+    card_id: int
+    card_type: str
+    name: str
+    tags: FrozenSet[str]
+    image_version: int
+
+
+class SnapshotStats(NamedTuple):
+    cards: int
+    tiles: int
+    cards_bytes: int
+    tiles_bytes: int
+    seconds: float
+
+
+def snapshot_dir() -> Path:
+    return settings.MEDIA_ROOT / 'snapshot'
+
+
+def tile_size(card_type: str) -> Tuple[int, int]:
+    return CHAR_CARD_SIZE if card_type == Card.CardType.CHARACTER else ACTION_CARD_SIZE
+
+
+CardState = Tuple[str, str, FrozenSet[str]]
+
+
+def catalog_state() -> Dict[int, CardState]:
+    """Имя, тип и теги всех карт из БД: два легких запроса без создания объектов `Card`."""
+    tags: Dict[int, Set[str]] = {}
+    for card_id, tag_name in Card.tags.through.objects.values_list('card_id', 'tag__name'):
+        tags.setdefault(card_id, set()).add(tag_name)
+    return {
+        card_id: (name, card_type, frozenset(tags.get(card_id, ())))
+        for card_id, name, card_type in Card.objects.values_list('card_id', 'name', 'card_type')
+    }
+
+
+def catalog_digest(state: Dict[int, CardState]) -> int:
+    """Хэш справочника карт (64 бита) для сверки снимка с БД."""
+    digest = hashlib.blake2b(digest_size=8)
+    for card_id in sorted(state):
+        name, card_type, tags = state[card_id]
+        fields = (str(card_id), card_type, name, *sorted(tags))
+        digest.update("\x1f".join(fields).encode('utf-8') + b"\x00")
+    return int.from_bytes(digest.digest(), 'little')
+
+
+def _image_version(card: Card) -> int:
+    try:
+        return card.local_image_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+class CardSnapshot:
+    """Открытый снимок: таблица карт в памяти и атлас тайлов, отображенный через `mmap`."""
+
+    def __init__(
+            self, snapshot_id: int, cards: Dict[int, SnapshotCard],
+            tiles: Dict[Tuple[int, Tuple[int, int]], int], atlas: Optional[mmap.mmap], digest: int = 0,
+    ):
+        self.snapshot_id = snapshot_id
+        self.catalog_digest = digest
+        self.cards = cards
+        self._tiles = tiles
+        self._atlas = atlas
+        self._view = memoryview(atlas) if atlas is not None else None
+        # Карты, измененные после записи снимка: их тайлы строятся заново из исходных изображений.
+        self._discarded: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def tile(self, card_id: int, size: Tuple[int, int]) -> Optional[Image.Image]:
+        """Тайл из атласа без копирования (изображение только для чтения) или None."""
+        offset = self._tiles.get((card_id, size))
+        if offset is None or card_id in self._discarded:
+            return None
+        length = size[0] * size[1] * 4
+        return Image.frombuffer("RGBA", size, self._view[offset:offset + length], "raw", "RGBA", 0, 1)
+
+    def discard(self, card_ids: Iterable[int]) -> None:
+        self._discarded.update(card_ids)
+
+    def catalog_entries(self) -> Dict[int, CatalogEntry]:
+        return {
+            card.card_id: CatalogEntry(card.name, card.card_type)
+            for card in self.cards.values() if card.card_id not in self._discarded
+        }
+
+    def validate_images(self) -> int:
+        """Исключает карты, изображения которых изменились после записи снимка. Возвращает их число."""
+        stale = [
+            card.card_id for card in self.cards.values()
+            if _image_version(Card(card_id=card.card_id)) != card.image_version
+        ]
+        self.discard(stale)
+        return len(stale)
+
+    def validate_catalog(self) -> int:
+        """
+        Сверяет справочник снимка с БД и исключает карты, переименованные, измененные или удаленные
+        после записи снимка. Возвращает их число.
+        """
+        state = catalog_state()
+        if catalog_digest(state) == self.catalog_digest:
+            return 0
+        stale = [
+            card.card_id for card in self.cards.values()
+            if card.card_id not in self._discarded and state.get(card.card_id) != (card.name, card.card_type, card.tags)
+        ]
+        self.discard(stale)
+        return len(stale)
+
+    @classmethod
+    def open(cls, directory: Optional[Path] = None) -> Optional["CardSnapshot"]:
+        """Открывает снимок. None — снимка нет или он поврежден (тогда работаем без него)."""
+        directory = directory or snapshot_dir()
+        try:
+            snapshot_id, digest, cards = _read_cards(directory / CARDS_FILE)
+            atlas_id, tiles, atlas = _open_tiles(directory / TILES_FILE)
+        except FileNotFoundError:
+            return None
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Снимок карт в {directory} не прочитан: {e}")
+            return None
+        if atlas_id != snapshot_id:
+            logger.warning("Файлы снимка карт относятся к разным снимкам (идет перезапись?), снимок не используется.")
+            return None
+        return cls(snapshot_id, cards, tiles, atlas, digest)
+
+
+def _read_cards(path: Path) -> Tuple[int, int, Dict[int, SnapshotCard]]:
+    data = path.read_bytes()
+    magic, version, snapshot_id, card_count, tag_count, mask_size, digest = CARDS_HEADER.unpack_from(data)
+    if magic != CARDS_MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"неподдерживаемый формат {magic!r} v{version}")
+    offset = CARDS_HEADER.size
+    tags: List[str] = []
+    for _ in range(tag_count):
+        length = data[offset]
+        tags.append(data[offset + 1:offset + 1 + length].decode('utf-8'))
+        offset += 1 + length
+
+    record_size = CARD_RECORD.size + mask_size
+    names_start = offset + card_count * record_size
+    cards: Dict[int, SnapshotCard] = {}
+    for i in range(card_count):
+        start = offset + i * record_size
+        card_id, card_type, image_version, name_offset, name_length = CARD_RECORD.unpack_from(data, start)
+        mask = int.from_bytes(data[start + CARD_RECORD.size:start + record_size], 'little')
+        name = data[names_start + name_offset:names_start + name_offset + name_length].decode('utf-8')
+        card_tags = frozenset(tag for bit, tag in enumerate(tags) if mask >> bit & 1)
+        cards[card_id] = SnapshotCard(card_id, CARD_TYPES[card_type], name, card_tags, image_version)
+    return snapshot_id, digest, cards
+
+
+def _open_tiles(path: Path) -> Tuple[int, Dict[Tuple[int, Tuple[int, int]], int], Optional[mmap.mmap]]:
+    with open(path, 'rb') as f:
+        header = f.read(TILES_HEADER.size)
+        magic, version, snapshot_id, tile_count, _ = TILES_HEADER.unpack(header)
+        if magic != TILES_MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"неподдерживаемый формат {magic!r} v{version}")
+        index = f.read(tile_count * TILE_RECORD.size)
+        tiles = {
+            (card_id, (width, height)): offset
+            for card_id, width, height, offset in TILE_RECORD.iter_unpack(index)
+        }
+        # Отображение переживает закрытие файла; страницы делятся между процессами через page cache.
+        atlas = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if tiles else None
+    return snapshot_id, tiles, atlas
+
+
+def write_snapshot(directory: Optional[Path] = None) -> SnapshotStats:
+    """Строит тайлы всех карт и атомарно записывает снимок. Выполняется в воркере после обновления карт."""
+    started = time.perf_counter()
+    directory = directory or snapshot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    snapshot_id = time.time_ns()
+
+    cards = list(Card.objects.prefetch_related('tags').order_by('card_id'))
+    card_tags = {card.card_id: [tag.name for tag in card.tags.all()] for card in cards}
+    tags = sorted({tag for names in card_tags.values() for tag in names})
+    tag_bits = {tag: bit for bit, tag in enumerate(tags)}
+    mask_size = max(1, (len(tags) + 7) // 8)
+
+    with ThreadPoolExecutor(max_workers=BUILD_THREADS) as pool:
+        built = list(pool.map(lambda card: _build_tile(card, tile_size(card.card_type)), cards))
+    tiles = [(card, tile) for card, tile in zip(cards, built) if tile is not None]
+
+    # Сначала атлас, затем таблица: читатель сверяет snapshot_id и не смешает файлы разных снимков.
+    tiles_bytes = _write_atomic(directory / TILES_FILE, _pack_tiles(snapshot_id, tiles))
+    names = bytearray()
+    records = bytearray()
+    for card in cards:
+        name = card.name.encode('utf-8')
+        mask = sum(1 << tag_bits[tag] for tag in card_tags[card.card_id])
+        records += CARD_RECORD.pack(
+            card.card_id, CARD_TYPES.index(card.card_type), _image_version(card), len(names), len(name)
+        )
+        records += mask.to_bytes(mask_size, 'little')
+        names += name
+    encoded_tags = b''.join(bytes([len(tag.encode('utf-8'))]) + tag.encode('utf-8') for tag in tags)
+    digest = catalog_digest({
+        card.card_id: (card.name, card.card_type, frozenset(card_tags[card.card_id])) for card in cards
+    })
+    header = CARDS_HEADER.pack(CARDS_MAGIC, FORMAT_VERSION, snapshot_id, len(cards), len(tags), mask_size, digest)
+    cards_bytes = _write_atomic(directory / CARDS_FILE, [header, encoded_tags, bytes(records), bytes(names)])
+
+    stats = SnapshotStats(len(cards), len(tiles), cards_bytes, tiles_bytes, time.perf_counter() - started)
+    logger.info(
+        f"Снимок карт записан: {stats.cards} карт ({cards_bytes / 1024:.0f} КБ), "
+        f"{stats.tiles} тайлов ({tiles_bytes / 1024 / 1024:.1f} МБ) за {stats.seconds:.1f} с"
+    )
+    return stats
+
+
+def _pack_tiles(snapshot_id: int, tiles: List[Tuple[Card, Image.Image]]) -> List[bytes]:
+    index_end = TILES_HEADER.size + len(tiles) * TILE_RECORD.size
+    data_start = -(-index_end // PAGE_SIZE) * PAGE_SIZE
+    index = bytearray()
+    offset = data_start
+    for card, tile in tiles:
+        index += TILE_RECORD.pack(card.card_id, tile.width, tile.height, offset)
+        offset += tile.width * tile.height * 4
+    header = TILES_HEADER.pack(TILES_MAGIC, FORMAT_VERSION, snapshot_id, len(tiles), data_start)
+    padding = bytes(data_start - index_end)
+    return [header, bytes(index), padding, *(tile.tobytes() for _, tile in tiles)]
+
+
+def _write_atomic(path: Path, chunks: List[bytes]) -> int:
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+_snapshot: Optional[CardSnapshot] = None
+
+
+def load_snapshot(directory: Optional[Path] = None) -> Optional[CardSnapshot]:
+    """
+    Открывает снимок и подключает его атлас к кэшу тайлов процесса. Карты, изображения которых
+    изменились после записи снимка (проверка `stat` файлов) или данные которых в БД расходятся
+    со снимком (сверка хэша справочника), исключаются.
+    """
+    global _snapshot
+    snapshot = CardSnapshot.open(directory)
+    if snapshot is None:
+        logger.info("Снимок карт не найден, тайлы будут строиться из изображений карт.")
+        return None
+    stale = snapshot.validate_images() + snapshot.validate_catalog()
+    set_tile_snapshot(snapshot)
+    _snapshot = snapshot
+    logger.info(f"Снимок карт подключен: {len(snapshot.cards)} карт, {len(snapshot)} тайлов, устаревших {stale}.")
+    return snapshot
+
+
+def get_snapshot() -> Optional[CardSnapshot]:
+    return _snapshot
@@ -0,0 +1,113 @@
+"""
+Прогрев кэшей бота при запуске.
+
+После деплоя кэши процесса пусты, и первые пользователи платят за их заполнение:
+запросы справочника карт, декодирование фона и изображений карт, уменьшение тайлов
+и рендер популярных колод. Прогрев выполняет эту работу заранее — до начала приема
+апдейтов (`blocking`) или параллельно с ним (`background`):
+
+1. загружает справочник карт (`catalog`), если он еще не заполнен из снимка;
+2. строит тайлы карт (не больше, чем помещается в кэш тайлов); при подключенном снимке
+   (`snapshot.py`) тайлы берутся из атласа, а список карт — из таблицы снимка, без запросов к БД;
+3. рендерит самые популярные колоды: сначала по обработкам за последние `days` дней
+   (`UserActivity` с типом DECK_PROCESSED), затем по общему `usage_count`.
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List
+
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.bot.services.catalog import catalog
+from apps.bot.services.image_generator import TILE_CACHE_SIZE, preload_card_tiles
+from apps.bot.services.snapshot import get_snapshot
+from apps.cards.models import Card
+from apps.users.models import Deck, UserActivity
+
+logger = logging.getLogger(__name__)
+
+# Тайлы строятся в нескольких потоках: уменьшение изображений в Pillow отпускает GIL.
+TILE_THREADS = 4
+PROGRESS_LOG_EVERY = 10
+
+
+async def popular_deck_codes(limit: int, days: int) -> List[str]:
+    """Коды самых популярных колод: по недавним обработкам, а при нехватке — по `usage_count`."""
+    if limit <= 0:
+        return []
+    since = timezone.now() - timedelta(days=days)
+    recent = (
+        UserActivity.objects
+        .filter(activity_type=UserActivity.ActivityType.DECK_PROCESSED, created_at__gte=since)
+        .values_list('details__code')
+        .annotate(uses=Count('id'))
+        .order_by('-uses')
+    )
+    codes: List[str] = [code async for code, _ in recent[:limit] if code]
+    if len(codes) < limit:
+        popular = Deck.objects.exclude(deck_code__in=codes).order_by('-usage_count').values_list('deck_code', flat=True)
+        codes.extend([code async for code in popular[:limit - len(codes)]])
+    return codes
+
+
+async def _warm_tiles() -> int:
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        cards = [
+            Card(card_id=card.card_id, name=card.name, card_type=card.card_type)
+            for card in list(snapshot.cards.values())[:TILE_CACHE_SIZE]
+        ]
+    else:
+        cards = [card async for card in Card.objects.only('card_id', 'name', 'card_type')[:TILE_CACHE_SIZE]]
+    chunks = [cards[i::TILE_THREADS] for i in range(TILE_THREADS)]
+    built = await asyncio.gather(*(asyncio.to_thread(preload_card_tiles, chunk) for chunk in chunks))
+    return sum(built)
+
+
+async def _warm_decks(codes: List[str], render: Callable[[Deck], Awaitable]) -> int:
+    decks = {deck.deck_code: deck async for deck in Deck.objects.filter(deck_code__in=codes)}
+    rendered = 0
+    for code in codes:
+        deck = decks.get(code)
+        if deck is None:
+            continue
+        try:
+            await render(deck)
+        except Exception:
+            logger.exception(f"Прогрев: не удалось отрендерить колоду {code}")
+            continue
+        rendered += 1
+        if rendered % PROGRESS_LOG_EVERY == 0:
+            logger.info(f"Прогрев: отрендерено колод {rendered}/{len(decks)}")
+    return rendered
+
+
+async def warm_up(render: Callable[[Deck], Awaitable], top_decks: int, days: int) -> Dict[str, float]:
+    """
+    Прогревает кэши бота. `render` — функция рендера колоды, сохраняющая результат в кэш
+    (`deck_codes.render_deck`). Возвращает длительность этапов в секундах.
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    count = len(catalog) if catalog.loaded else await catalog.load()
+    timings['catalog'] = time.perf_counter() - started
+    logger.info(f"Прогрев: справочник карт ({count} карт) за {timings['catalog']:.2f} с")
+
+    stage_started = time.perf_counter()
+    tiles = await _warm_tiles()
+    timings['tiles'] = time.perf_counter() - stage_started
+    logger.info(f"Прогрев: построено тайлов карт {tiles} за {timings['tiles']:.2f} с")
+
+    stage_started = time.perf_counter()
+    codes = await popular_deck_codes(top_decks, days)
+    decks = await _warm_decks(codes, render)
+    timings['decks'] = time.perf_counter() - stage_started
+    logger.info(f"Прогрев: отрендерено популярных колод {decks}/{len(codes)} за {timings['decks']:.2f} с")
+
+    timings['total'] = time.perf_counter() - started
+    logger.info(f"Прогрев кэшей завершен за {timings['total']:.2f} с")
+    return timings
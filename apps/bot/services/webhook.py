@@ -0,0 +1,116 @@
+"""
+Прием апдейтов через вебхук вместо long polling.
+
+Telegram отправляет апдейты POST-запросами на `WEBHOOK_URL + WEBHOOK_PATH` с заголовком
+`X-Telegram-Bot-Api-Secret-Token`; обработчик aiogram проверяет секрет, сразу отвечает 200
+и обрабатывает апдейт в фоне (дальше сообщение попадает в очередь контроля допуска).
+При остановке сервер перестает принимать новые апдейты (отвечает 503, и Telegram повторит
+их доставку после перезапуска) и дожидается уже принятых.
+"""
+import asyncio
+import hashlib
+import logging
+import signal
+from typing import Any, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from apps.bot.services.admission import admission
+
+logger = logging.getLogger(__name__)
+
+
+def webhook_secret(token: str, secret: Optional[str] = None) -> str:
+    """
+    Секрет вебхука: явно заданный или производный от токена бота, чтобы он не менялся
+    между перезапусками. Telegram допускает в секрете только `A-Za-z0-9_-`.
+    """
+    return secret or hashlib.sha256(token.encode()).hexdigest()
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """`SimpleRequestHandler` с плавной остановкой: после `drain` новые апдейты отклоняются с 503."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.draining = False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.Response(status=503, text="Shutting down")
+        return await super().handle(request)
+
+    async def drain(self, timeout: float) -> None:
+        """Перестает принимать апдейты и ждет обработки принятых (не дольше `timeout` секунд)."""
+        self.draining = True
+        tasks = list(self._background_feed_update_tasks)
+        if tasks:
+            logger.info(f"Ожидание обработки принятых апдейтов: {len(tasks)}")
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            if pending:
+                logger.warning(f"Не дождались обработки {len(pending)} апдейтов за {timeout} с.")
+        await admission.drain(timeout)
+
+    async def close(self) -> None:
+        # Сессию бота закрывает владелец бота, а не обработчик вебхука.
+        pass
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher, path: str, secret: str) -> web.Application:
+    """Создает aiohttp-приложение с обработчиком вебхука; сам обработчик доступен как `app['webhook_handler']`."""
+    app = web.Application()
+    handler = DrainingRequestHandler(dispatcher=dp, bot=bot, secret_token=secret, handle_in_background=True)
+    handler.register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    app['webhook_handler'] = handler
+    return app
+
+
+async def run_webhook(
+        bot: Bot,
+        dp: Dispatcher,
+        *,
+        url: str,
+        path: str,
+        host: str,
+        port: int,
+        secret: str,
+        drain_timeout: float = 30.0,
+) -> None:
+    """
+    Регистрирует вебхук в Telegram и принимает апдейты до SIGTERM/SIGINT, после чего
+    плавно останавливается. Вебхук при остановке не удаляется: пока бот перезапускается,
+    Telegram копит апдейты и доставит их позже.
+    """
+    app = create_webhook_app(bot, dp, path, secret)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"Вебхук слушает http://{host}:{port}{path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await bot.set_webhook(
+            url=url.rstrip('/') + path,
+            secret_token=secret,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"Вебхук зарегистрирован: {url.rstrip('/')}{path}")
+        await stop.wait()
+        logger.info("Получен сигнал остановки, завершаем обработку принятых апдейтов...")
+        await app['webhook_handler'].drain(drain_timeout)
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        await runner.cleanup()
@@ -0,0 +1,79 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from apps.bot.services.admission import AdmissionController, AdmissionRejected
+
+
+class AdmissionControllerTest(SimpleTestCase):
+    """Тестирует порядок обслуживания очереди и отказы при перегрузке."""
+
+    def test_small_requests_overtake_cold_batches(self):
+        controller = AdmissionController(workers=1, queue_size=10, user_rate=1, user_burst=100)
+        order = []
+
+        async def scenario():
+            release = asyncio.Event()
+
+            async def blocker():
+                await release.wait()
+
+            def job(name):
+                async def run():
+                    order.append(name)
+                return run
+
+            first = asyncio.create_task(controller.run(1, 1, 0, blocker))
+            await asyncio.sleep(0)
+            tasks = [
+                asyncio.create_task(controller.run(2, 20, controller.penalty(20, group=True), job('cold-batch'))),
+                asyncio.create_task(controller.run(3, 1, controller.penalty(0, group=True), job('cached-group'))),
+                asyncio.create_task(controller.run(4, 1, controller.penalty(1, group=False), job('private'))),
+            ]
+            await asyncio.sleep(0)
+            release.set()
+            await asyncio.gather(first, *tasks)
+            await controller.drain()
+
+        asyncio.run(scenario())
+        self.assertEqual(order, ['private', 'cached-group', 'cold-batch'])
+
+    def test_rejections(self):
+        controller = AdmissionController(workers=1, queue_size=1, user_rate=0.1, user_burst=5)
+
+        async def scenario():
+            release = asyncio.Event()
+            running = asyncio.create_task(controller.run(1, 5, 0, release.wait))
+            # Даем рабочей задаче забрать сообщение из очереди.
+            await asyncio.sleep(0.01)
+
+            # Пользователь израсходовал весь запас токенов.
+            with self.assertRaises(AdmissionRejected) as rate_error:
+                await controller.run(1, 1, 0, release.wait)
+            self.assertEqual(rate_error.exception.reason, 'user_rate')
+            self.assertIn("через 10 с", rate_error.exception.user_message)
+
+            queued = asyncio.create_task(controller.run(2, 1, 0, release.wait))
+            await asyncio.sleep(0)
+            with self.assertRaises(AdmissionRejected) as queue_error:
+                await controller.run(3, 1, 0, release.wait)
+            self.assertEqual(queue_error.exception.reason, 'queue_full')
+
+            release.set()
+            await asyncio.gather(running, queued)
+            await controller.drain()
+
+        asyncio.run(scenario())
+
+    def test_job_errors_propagate(self):
+        controller = AdmissionController(workers=2)
+
+        async def failing():
+            raise ValueError("render failed")
+
+        async def scenario():
+            with self.assertRaises(ValueError):
+                await controller.run(1, 1, 0, failing)
+            await controller.drain()
+
+        asyncio.run(scenario())
@@ -0,0 +1,26 @@
+import asyncio
+
+from django.test import TransactionTestCase
+
+from apps.bot.services.catalog import CardCatalog
+from apps.cards.models import Card
+from apps.cards.services.invalidation import CardChangeEvent
+
+
+class CardCatalogTest(TransactionTestCase):
+    """Тестирует ленивую загрузку справочника карт и точечную инвалидацию."""
+
+    def test_invalidation_reloads_changed_cards(self):
+        Card.objects.create(card_id=1205, name="Sangonomiya Kokomi", card_type=Card.CardType.CHARACTER)
+        Card.objects.create(card_id=1408, name="Yae Miko", card_type=Card.CardType.CHARACTER)
+        catalog = CardCatalog()
+
+        self.assertEqual(asyncio.run(catalog.names([1408, 1205, 1205, 9999])), ["Sangonomiya Kokomi", "Yae Miko"])
+        self.assertEqual(len(catalog), 2)
+
+        # Без события об изменении справочник не перечитывает карту.
+        Card.objects.filter(card_id=1408).update(name="Yae")
+        self.assertEqual(asyncio.run(catalog.names([1408])), ["Yae Miko"])
+
+        catalog.invalidate(CardChangeEvent(frozenset({1408}), "test"))
+        self.assertEqual(asyncio.run(catalog.names([1408])), ["Yae"])
@@ -0,0 +1,56 @@
+import asyncio
+import io
+
+from PIL import Image
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from apps.bot.services import chat_settings
+from apps.bot.services.image_generator import COLLAGE_GAP, collage_grid, create_collage
+from apps.users.models import ChatSettings
+
+
+class CollageTest(SimpleTestCase):
+    """Тестирует раскладку нескольких колод в одно изображение."""
+
+    def _deck_image(self, color) -> bytes:
+        buffer = io.BytesIO()
+        Image.new("RGB", (1000, 1800), color).save(buffer, format='JPEG')
+        return buffer.getvalue()
+
+    def test_grid(self):
+        self.assertEqual(collage_grid(1), (1, 1))
+        for count in range(1, 21):
+            cols, rows = collage_grid(count)
+            self.assertGreaterEqual(cols * rows, count)
+            # Последняя строка не пустая.
+            self.assertGreater(count, cols * (rows - 1))
+
+    def test_collage_size_and_cells(self):
+        images = [self._deck_image(color) for color in ((200, 0, 0), (0, 200, 0), (0, 0, 200))]
+        collage = Image.open(create_collage(images, [1, 3, 4], cell_width=100))
+
+        cols, rows = collage_grid(3)
+        self.assertEqual(collage.format, 'JPEG')
+        self.assertEqual(collage.width, cols * 100 + (cols + 1) * COLLAGE_GAP)
+        # Центр второй ячейки — изображение второй колоды.
+        red, green, blue = collage.getpixel((COLLAGE_GAP * 2 + 150, COLLAGE_GAP + 120))
+        self.assertGreater(green, 150)
+        self.assertLess(red + blue, 100)
+
+
+class ChatSettingsTest(TransactionTestCase):
+    """Тестирует выбор способа вывода колод для чата."""
+
+    def setUp(self):
+        chat_settings.clear_cache()
+
+    @override_settings(BOT_PROGRESSIVE_DELIVERY=False)
+    def test_default_and_override(self):
+        self.assertEqual(asyncio.run(chat_settings.get_output_mode(42)), ChatSettings.DeckOutput.ALBUM)
+
+        asyncio.run(chat_settings.set_output_mode(42, ChatSettings.DeckOutput.COLLAGE))
+        self.assertEqual(ChatSettings.objects.get(chat_id=42).deck_output, ChatSettings.DeckOutput.COLLAGE)
+
+        chat_settings.clear_cache()
+        self.assertEqual(asyncio.run(chat_settings.get_output_mode(42)), ChatSettings.DeckOutput.COLLAGE)
+        self.assertEqual(asyncio.run(chat_settings.get_output_mode(7)), ChatSettings.DeckOutput.ALBUM)
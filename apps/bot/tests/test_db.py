@@ -0,0 +1,28 @@
+from django.test import SimpleTestCase
+
+from apps.bot.services.db import PostgresBotStore, _card_from_row
+from apps.bot.services.deck_utils import calculate_resonances
+
+
+class NativeStoreRowsTest(SimpleTestCase):
+    """Тестирует сборку моделей из строк нативного слоя без обращения к базе."""
+
+    def _row(self, card_id: int, name: str, tags):
+        values = {
+            'card_id': card_id, 'card_type': 'Character', 'name': name, 'title': '', 'description': '',
+            'cost_info': [], 'hp': 10, 'related_card_id': None, 'is_new': False,
+        }
+        return (*(values[attname] for attname in PostgresBotStore._card_attnames), tags)
+
+    def test_tags_are_prefetched(self):
+        cards = [
+            _card_from_row(self._row(1205, "Sangonomiya Kokomi", [[1, "Hydro"], [2, "Inazuma"]]),
+                           PostgresBotStore._card_attnames),
+            _card_from_row(self._row(1408, "Yae Miko", [[3, "Electro"], [2, "Inazuma"]]),
+                           PostgresBotStore._card_attnames),
+        ]
+
+        # SimpleTestCase запрещает запросы к базе, поэтому теги должны браться из кэша prefetch.
+        self.assertEqual([tag.name for tag in cards[0].tags.all()], ["Hydro", "Inazuma"])
+        self.assertEqual(calculate_resonances(cards), ["Inazuma"])
+        self.assertFalse(cards[0]._state.adding)
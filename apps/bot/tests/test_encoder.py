@@ -0,0 +1,40 @@
+import io
+
+from PIL import Image
+from django.test import SimpleTestCase
+
+from apps.bot.services.encoder import EncoderConfig, encode_image
+from apps.bot.services.render_benchmark import load_sample_decks, render_sample, synthetic_media_root
+
+
+class EncoderTest(SimpleTestCase):
+    """Тестирует форматы кодирования и подбор качества под бюджет размера."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        deck = load_sample_decks(limit=1)[0]
+        with synthetic_media_root(deck.card_ids):
+            cls.image = Image.open(io.BytesIO(render_sample(deck))).convert("RGB")
+
+    def test_optimize_is_lossless_and_smaller(self):
+        plain = encode_image(self.image, EncoderConfig(optimize=False))
+        optimized = encode_image(self.image, EncoderConfig())
+        self.assertLess(len(optimized), len(plain))
+        self.assertEqual(Image.open(io.BytesIO(plain)).tobytes(), Image.open(io.BytesIO(optimized)).tobytes())
+
+    def test_budget_search(self):
+        full = encode_image(self.image, EncoderConfig())
+        budget = len(full) * 2 // 3
+        fitted = encode_image(self.image, EncoderConfig(max_bytes=budget))
+        self.assertLessEqual(len(fitted), budget)
+        # Бюджет, недостижимый даже при минимальном качестве: возвращается самый маленький вариант.
+        smallest = encode_image(self.image, EncoderConfig(max_bytes=1000))
+        self.assertEqual(smallest, encode_image(self.image, EncoderConfig(quality=50)))
+
+    def test_webp(self):
+        data = encode_image(self.image, EncoderConfig(format='WEBP', quality=80))
+        self.assertEqual(Image.open(io.BytesIO(data)).format, 'WEBP')
+        self.assertEqual(EncoderConfig(format='WEBP').extension, 'webp')
+        with self.assertRaises(ValueError):
+            EncoderConfig(subsampling='4:1:1')
@@ -1,4 +1,4 @@
-from unittest.mock import patch, AsyncMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from django.test import TransactionTestCase
 
 from apps.bot.services.hoyolab import decode_deck_code
@@ -19,7 +19,7 @@ class HoyolabAPITest(TransactionTestCase):
         for test_case in DECK_TEST_CASES:
             with self.subTest(deck_code=test_case.deck_code):
                 # Настраиваем мок для возврата успешного ответа
-                mock_response = AsyncMock()
+                mock_response = MagicMock()  # `httpx.Response.json()` синхронный.
                 mock_response.json.return_value = test_case.mock_api_response
                 mock_response.raise_for_status.return_value = None
                 mock_post.return_value = mock_response
@@ -49,7 +49,7 @@ class HoyolabAPITest(TransactionTestCase):
         Проверяет обработку ошибки от API (неверный retcode).
         """
         # Настраиваем мок для возврата ответа с ошибкой
-        mock_response = AsyncMock()
+        mock_response = MagicMock()
         mock_response.json.return_value = {"retcode": -100, "message": "Invalid code", "data": None}
         mock_response.raise_for_status.return_value = None
         mock_post.return_value = mock_response
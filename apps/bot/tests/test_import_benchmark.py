@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+
+from apps.bot.services.import_benchmark import ImportRecord, measure_import, package_totals, parse_importtime
+
+IMPORTTIME_LOG = """\
+import time: self [us] | cumulative | imported package
+import time:       300 |        300 |     aiogram.types.base
+import time:      2000 |       2300 |   aiogram.types
+import time:       100 |       2400 | aiogram
+Traceback-like noise line
+import time:       500 |        500 | PIL.Image
+"""
+
+
+class ImportBenchmarkTest(SimpleTestCase):
+    """Тестирует разбор журнала `-X importtime` и изоляцию тяжелых зависимостей в командах."""
+
+    def test_parse_and_group_by_package(self):
+        records = parse_importtime(IMPORTTIME_LOG)
+
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[0], ImportRecord('aiogram.types.base', 300, 300, 2))
+        self.assertEqual(records[2].depth, 0)
+        self.assertEqual(package_totals(records), {'aiogram': 0.0024, 'PIL': 0.0005})
+
+    def test_short_commands_do_not_import_aiogram(self):
+        # aiogram импортируется несколько секунд; команды, которым не нужен бот, не должны его загружать.
+        for module in ('apps.bot.management.commands.generate_test_image', 'apps.bot.management.commands.loadtest'):
+            with self.subTest(module=module):
+                self.assertNotIn('aiogram', measure_import(module).packages)
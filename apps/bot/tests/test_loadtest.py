@@ -0,0 +1,34 @@
+import asyncio
+
+from django.test import TransactionTestCase
+
+from apps.bot.services.loadtest import LoadTestConfig, run_load_test
+from apps.bot.services.render_benchmark import load_sample_decks, synthetic_media_root
+from apps.cards.models import Card
+from apps.users.models import Deck
+
+
+class LoadTestHarnessTest(TransactionTestCase):
+    """
+    Прогоняет настоящий диспетчер бота через фейковый Bot API и заглушку Hoyolab.
+    `TransactionTestCase`, потому что ORM в асинхронных обработчиках работает из других потоков.
+    """
+
+    def test_bot_answers_every_generated_message(self):
+        decks = load_sample_decks(limit=5)
+        card_ids = {card_id for deck in decks for card_id in deck.card_ids}
+        Card.objects.bulk_create([
+            Card(card_id=card_id, name=f"Card {card_id}",
+                 card_type=Card.CardType.CHARACTER if card_id < 100000 else Card.CardType.ACTION)
+            for card_id in card_ids
+        ])
+        config = LoadTestConfig(messages=6, rate=0, multi_ratio=0.5, multi_size=3, group_ratio=0.5, timeout=60)
+
+        with synthetic_media_root(card_ids):
+            result = asyncio.run(run_load_test(config, decks))
+
+        self.assertEqual(len(result.completed), config.messages)
+        self.assertFalse([record.exception for record in result.records if record.exception])
+        self.assertEqual(sum(record.photos for record in result.records), sum(r.codes for r in result.records))
+        self.assertGreater(result.api_calls.get('getUpdates', 0), 0)
+        self.assertTrue(Deck.objects.exists())
@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+from django.test import SimpleTestCase
+
+from apps.bot.services.loop_monitor import LOOP_STALLS, LoopLagMonitor
+
+
+def _block_loop_synchronously() -> None:
+    time.sleep(0.2)
+
+
+class LoopLagMonitorTest(SimpleTestCase):
+    """Тестирует обнаружение блокировок event loop и снимки стека потока loop."""
+
+    def test_stall_is_counted_and_sampled(self):
+        monitor = LoopLagMonitor(interval=0.02, threshold=0.05)
+        stalls = LOOP_STALLS.value()
+
+        async def run():
+            task = asyncio.create_task(monitor.run())
+            await asyncio.sleep(0.05)
+            _block_loop_synchronously()
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(run())
+
+        self.assertGreater(LOOP_STALLS.value(), stalls)
+        self.assertTrue(monitor.samples, "Сторож должен снять стек заблокированного loop")
+        self.assertIn("_block_loop_synchronously", monitor.samples[0].stack)
+        self.assertIn("time.sleep(0.2)", monitor.samples[0].stack)
+        self.assertGreaterEqual(monitor.samples[0].blocked_for, monitor.threshold)
+
+        # После отмены поток-сторож завершается.
+        self.assertTrue(monitor._stopped.is_set())
+        monitor._watchdog.join(timeout=1)
+        self.assertFalse(monitor._watchdog.is_alive())
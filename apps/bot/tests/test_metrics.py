@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+
+from apps.bot.services.metrics import Counter, Histogram, MetricsRegistry
+
+
+class MetricsTest(SimpleTestCase):
+    """Тестирует текстовый формат Prometheus для счетчиков и гистограмм."""
+
+    def test_histogram_buckets_and_quantiles(self):
+        histogram = Histogram("test_duration_seconds", "Тестовая гистограмма", ["stage"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 2.0):
+            histogram.observe(value, "render")
+
+        text = "\n".join(histogram.render())
+
+        self.assertIn('test_duration_seconds_bucket{stage="render",le="0.1"} 1', text)
+        self.assertIn('test_duration_seconds_bucket{stage="render",le="1"} 3', text)
+        self.assertIn('test_duration_seconds_bucket{stage="render",le="+Inf"} 4', text)
+        self.assertIn('test_duration_seconds_count{stage="render"} 4', text)
+        self.assertIn('test_duration_seconds_quantiles{stage="render",quantile="0.5"} 0.5', text)
+        self.assertEqual(histogram.quantiles("render")[0.99], 2.0)
+
+    def test_registry_renders_counters(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("test_requests_total", "Тестовый счетчик", ["cache", "result"])
+        counter.inc("render", "hit")
+        counter.inc("render", "hit")
+
+        self.assertIs(registry.counter("test_requests_total", "Тестовый счетчик"), counter)
+        self.assertIsInstance(counter, Counter)
+        self.assertIn('test_requests_total{cache="render",result="hit"} 2', registry.render())
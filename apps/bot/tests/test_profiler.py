@@ -0,0 +1,43 @@
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from apps.bot.services.metrics import stage_timer
+from apps.bot.services.profiler import SamplingProfiler
+
+
+class SamplingProfilerTest(SimpleTestCase):
+    """Тестирует выборочное профилирование и сохранение профилей с метаданными."""
+
+    def test_disabled_profiler_yields_none_and_writes_nothing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = SamplingProfiler(0.0, Path(tmp))
+
+            async def run():
+                async with profiler.maybe_profile("test") as info:
+                    return info
+
+            self.assertIsNone(asyncio.run(run()))
+            self.assertEqual(list(Path(tmp).iterdir()), [])
+
+    def test_sampled_request_writes_profile_and_metadata(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            profiler = SamplingProfiler(1.0, Path(tmp))
+
+            async def run():
+                async with profiler.maybe_profile("test") as info:
+                    with stage_timer("render"):
+                        await asyncio.sleep(0)
+                    info['deck_count'] = 3
+
+            asyncio.run(run())
+
+            profiles = list(Path(tmp).glob('*.prof'))
+            self.assertEqual(len(profiles), 1)
+            metadata = json.loads(profiles[0].with_suffix('.json').read_text(encoding='utf-8'))
+            self.assertEqual(metadata['deck_count'], 3)
+            self.assertIn('render', metadata['stages'])
+            self.assertGreater(metadata['duration'], 0)
@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase
+
+from apps.bot.services.render_cache import RenderCache
+
+
+class RenderCacheTest(SimpleTestCase):
+    """Тестирует LRU-кэш изображений колод и его обратный индекс «карта → колоды»."""
+
+    def test_invalidation_touches_only_dependent_decks(self):
+        cache = RenderCache(max_size=10)
+        cache.put("deck-a", [1205, 1408, 311101], b"a")
+        cache.put("deck-b", [1209, 1404, 311101], b"b")
+        cache.put("deck-c", [1608, 1315, 1610], b"c")
+        cache.get("deck-b")
+        cache.get("deck-b")
+
+        removed = cache.invalidate_cards([311101])
+
+        self.assertEqual(removed, {"deck-a": 0, "deck-b": 2})
+        self.assertNotIn("deck-a", cache)
+        self.assertNotIn("deck-b", cache)
+        self.assertEqual(cache.get("deck-c"), b"c")
+
+    def test_lru_eviction_cleans_reverse_index(self):
+        cache = RenderCache(max_size=2)
+        cache.put("deck-a", [1], b"a")
+        cache.put("deck-b", [2], b"b")
+        cache.get("deck-a")
+        cache.put("deck-c", [3], b"c")
+
+        self.assertNotIn("deck-b", cache)
+        self.assertEqual(cache.invalidate_cards([2]), {})
+        self.assertEqual(len(cache), 2)
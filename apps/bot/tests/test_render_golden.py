@@ -0,0 +1,62 @@
+from PIL import Image, ImageDraw
+from django.test import SimpleTestCase
+
+from apps.bot.services.image_generator import (
+    _load_background, _resonance_strip, clear_tile_cache, get_top_band, invalidate_card_tiles,
+)
+from apps.bot.services.render_benchmark import (
+    GOLDEN_SIZE, GOLDEN_TOLERANCE, compare_goldens, load_golden_manifest, perceptual_diff, render_sample,
+    synthetic_media_root,
+)
+from apps.cards.services.invalidation import CardChangeEvent
+
+
+class RenderGoldenTest(SimpleTestCase):
+    """
+    Сверяет рендер колод с эталонными изображениями (`apps/bot/tests/golden/`).
+    После намеренного изменения макета эталоны обновляются командой `bench_render --update-golden`.
+    """
+
+    def test_render_matches_goldens(self):
+        self.assertTrue(load_golden_manifest(), "Эталонные изображения не найдены.")
+        for deck, diff in compare_goldens():
+            with self.subTest(deck=deck.deck_code):
+                self.assertLessEqual(diff, GOLDEN_TOLERANCE)
+
+    def test_perceptual_diff_detects_missing_card(self):
+        reference = Image.new("L", GOLDEN_SIZE, 200)
+        broken = reference.copy()
+        ImageDraw.Draw(broken).rectangle((20, 20, 70, 100), fill=0)
+
+        self.assertEqual(perceptual_diff(reference, reference.copy()), 0)
+        self.assertGreater(perceptual_diff(broken, reference), GOLDEN_TOLERANCE)
+
+    def test_precomputed_pieces_are_reused(self):
+        deck = load_golden_manifest()[0][0]
+        background = _load_background().tobytes()
+        with synthetic_media_root(deck.card_ids):
+            first = render_sample(deck)
+            clear_tile_cache()
+            hits = _resonance_strip.cache_info().hits
+            second = render_sample(deck._replace(resonances=list(reversed(deck.resonances))))
+
+        # Порядок резонансов не важен: полоса резонансов берется из кэша, изображение то же.
+        self.assertEqual(_resonance_strip.cache_info().hits, hits + 1)
+        self.assertEqual(first, second)
+        # Рендер не изменяет закэшированный фон.
+        self.assertEqual(_load_background().tobytes(), background)
+
+    def test_top_band_shared_by_lineup(self):
+        deck = load_golden_manifest()[0][0]
+        character_cards, _ = deck.cards()
+        with synthetic_media_root(deck.card_ids):
+            first = render_sample(deck)
+            # Другие карты действий с теми же персонажами — верхняя полоса берется из кэша.
+            other = deck._replace(action_card_ids=deck.action_card_ids[::-1])
+            band = get_top_band(character_cards, tuple(sorted(deck.resonances)))
+            self.assertIs(get_top_band(character_cards, tuple(sorted(deck.resonances))), band)
+            render_sample(other)
+
+            invalidate_card_tiles(CardChangeEvent(frozenset({deck.character_card_ids[0]}), 'test'))
+            self.assertIsNot(get_top_band(character_cards, tuple(sorted(deck.resonances))), band)
+            self.assertEqual(render_sample(deck), first)
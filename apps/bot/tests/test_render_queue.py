@@ -0,0 +1,46 @@
+import asyncio
+
+from django.test import TransactionTestCase
+
+from apps.bot.services.render_benchmark import load_sample_decks, synthetic_media_root
+from apps.bot.services.render_queue import RenderQueueClient, process_next_render_job
+from apps.cards.models import Card
+from apps.jobs.models import RenderJob
+from apps.users.models import Deck
+
+
+class RenderQueueTest(TransactionTestCase):
+    """Тестирует передачу рендера воркеру через таблицу RenderJob и возврат результата боту."""
+
+    def setUp(self):
+        self.sample = load_sample_decks(limit=1)[0]
+        for card in [*self.sample.cards()[0], *self.sample.cards()[1]]:
+            Card.objects.get_or_create(card_id=card.card_id, defaults={'name': card.name, 'card_type': card.card_type})
+        Deck.objects.create(
+            deck_code=self.sample.deck_code,
+            character_card_ids=self.sample.character_card_ids,
+            action_card_ids=self.sample.action_card_ids,
+        )
+
+    def test_worker_renders_for_client(self):
+        client = RenderQueueClient(timeout=20)
+
+        async def scenario():
+            render = asyncio.create_task(client.render(self.sample.deck_code))
+            # Воркер — в отдельном потоке, как отдельный процесс с собственным соединением к БД.
+            while await asyncio.to_thread(process_next_render_job, "test-worker") is None:
+                await asyncio.sleep(0.05)
+            return await render
+
+        with synthetic_media_root(self.sample.card_ids):
+            image = asyncio.run(scenario())
+
+        self.assertTrue(image.startswith(b'\xff\xd8'))
+        # Бот удаляет прочитанную задачу.
+        self.assertFalse(RenderJob.objects.exists())
+
+    def test_timeout_falls_back_to_local_render(self):
+        client = RenderQueueClient(timeout=0.5)
+
+        self.assertIsNone(asyncio.run(client.render(self.sample.deck_code)))
+        self.assertFalse(RenderJob.objects.exists())
@@ -0,0 +1,63 @@
+import asyncio
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import DeleteMessage, SendMessage
+from django.test import SimpleTestCase
+
+from apps.bot.services.rate_limit import TokenBucket
+from apps.bot.services.send_scheduler import SEND_RETRIES, SendScheduler
+
+
+class TokenBucketTest(SimpleTestCase):
+    """Тестирует выдачу токенов и паузу ведра на искусственных часах."""
+
+    def test_refill_and_pause(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=2.0, capacity=2.0, clock=lambda: now[0])
+
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+        self.assertAlmostEqual(bucket.delay(), 0.5)
+
+        now[0] = 0.5
+        bucket.pause(3.0)
+        self.assertAlmostEqual(bucket.delay(), 3.0)
+        now[0] = 3.5
+        self.assertTrue(bucket.try_acquire())
+
+
+class SendSchedulerTest(SimpleTestCase):
+    """Тестирует повтор запроса после ответа 429 и пропуск служебных методов мимо лимитов."""
+
+    def test_retry_after_is_honored(self):
+        scheduler = SendScheduler(global_rate=1000, chat_rate=1000, chat_burst=10, max_retries=2)
+        method = SendMessage(chat_id=42, text="test")
+        calls = []
+
+        async def make_request(bot, request_method):
+            calls.append(asyncio.get_running_loop().time())
+            if len(calls) == 1:
+                raise TelegramRetryAfter(method=request_method, message="Too Many Requests", retry_after=0.2)
+            return "ok"
+
+        retries_before = SEND_RETRIES.value("sendMessage")
+        result = asyncio.run(scheduler(make_request, None, method))
+
+        self.assertEqual(result, "ok")
+        self.assertEqual(len(calls), 2)
+        self.assertGreaterEqual(calls[1] - calls[0], 0.19)
+        self.assertEqual(SEND_RETRIES.value("sendMessage"), retries_before + 1)
+
+    def test_unlimited_methods_skip_buckets(self):
+        scheduler = SendScheduler(global_rate=1, chat_rate=1, chat_burst=1)
+
+        async def make_request(bot, request_method):
+            return True
+
+        async def run():
+            for message_id in range(5):
+                await scheduler(make_request, None, DeleteMessage(chat_id=42, message_id=message_id))
+
+        asyncio.run(asyncio.wait_for(run(), timeout=1))
+        self.assertEqual(len(scheduler.chat_buckets), 0)
@@ -0,0 +1,73 @@
+from django.test import TestCase
+
+from apps.bot.services.image_generator import (
+    ACTION_CARD_SIZE, CHAR_CARD_SIZE, _build_tile, get_card_tile, invalidate_card_tiles, set_tile_snapshot,
+)
+from apps.bot.services.render_benchmark import synthetic_media_root
+from apps.bot.services.snapshot import CARDS_FILE, CardSnapshot, load_snapshot, snapshot_dir, write_snapshot
+from apps.cards.models import Card, Tag
+from apps.cards.services.invalidation import CardChangeEvent
+
+
+class SnapshotTest(TestCase):
+    """Тестирует запись и чтение снимка карт и атласа тайлов."""
+
+    def setUp(self):
+        self.character = Card.objects.create(card_id=1101, name="Гань Юй", card_type=Card.CardType.CHARACTER)
+        self.action = Card.objects.create(card_id=311101, name="Amos' Bow", card_type=Card.CardType.ACTION)
+        self.character.tags.add(Tag.objects.create(name="Cryo"), Tag.objects.create(name="Liyue"))
+        self.addCleanup(set_tile_snapshot, None)
+
+    def test_round_trip(self):
+        with synthetic_media_root([1101, 311101]):
+            stats = write_snapshot()
+            snapshot = CardSnapshot.open()
+
+            self.assertEqual((stats.cards, stats.tiles), (2, 2))
+            card = snapshot.cards[1101]
+            self.assertEqual((card.name, card.card_type, card.tags), ("Гань Юй", "Character", {"Cryo", "Liyue"}))
+            self.assertEqual(snapshot.cards[311101].tags, frozenset())
+            self.assertEqual(snapshot.catalog_entries()[311101].name, "Amos' Bow")
+            self.assertEqual(
+                snapshot.tile(311101, ACTION_CARD_SIZE).tobytes(),
+                _build_tile(self.action, ACTION_CARD_SIZE).tobytes(),
+            )
+            self.assertIsNone(snapshot.tile(311101, CHAR_CARD_SIZE))
+
+    def test_loaded_snapshot_serves_tiles(self):
+        with synthetic_media_root([1101, 311101]):
+            write_snapshot()
+            snapshot = load_snapshot()
+            self.assertIsNotNone(snapshot)
+
+            # Тайл из атласа — представление отображенного файла, а не новое изображение.
+            self.assertTrue(get_card_tile(self.character, CHAR_CARD_SIZE).readonly)
+            invalidate_card_tiles(CardChangeEvent(frozenset({1101}), 'test'))
+            self.assertIsNone(snapshot.tile(1101, CHAR_CARD_SIZE))
+            self.assertFalse(get_card_tile(self.character, CHAR_CARD_SIZE).readonly)
+
+    def test_broken_snapshot_is_ignored(self):
+        with synthetic_media_root([1101, 311101]):
+            write_snapshot()
+            (snapshot_dir() / CARDS_FILE).write_bytes(b'garbage' * 10)
+            self.assertIsNone(CardSnapshot.open())
+
+    def test_card_renamed_after_snapshot_written(self):
+        with synthetic_media_root([1101, 311101]):
+            write_snapshot()
+            # Правка в обход шины инвалидации (например, в админке, пока бот остановлен).
+            Card.objects.filter(card_id=1101).update(name="Ганьюй")
+
+            snapshot = load_snapshot()
+
+            # Переименованная карта исключена из снимка, остальные берутся из него как раньше.
+            self.assertEqual(list(snapshot.catalog_entries()), [311101])
+            self.assertIsNone(snapshot.tile(1101, CHAR_CARD_SIZE))
+            self.assertIsNotNone(snapshot.tile(311101, ACTION_CARD_SIZE))
+
+    def test_unchanged_catalog_keeps_snapshot(self):
+        with synthetic_media_root([1101, 311101]):
+            write_snapshot()
+            snapshot = load_snapshot()
+            self.assertEqual(set(snapshot.catalog_entries()), {1101, 311101})
+            self.assertEqual(snapshot.validate_catalog(), 0)
@@ -0,0 +1,50 @@
+import asyncio
+
+from django.test import TransactionTestCase
+
+from apps.bot.services.image_generator import clear_tile_cache
+from apps.bot.services.render_benchmark import load_sample_decks, synthetic_media_root
+from apps.bot.services.warmup import popular_deck_codes, warm_up
+from apps.cards.models import Card
+from apps.users.models import Deck, TelegramUser, UserActivity
+
+
+class WarmupTest(TransactionTestCase):
+    """Тестирует выбор популярных колод и прогрев кэшей при запуске бота."""
+
+    def setUp(self):
+        self.samples = load_sample_decks(limit=3)
+        user = TelegramUser.objects.create(user_id=1)
+        for index, sample in enumerate(self.samples):
+            for card in [*sample.cards()[0], *sample.cards()[1]]:
+                Card.objects.get_or_create(card_id=card.card_id, defaults={'name': card.name, 'card_type': card.card_type})
+            Deck.objects.create(
+                deck_code=sample.deck_code,
+                character_card_ids=sample.character_card_ids,
+                action_card_ids=sample.action_card_ids,
+                usage_count=index,
+            )
+        # Вторая колода популярнее всех за последние дни, у третьей больше всего использований за все время.
+        for code in [self.samples[1].deck_code] * 3 + [self.samples[0].deck_code]:
+            UserActivity.objects.create(
+                user=user, activity_type=UserActivity.ActivityType.DECK_PROCESSED, details={'code': code}
+            )
+
+    def test_popular_deck_codes(self):
+        codes = [sample.deck_code for sample in self.samples]
+        self.assertEqual(asyncio.run(popular_deck_codes(3, days=7)), [codes[1], codes[0], codes[2]])
+        self.assertEqual(asyncio.run(popular_deck_codes(1, days=7)), [codes[1]])
+
+    def test_warm_up(self):
+        rendered = []
+
+        async def render(deck: Deck):
+            rendered.append(deck.deck_code)
+
+        card_ids = [card_id for sample in self.samples for card_id in sample.card_ids]
+        with synthetic_media_root(card_ids):
+            timings = asyncio.run(warm_up(render, top_decks=2, days=7))
+        clear_tile_cache()
+
+        self.assertEqual(rendered, [self.samples[1].deck_code, self.samples[0].deck_code])
+        self.assertEqual(set(timings), {'catalog', 'tiles', 'decks', 'total'})
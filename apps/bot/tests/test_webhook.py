@@ -0,0 +1,96 @@
+import asyncio
+import io
+import json
+from unittest.mock import patch
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from apps.bot.services.webhook import create_webhook_app, webhook_secret
+
+
+class WebhookTest(SimpleTestCase):
+    """Тестирует проверку секрета, фоновую обработку апдейтов и плавную остановку вебхука."""
+
+    def _update(self, update_id: int) -> dict:
+        return {'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': 0, 'chat': {'id': 42, 'type': 'private'},
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'Test'}, 'text': 'hello',
+        }}
+
+    def test_secret_and_drain(self):
+        handled = []
+
+        async def scenario():
+            gate = asyncio.Event()
+            dp = Dispatcher()
+
+            @dp.message()
+            async def on_message(message: Message):
+                await gate.wait()
+                handled.append(message.message_id)
+
+            bot = Bot(token="123456789:TEST")
+            app = create_webhook_app(bot, dp, "/hook", "secret")
+            async with TestClient(TestServer(app)) as client:
+                headers = {'X-Telegram-Bot-Api-Secret-Token': 'secret'}
+                self.assertEqual((await client.post("/hook", json=self._update(1))).status, 401)
+                # Обработчик отвечает сразу, не дожидаясь обработки апдейта.
+                self.assertEqual((await client.post("/hook", json=self._update(2), headers=headers)).status, 200)
+                self.assertEqual(handled, [])
+
+                drain = asyncio.create_task(app['webhook_handler'].drain(timeout=5))
+                await asyncio.sleep(0)
+                self.assertEqual((await client.post("/hook", json=self._update(3), headers=headers)).status, 503)
+                gate.set()
+                await drain
+            await bot.session.close()
+
+        asyncio.run(scenario())
+        self.assertEqual(handled, [2])
+
+    def test_secret_is_stable(self):
+        self.assertEqual(webhook_secret("123:abc"), webhook_secret("123:abc"))
+        self.assertNotEqual(webhook_secret("123:abc"), webhook_secret("123:abd"))
+        self.assertEqual(webhook_secret("123:abc", "explicit"), "explicit")
+
+
+class _FakeResponse:
+    status = 200
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def read(self) -> bytes:
+        return b''
+
+
+class PostTestUpdateCommandTest(SimpleTestCase):
+    """Тестирует команду `post_test_update` с подмененным POST-запросом."""
+
+    def test_posts_text_update(self):
+        requests = []
+
+        def fake_post(session, url, data, headers):
+            requests.append((url, json.loads(data), headers))
+            return _FakeResponse()
+
+        stdout = io.StringIO()
+        with patch('aiohttp.ClientSession.post', fake_post):
+            call_command(
+                'post_test_update', url='http://hook/', chat_id=5, text='/start', secret='s', stdout=stdout,
+            )
+
+        self.assertIn("Отправлено апдейтов: 1", stdout.getvalue())
+        self.assertIn("200=1", stdout.getvalue())
+        [(url, update, headers)] = requests
+        self.assertEqual(url, 'http://hook/')
+        self.assertEqual(update['message']['text'], '/start')
+        self.assertEqual(update['message']['chat']['id'], 5)
+        self.assertEqual(headers['X-Telegram-Bot-Api-Secret-Token'], 's')
@@ -1,5 +1,4 @@
 import logging
-import threading
 from pathlib import Path
 from typing import Tuple
 
@@ -7,14 +6,20 @@ from django import forms
 from django.contrib import admin, messages
 from django.contrib.admin import ModelAdmin
 from django.db.models import QuerySet, Q
-from django.http import HttpRequest, HttpResponseRedirect
-from django.urls import path
-from django.conf import settings
+from django.http import FileResponse, Http404, HttpRequest, HttpResponseRedirect, JsonResponse
+from django.urls import path, reverse
+from django.views.decorators.http import require_POST
 from django.utils.html import format_html
 from django_select2.forms import Select2MultipleWidget
 
 from .models import Card, Tag
-from .services.db_updater import run_card_update
+from .services.invalidation import publish_card_change
+from .services.thumbnails import (
+    CACHE_CONTROL, DETAIL_THUMBNAIL_WIDTH, LIST_THUMBNAIL_WIDTH, THUMBNAIL_WIDTHS, get_thumbnail, thumbnail_url,
+)
+from apps.jobs.models import Job
+from apps.jobs.services import JobAlreadyRunning, enqueue_job, job_status_payload, request_cancel
+from apps.users.models import DeckCard
 
 logger = logging.getLogger(__name__)
 
@@ -41,12 +46,12 @@ class CardAdmin(ModelAdmin):
     search_fields = ('name', 'card_id')
     ordering = ('-card_id',)
     list_per_page = 30
-    readonly_fields = ('card_id', 'image_preview_large')
+    readonly_fields = ('card_id', 'image_preview_large', 'deck_usage')
     fieldsets = (
         ("Основная информация", {"fields": ('card_id', 'name', 'card_type', 'is_new', 'title')}),
         ("Изображение", {"fields": ('image_preview_large', 'upload_image')}),
         ("Игровые данные", {"fields": ('description', 'cost_info', 'hp')}),
-        ("Связи и теги", {"fields": ('related_card', 'tags')}),
+        ("Связи и теги", {"fields": ('related_card', 'tags', 'deck_usage')}),
     )
     change_list_template = "admin/cards/card/change_list.html"
 
@@ -72,34 +77,45 @@ class CardAdmin(ModelAdmin):
         urls = super().get_urls()
         custom_urls = [
             path("update-from-api/", self.admin_site.admin_view(self.update_cards_view),
-                 name="cards_card_update_from_api")
+                 name="cards_card_update_from_api"),
+            path("update-status/", self.admin_site.admin_view(self.update_status_view),
+                 name="cards_card_update_status"),
+            path("update-cancel/", self.admin_site.admin_view(require_POST(self.update_cancel_view)),
+                 name="cards_card_update_cancel"),
+            # `cacheable=True`: без него admin_view добавляет заголовки, запрещающие кэширование превью.
+            path("thumbnail/<int:card_id>/<int:width>/<str:digest>.webp",
+                 self.admin_site.admin_view(self.thumbnail_view, cacheable=True),
+                 name="cards_card_thumbnail"),
         ]
         return custom_urls + urls
 
     def get_queryset(self, request: HttpRequest) -> QuerySet:
         return super().get_queryset(request).prefetch_related('tags')
 
-    def _get_image_url(self, obj: Card) -> str | None:
-        if obj.local_image_path.exists():
-            relative_path = obj.local_image_path.relative_to(settings.MEDIA_ROOT)
-            timestamp = obj.local_image_path.stat().st_mtime
-            return f"{settings.MEDIA_URL}{relative_path}?v={timestamp}"
-        return None
-
     @admin.display(description="Изображение")
     def image_preview(self, obj: Card) -> str:
-        url = self._get_image_url(obj)
+        # Превью и метаданные файлов кэшируются (`services/thumbnails.py`): список не читает диск на каждую строку.
+        url = thumbnail_url(obj.card_id, LIST_THUMBNAIL_WIDTH)
         if url:
             return format_html('<img src="{}" style="width: 50px; height: auto;" />', url)
         return "Нет фото"
 
     @admin.display(description="Текущее изображение")
     def image_preview_large(self, obj: Card) -> str:
-        url = self._get_image_url(obj)
+        url = thumbnail_url(obj.card_id, DETAIL_THUMBNAIL_WIDTH)
         if url:
             return format_html('<img src="{}" style="max-width: 200px; height: auto;" />', url)
         return "Нет фото"
 
+    @admin.display(description="Колоды с этой картой")
+    def deck_usage(self, obj: Card) -> str:
+        # Используем обратный индекс «карта → колоды», чтобы не сканировать JSON-списки всех колод.
+        count = DeckCard.objects.filter(card_id=obj.card_id).count()
+        if not count:
+            return "—"
+        url = f"{reverse('admin:users_deck_changelist')}?card_index__card_id={obj.card_id}"
+        return format_html('<a href="{}">{}</a>', url, count)
+
     @admin.display(description="Теги")
     def display_tags(self, obj: Card) -> str:
         tags = [tag.name for tag in obj.tags.all()]
@@ -107,6 +123,8 @@ class CardAdmin(ModelAdmin):
 
     def save_model(self, request: HttpRequest, obj: Card, form: CardAdminForm, change: bool) -> None:
         super().save_model(request, obj, form, change)
+        # Бот сбросит кэши этой карты после фиксации транзакции (данные, теги или изображение могли измениться).
+        publish_card_change([obj.card_id], reason='admin_save')
         uploaded_file = request.FILES.get('upload_image')
 
         if not uploaded_file:
@@ -124,21 +142,55 @@ class CardAdmin(ModelAdmin):
             logger.error(f"Ошибка IOError при записи файла изображения для карты {obj.card_id}: {e}", exc_info=True)
             self.message_user(request, f"Ошибка при сохранении изображения: {e}", messages.ERROR)
 
+    @staticmethod
+    def _latest_update_job() -> Job | None:
+        return Job.objects.filter(kind=Job.Kind.CARD_UPDATE).order_by('-created_at').first()
+
+    def changelist_view(self, request: HttpRequest, extra_context: dict | None = None):
+        extra_context = extra_context or {}
+        extra_context['update_job'] = self._latest_update_job()
+        return super().changelist_view(request, extra_context=extra_context)
+
     def update_cards_view(self, request: HttpRequest) -> HttpResponseRedirect:
+        # Тяжелая задача ставится в очередь и выполняется отдельным процессом-воркером (`runjobs`),
+        # а не потоком внутри веб-сервера Django.
         try:
-            # Запускаем тяжелую задачу в отдельном потоке, чтобы не блокировать основной процесс Django.
-            thread = threading.Thread(target=run_card_update, daemon=True)
-            thread.start()
+            job = enqueue_job(Job.Kind.CARD_UPDATE, requested_by=request.user)
             self.message_user(
                 request,
-                "Процесс обновления карт запущен в фоновом режиме. "
-                "Это может занять несколько минут.",
+                f"Обновление карт поставлено в очередь (задача #{job.pk}). "
+                "Прогресс отображается на этой странице.",
                 messages.SUCCESS,
             )
+        except JobAlreadyRunning as e:
+            self.message_user(request, str(e), messages.WARNING)
         except Exception as e:
             self.message_user(request, f"Не удалось запустить процесс обновления: {e}", messages.ERROR)
         return HttpResponseRedirect("../")
 
+    def update_status_view(self, request: HttpRequest) -> JsonResponse:
+        """JSON-статус последней задачи обновления для живого отображения прогресса."""
+        return JsonResponse(job_status_payload(self._latest_update_job()))
+
+    def thumbnail_view(self, request: HttpRequest, card_id: int, width: int, digest: str):
+        path = get_thumbnail(card_id, width, digest)
+        if path is None:
+            # Изображение карты заменили после загрузки страницы — отправляем на актуальный URL.
+            current_url = thumbnail_url(card_id, width) if width in THUMBNAIL_WIDTHS else None
+            if current_url is None:
+                raise Http404("Изображение карты не найдено.")
+            return HttpResponseRedirect(current_url)
+        response = FileResponse(open(path, 'rb'), content_type='image/webp')
+        response['Cache-Control'] = CACHE_CONTROL
+        return response
+
+    def update_cancel_view(self, request: HttpRequest) -> JsonResponse:
+        job = self._latest_update_job()
+        if job and job.is_active:
+            request_cancel(job)
+            job.refresh_from_db()
+        return JsonResponse(job_status_payload(job))
+
 
 @admin.register(Tag)
 class TagAdmin(ModelAdmin):
@@ -17,8 +17,14 @@ class CardsConfig(AppConfig):
         Идеальное место для подключения сигналов.
         """
         from .models import Card  # Импортируем модель здесь, чтобы избежать циклических импортов
+        from .services.invalidation import publish_card_change, register_card_change_handler
+        from .services.thumbnails import invalidate_thumbnails
 
-        @receiver(post_delete, sender=Card)
+        # Превью в админке сбрасываются при сохранении и удалении карт в этом процессе.
+        register_card_change_handler(invalidate_thumbnails)
+
+        # `weak=False`: обработчик объявлен локально и без сильной ссылки был бы сразу удален сборщиком мусора.
+        @receiver(post_delete, sender=Card, weak=False)
         def delete_card_image_on_delete(sender, instance: Card, **kwargs):
             """
             Сигнал, который срабатывает после удаления объекта Card из БД
@@ -26,6 +32,7 @@ class CardsConfig(AppConfig):
             """
             # `instance` - это удаляемый объект Card, предоставляемый сигналом.
             image_path = instance.local_image_path
+            publish_card_change([instance.card_id], reason='card_deleted')
 
             if image_path.exists() and image_path.is_file():
                 try:
@@ -1,7 +1,8 @@
 import logging
 from typing import Any
 from django.core.management.base import BaseCommand
-from apps.cards.services.db_updater import run_card_update
+from apps.jobs.models import Job
+from apps.jobs.services import run_job_inline
 
 
 class Command(BaseCommand):
@@ -13,9 +14,11 @@ class Command(BaseCommand):
         self.stdout.write("Запуск обновления базы данных...")
 
         try:
-            logs = run_card_update()
+            # Обновление выполняется как фоновая задача в текущем процессе: advisory-блокировка
+            # не даст ему пересечься с обновлением, запущенным воркером из админки.
+            job = run_job_inline(Job.Kind.CARD_UPDATE)
 
-            for log_line in logs:
+            for log_line in job.logs:
                 if "[CRITICAL]" in log_line or "[ERROR]" in log_line:
                     self.stderr.write(self.style.ERROR(log_line))
                 elif "[WARNING]" in log_line:
@@ -4,12 +4,14 @@ import asyncio
 import httpx
 import logging
 from pathlib import Path
-from typing import Any, Dict, List, Set, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from asgiref.sync import async_to_sync
 from django.db import transaction
 from django.conf import settings
 from apps.cards.models import Card, Tag
+from apps.cards.services.invalidation import publish_card_change
+from apps.jobs.services import NullReporter
 
 logger = logging.getLogger(__name__)
 
@@ -47,10 +49,10 @@ async def _fetch_json(client: httpx.AsyncClient, url: str) -> Dict[str, Any]:
         return {}
 
 
-async def _download_images_async(images_to_download: Dict[Path, str]):
-    """Асинхронно и параллельно скачивает изображения."""
+async def _download_images_async(images_to_download: Dict[Path, str]) -> List[Path]:
+    """Асинхронно и параллельно скачивает изображения. Возвращает пути успешно скачанных файлов."""
 
-    async def _download_one(client: httpx.AsyncClient, local_path: Path, url: str):
+    async def _download_one(client: httpx.AsyncClient, local_path: Path, url: str) -> Optional[Path]:
         try:
             # Используем `client.stream` для потоковой загрузки больших файлов (изображений).
             async with client.stream("GET", url, follow_redirects=True, timeout=20) as r:
@@ -61,15 +63,18 @@ async def _download_images_async(images_to_download: Dict[Path, str]):
                 with open(local_path, 'wb') as f:
                     async for chunk in r.aiter_bytes():
                         f.write(chunk)
+            return local_path
         except Exception:
             # Логируем только URL, чтобы не загромождать логи полным traceback-ом
             # при массовых сбоях (например, недоступности сервера изображений).
             logger.warning(f"Не удалось скачать изображение: {url}", exc_info=False)
+            return None
 
     async with httpx.AsyncClient() as client:
         # Создаем список задач для параллельного выполнения.
         tasks = [_download_one(client, path, url) for path, url in images_to_download.items()]
-        await asyncio.gather(*tasks)
+        results = await asyncio.gather(*tasks)
+    return [path for path in results if path is not None]
 
 
 async def _get_images_to_download_async(
@@ -94,13 +99,17 @@ async def _get_images_to_download_async(
     return image_map
 
 
-async def _db_operations_async(all_cards_data: Dict[str, Any], new_card_ids: Set[int]) -> Set[int]:
+async def _db_operations_async(
+        all_cards_data: Dict[str, Any], new_card_ids: Set[int]
+) -> Tuple[Set[int], Set[int]]:
     """
     Выполняет все операции с базой данных в одной асинхронной функции.
     Включает создание, обновление и удаление карт, а также управление тегами.
     Предполагается, что эта функция будет вызвана внутри транзакции.
+    Возвращает (ID всех обработанных карт, ID карт, которые были созданы, изменены или удалены).
     """
     processed_card_ids: Set[int] = set()
+    changed_card_ids: Set[int] = set()
 
     # --- Проход 1: Создание/обновление карт БЕЗ внешних ключей ---
     # Загружаем все существующие карты в словарь для быстрого доступа в памяти.
@@ -129,9 +138,12 @@ async def _db_operations_async(all_cards_data: Dict[str, Any], new_card_ids: Set
 
         if card_id in existing_cards:
             card_obj = existing_cards[card_id]
+            if any(getattr(card_obj, key) != value for key, value in defaults.items() if key != 'related_card_id'):
+                changed_card_ids.add(card_id)
             for key, value in defaults.items(): setattr(card_obj, key, value)
             cards_to_update.append(card_obj)
         else:
+            changed_card_ids.add(card_id)
             cards_to_create.append(Card(card_id=card_id, **defaults))
 
     # Выполняем массовые операции для производительности.
@@ -172,67 +184,113 @@ async def _db_operations_async(all_cards_data: Dict[str, Any], new_card_ids: Set
     for card in all_processed_cards.values():
         api_data = all_cards_data.get(str(card.card_id), {})
         tag_names = api_data.get('tag', [])
+        if {tag.name for tag in card.tags.all()} != {name for name in tag_names if name in all_db_tags}:
+            changed_card_ids.add(card.card_id)
         # `aset` очищает старые теги и устанавливает новые.
         await card.tags.aset([all_db_tags[name] for name in tag_names if name in all_db_tags])
 
     # --- Проход 4: Удаление устаревших карт ---
     # Удаляем карты, которые есть в БД, но отсутствуют в последней версии API.
-    await Card.objects.exclude(card_id__in=processed_card_ids).adelete()
+    stale_cards_qs = Card.objects.exclude(card_id__in=processed_card_ids)
+    changed_card_ids.update([card_id async for card_id in stale_cards_qs.values_list('card_id', flat=True)])
+    await stale_cards_qs.adelete()
 
-    return processed_card_ids
+    return processed_card_ids, changed_card_ids
 
 
 # --- Основная синхронная функция-оркестратор ---
 
-def run_card_update() -> List[str]:
+UPDATE_STAGES: List[Tuple[str, str]] = [
+    ('fetch', "Загрузка данных из API"),
+    ('database', "Обновление базы данных"),
+    ('images', "Скачивание изображений"),
+    ('snapshot', "Снимок карт и тайлов для бота"),
+]
+
+
+def run_card_update(reporter: Optional[NullReporter] = None) -> List[str]:
     """
     Синхронная функция-оркестратор. Запускает асинхронные блоки для сети
     и выполняет операции с БД в транзакции, используя мосты async/sync.
     Возвращает список логов для отображения пользователю.
+
+    `reporter` (обычно `JobReporter` фоновой задачи) получает этапы, их тайминги
+    и строки лога; между этапами проверяется запрос на отмену.
     """
-    logs: List[str] = ["[INFO] Начало процесса обновления..."]
+    reporter = reporter or NullReporter()
+    logs: List[str] = []
+
+    def _log(line: str) -> None:
+        logs.append(line)
+        reporter.log(line)
+
+    reporter.plan(UPDATE_STAGES)
+    _log("[INFO] Начало процесса обновления...")
 
     # Этап 1: Загрузка данных из API
+    reporter.check_cancelled()
     try:
-        logs.append("[INFO] Этап 1: Загрузка данных из API.")
-        all_cards_data, new_cards_data = asyncio.run(_fetch_all_data_async())
-        if not all_cards_data:
-            raise RuntimeError("Не удалось получить основной список карт.")
+        with reporter.stage('fetch'):
+            _log("[INFO] Этап 1: Загрузка данных из API.")
+            all_cards_data, new_cards_data = asyncio.run(_fetch_all_data_async())
+            if not all_cards_data:
+                raise RuntimeError("Не удалось получить основной список карт.")
     except Exception as e:
-        logs.append(f"[CRITICAL] Ошибка при загрузке данных API: {e}")
+        _log(f"[CRITICAL] Ошибка при загрузке данных API: {e}")
         return logs
 
     # Этап 2: Обновление БД в атомарной транзакции
+    reporter.check_cancelled()
     try:
-        logs.append("[INFO] Этап 2: Обновление базы данных в транзакции.")
-        # `transaction.atomic` гарантирует, что все операции с БД либо пройдут успешно, либо будут отменены.
-        with transaction.atomic():
-            # `async_to_sync` позволяет вызвать асинхронную функцию из синхронного контекста.
-            processed_card_ids = async_to_sync(_db_operations_async)(
-                all_cards_data, set(new_cards_data.get('gcg', []))
-            )
-        logs.append("[SUCCESS] Транзакция с базой данных успешно завершена.")
+        with reporter.stage('database'):
+            _log("[INFO] Этап 2: Обновление базы данных в транзакции.")
+            # `transaction.atomic` гарантирует, что все операции с БД либо пройдут успешно, либо будут отменены.
+            with transaction.atomic():
+                # `async_to_sync` позволяет вызвать асинхронную функцию из синхронного контекста.
+                processed_card_ids, changed_card_ids = async_to_sync(_db_operations_async)(
+                    all_cards_data, set(new_cards_data.get('gcg', []))
+                )
+                # Событие отправится после фиксации транзакции: бот сбросит кэши только измененных карт.
+                publish_card_change(changed_card_ids, reason='card_update')
+        _log("[SUCCESS] Транзакция с базой данных успешно завершена.")
+        _log(f"Изменено карт: {len(changed_card_ids)}.")
     except Exception as e:
         logger.critical("Критическая ошибка в транзакции БД", exc_info=True)
-        logs.append(f"[CRITICAL] Ошибка транзакции: {e}. Изменения отменены.")
+        _log(f"[CRITICAL] Ошибка транзакции: {e}. Изменения отменены.")
         return logs
 
     # Этап 3: Скачивание недостающих изображений
+    reporter.check_cancelled()
     try:
-        logs.append("[INFO] Этап 3: Поиск и скачивание недостающих изображений.")
-        # `async_to_sync` для вызова асинхронной функции.
-        images_to_download = async_to_sync(_get_images_to_download_async)(
-            processed_card_ids, all_cards_data
-        )
-        if images_to_download:
-            IMAGE_DIR.mkdir(parents=True, exist_ok=True)
-            logs.append(f"Обнаружено {len(images_to_download)} изображений для скачивания.")
-            asyncio.run(_download_images_async(images_to_download))
-            logs.append("[DOWNLOAD] Скачивание завершено.")
-        else:
-            logs.append("Все изображения уже на месте.")
+        with reporter.stage('images', optional=True):
+            _log("[INFO] Этап 3: Поиск и скачивание недостающих изображений.")
+            # `async_to_sync` для вызова асинхронной функции.
+            images_to_download = async_to_sync(_get_images_to_download_async)(
+                processed_card_ids, all_cards_data
+            )
+            if images_to_download:
+                IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+                _log(f"Обнаружено {len(images_to_download)} изображений для скачивания.")
+                downloaded_paths = asyncio.run(_download_images_async(images_to_download))
+                publish_card_change([int(path.stem) for path in downloaded_paths], reason='image_download')
+                _log("[DOWNLOAD] Скачивание завершено.")
+            else:
+                _log("Все изображения уже на месте.")
+    except Exception as e:
+        _log(f"[WARNING] Ошибка во время скачивания изображений: {e}")
+
+    # Этап 4: Снимок справочника и тайлов, с которым бот и рендереры быстро стартуют
+    reporter.check_cancelled()
+    try:
+        with reporter.stage('snapshot', optional=True):
+            # Импорт здесь: модуль тянет за собой конвейер рендера, который нужен только этому этапу.
+            from apps.bot.services.snapshot import write_snapshot
+            _log("[INFO] Этап 4: Запись снимка карт и тайлов для бота.")
+            stats = write_snapshot()
+            _log(f"Снимок записан: {stats.cards} карт, {stats.tiles} тайлов.")
     except Exception as e:
-        logs.append(f"[WARNING] Ошибка во время скачивания изображений: {e}")
+        logger.exception("Не удалось записать снимок карт")
+        _log(f"[WARNING] Ошибка при записи снимка карт: {e}")
 
-    logs.append("[SUCCESS] Процесс обновления полностью завершен!")
-    return logs
\ No newline at end of file
+    _log("[SUCCESS] Процесс обновления полностью завершен!")
+    return logs
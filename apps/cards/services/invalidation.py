@@ -0,0 +1,155 @@
+"""
+Шина инвалидации кэшей между процессами.
+
+Админка и воркер фоновых задач публикуют события об изменении карт через
+PostgreSQL `NOTIFY`, а бот слушает канал через `LISTEN` и сбрасывает только
+затронутые записи своих in-process кэшей (тайлы, отрендеренные колоды и т.д.).
+Внутри одного процесса события доставляются напрямую, без участия БД, —
+это же служит запасным вариантом для СУБД без LISTEN/NOTIFY.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+CARD_CHANGED_CHANNEL = "kkbot_card_changed"
+# Лимит payload у `pg_notify` — 8000 байт, поэтому большие списки ID отправляются частями.
+MAX_IDS_PER_NOTIFICATION = 500
+LISTEN_RECONNECT_DELAY = 5
+
+# Идентификатор процесса-отправителя: свои же уведомления, вернувшиеся через LISTEN, игнорируются,
+# так как локальные подписчики уже получили событие напрямую.
+PROCESS_ORIGIN = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class CardChangeEvent(NamedTuple):
+    """Событие об изменении набора карт (данные, теги или изображение)."""
+    card_ids: FrozenSet[int]
+    reason: str
+
+
+CardChangeHandler = Callable[[CardChangeEvent], None]
+_handlers: List[CardChangeHandler] = []
+
+
+def register_card_change_handler(handler: CardChangeHandler) -> None:
+    """
+    Подписывает обработчик на события изменения карт. Обработчик вызывается
+    синхронно (в потоке event loop у бота), поэтому должен быть быстрым.
+    """
+    if handler not in _handlers:
+        _handlers.append(handler)
+
+
+def dispatch_card_change(event: CardChangeEvent) -> None:
+    """Доставляет событие всем локальным подписчикам текущего процесса."""
+    for handler in list(_handlers):
+        try:
+            handler(event)
+        except Exception:
+            logger.exception(f"Ошибка в обработчике инвалидации {handler!r}")
+
+
+def publish_card_change(card_ids: Iterable[int], reason: str) -> None:
+    """
+    Публикует событие об изменении карт после фиксации текущей транзакции:
+    локальным подписчикам — напрямую, другим процессам — через `pg_notify`.
+    """
+    ids = sorted({int(card_id) for card_id in card_ids})
+    if not ids:
+        return
+
+    def _send() -> None:
+        dispatch_card_change(CardChangeEvent(frozenset(ids), reason))
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            for i in range(0, len(ids), MAX_IDS_PER_NOTIFICATION):
+                payload = json.dumps({
+                    'card_ids': ids[i:i + MAX_IDS_PER_NOTIFICATION],
+                    'reason': reason,
+                    'origin': PROCESS_ORIGIN,
+                })
+                cursor.execute("SELECT pg_notify(%s, %s)", [CARD_CHANGED_CHANNEL, payload])
+
+    transaction.on_commit(_send)
+
+
+def _parse_card_change(payload: str) -> Optional[CardChangeEvent]:
+    try:
+        data = json.loads(payload)
+        if data.get('origin') == PROCESS_ORIGIN:
+            return None
+        return CardChangeEvent(frozenset(int(i) for i in data['card_ids']), data.get('reason', ''))
+    except (ValueError, KeyError, TypeError):
+        logger.warning(f"Некорректное уведомление об изменении карт: {payload!r}")
+        return None
+
+
+def _handle_card_change_notification(payload: str) -> None:
+    event = _parse_card_change(payload)
+    if event:
+        logger.info(f"Инвалидация кэшей для {len(event.card_ids)} карт (причина: {event.reason})")
+        dispatch_card_change(event)
+
+
+def build_conninfo(alias: str = 'default') -> str:
+    """
+    Собирает строку подключения psycopg из настроек Django для выделенного соединения.
+    Значения экранирует `make_conninfo`, поэтому пароль может содержать кавычки и пробелы.
+    """
+    from psycopg.conninfo import make_conninfo
+
+    db = settings.DATABASES[alias]
+    params = {
+        'dbname': db.get('NAME'),
+        'user': db.get('USER'),
+        'password': db.get('PASSWORD'),
+        'host': db.get('HOST'),
+        'port': db.get('PORT'),
+    }
+    return make_conninfo(**{key: value for key, value in params.items() if value})
+
+
+async def pg_listen(
+        handlers: Dict[str, Callable[[str], Optional[Awaitable[None]]]],
+        alias: str = 'default',
+) -> None:
+    """
+    Слушает каналы PostgreSQL на отдельном асинхронном соединении и передает payload
+    уведомлений обработчикам. При обрыве соединения переподключается.
+    Работает до отмены задачи.
+    """
+    if settings.DATABASES[alias]['ENGINE'] != 'django.db.backends.postgresql':
+        logger.info("LISTEN/NOTIFY недоступен для текущей СУБД, используется только локальная доставка событий.")
+        return
+
+    import psycopg
+
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(build_conninfo(alias), autocommit=True) as conn:
+                for channel in handlers:
+                    await conn.execute(f'LISTEN "{channel}"')
+                logger.info(f"Подписка на каналы PostgreSQL: {', '.join(handlers)}")
+                async for notify in conn.notifies():
+                    result = handlers[notify.channel](notify.payload)
+                    if asyncio.iscoroutine(result):
+                        await result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Соединение LISTEN потеряно ({e}), переподключение через {LISTEN_RECONNECT_DELAY} с.")
+            await asyncio.sleep(LISTEN_RECONNECT_DELAY)
+
+
+async def listen_for_card_changes() -> None:
+    """Фоновая задача бота: применяет события изменения карт из других процессов."""
+    await pg_listen({CARD_CHANGED_CHANNEL: _handle_card_change_notification})
@@ -0,0 +1,145 @@
+"""
+Уменьшенные копии изображений карт для превью в админке.
+
+Список карт показывает 30 превью на странице; раньше для каждого вызывались `exists()` и `stat()`,
+а браузер скачивал полноразмерный webp ради картинки шириной 50px. Теперь:
+
+1. метаданные исходных файлов (размер, mtime и хэш содержимого) кэшируются в памяти процесса
+   на `ADMIN_THUMBNAIL_TTL` секунд, так что страница списка обычно не обращается к диску;
+2. URL превью содержит хэш содержимого исходника, поэтому ответ кэшируется браузером «навсегда»
+   (`immutable`), а замена изображения дает новый URL;
+3. превью создается при первом запросе и сохраняется в `MEDIA_ROOT/thumbs/`.
+
+Изменения карт из этого процесса (сохранение в админке, удаление) приходят через шину
+инвалидации и сразу сбрасывают метаданные и файлы превью; изменения из других процессов
+(например, скачивание изображений воркером) становятся видны по истечении TTL.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.urls import reverse
+
+from apps.cards.models import Card
+from apps.cards.services.invalidation import CardChangeEvent
+
+logger = logging.getLogger(__name__)
+
+# Ширина превью: в списке карт (50px на экранах с двойной плотностью) и на странице карты (200px).
+LIST_THUMBNAIL_WIDTH = 100
+DETAIL_THUMBNAIL_WIDTH = 400
+THUMBNAIL_WIDTHS = (LIST_THUMBNAIL_WIDTH, DETAIL_THUMBNAIL_WIDTH)
+THUMBNAIL_QUALITY = 80
+# URL превью меняется вместе с содержимым исходника, поэтому ответ можно не перепроверять.
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+class _SourceMeta(NamedTuple):
+    stat_key: Optional[Tuple[int, int]]  # (mtime_ns, size) исходника; None — файла нет.
+    digest: Optional[str]
+    checked_at: float
+
+
+_sources: Dict[int, _SourceMeta] = {}
+_sources_lock = threading.Lock()
+
+
+def thumbnails_dir() -> Path:
+    return settings.MEDIA_ROOT / 'thumbs'
+
+
+def _thumbnail_path(card_id: int, width: int, digest: str) -> Path:
+    return thumbnails_dir() / f"{card_id}-{width}-{digest}.webp"
+
+
+def source_digest(card_id: int) -> Optional[str]:
+    """
+    Хэш содержимого изображения карты или None, если файла нет. В течение TTL берется из памяти;
+    после него файл проверяется через `stat()` и перечитывается, только если изменились размер или mtime.
+    """
+    now = time.monotonic()
+    with _sources_lock:
+        meta = _sources.get(card_id)
+    if meta is not None and now - meta.checked_at < settings.ADMIN_THUMBNAIL_TTL:
+        return meta.digest
+
+    path = Card(card_id=card_id).local_image_path
+    try:
+        stat = path.stat()
+        stat_key: Optional[Tuple[int, int]] = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        stat_key = None
+
+    if meta is not None and meta.stat_key == stat_key:
+        digest = meta.digest
+    elif stat_key is None:
+        digest = None
+    else:
+        digest = hashlib.blake2b(path.read_bytes(), digest_size=8).hexdigest()
+
+    with _sources_lock:
+        _sources[card_id] = _SourceMeta(stat_key, digest, now)
+    return digest
+
+
+def thumbnail_url(card_id: int, width: int) -> Optional[str]:
+    """URL превью карты с хэшем содержимого или None, если изображения нет."""
+    digest = source_digest(card_id)
+    if digest is None:
+        return None
+    return reverse('admin:cards_card_thumbnail', args=[card_id, width, digest])
+
+
+def get_thumbnail(card_id: int, width: int, digest: str) -> Optional[Path]:
+    """
+    Путь к файлу превью; при первом запросе превью создается. None — если ширина не поддерживается
+    или `digest` не соответствует текущему изображению карты (устаревший URL).
+    """
+    if width not in THUMBNAIL_WIDTHS:
+        return None
+    path = _thumbnail_path(card_id, width, digest)
+    if path.is_file():
+        return path
+    if source_digest(card_id) != digest:
+        return None
+
+    # Pillow импортируется только здесь: модуль подключается при старте Django ради обработчика инвалидации.
+    from PIL import Image
+
+    with Image.open(Card(card_id=card_id).local_image_path) as image:
+        image.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Запись через временный файл: параллельный запрос не отдаст недописанное превью.
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        image.save(tmp_path, format='WEBP', quality=THUMBNAIL_QUALITY)
+    os.replace(tmp_path, path)
+    return path
+
+
+def invalidate_thumbnails(event: CardChangeEvent) -> None:
+    """Обработчик шины инвалидации: сбрасывает метаданные изменившихся карт и удаляет их превью."""
+    with _sources_lock:
+        for card_id in event.card_ids:
+            _sources.pop(card_id, None)
+    directory = thumbnails_dir()
+    if not directory.is_dir():
+        return
+    for card_id in event.card_ids:
+        for path in directory.glob(f"{card_id}-*.webp"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Не удалось удалить превью {path}: {e}")
+
+
+def clear_cache() -> None:
+    """Сбрасывает кэш метаданных изображений (для тестов)."""
+    with _sources_lock:
+        _sources.clear()
@@ -1,3 +1,105 @@
-from django.test import TestCase
+import io
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
 
-# Create your tests here.
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.test import TestCase, override_settings
+from psycopg.conninfo import conninfo_to_dict
+
+from apps.cards.models import Card
+from apps.cards.services import thumbnails
+from apps.cards.services.invalidation import (
+    CardChangeEvent, _handlers, build_conninfo, publish_card_change, register_card_change_handler,
+)
+
+
+class CardInvalidationTest(TestCase):
+    """Тестирует локальную доставку событий шины инвалидации."""
+
+    def setUp(self):
+        self.received = []
+        self.handler = self.received.append
+        register_card_change_handler(self.handler)
+
+    def tearDown(self):
+        _handlers.remove(self.handler)
+
+    def test_event_is_dispatched_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            publish_card_change([1205, 1205, 1408], reason='test')
+            self.assertEqual(self.received, [], "До фиксации транзакции событие не должно доставляться")
+
+        self.assertEqual(self.received, [CardChangeEvent(frozenset({1205, 1408}), 'test')])
+
+    def test_empty_change_is_not_published(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            publish_card_change([], reason='test')
+        self.assertEqual(callbacks, [])
+
+    def test_conninfo_escapes_values(self):
+        database = {
+            **settings.DATABASES['default'],
+            'NAME': 'kk bot', 'USER': 'kk', 'PASSWORD': "p'a ss\\", 'HOST': 'db', 'PORT': 5432,
+        }
+        with patch.dict(settings.DATABASES, {'listen': database}):
+            conninfo = build_conninfo('listen')
+        self.assertEqual(
+            conninfo_to_dict(conninfo),
+            {'dbname': 'kk bot', 'user': 'kk', 'password': "p'a ss\\", 'host': 'db', 'port': '5432'},
+        )
+
+
+class CardThumbnailTest(TestCase):
+    """Тестирует превью изображений карт в админке: URL с хэшем содержимого, кэш метаданных и инвалидацию."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=Path(media_root.name), ADMIN_THUMBNAIL_TTL=300)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        thumbnails.clear_cache()
+        self.addCleanup(thumbnails.clear_cache)
+
+        self.card = Card.objects.create(card_id=1205, name="Test", card_type=Card.CardType.CHARACTER)
+        self._write_image((200, 0, 0))
+
+    def _write_image(self, color) -> None:
+        self.card.local_image_path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (420, 720), color).save(self.card.local_image_path, format='WEBP')
+
+    def test_url_follows_content_and_invalidation(self):
+        url = thumbnails.thumbnail_url(1205, thumbnails.LIST_THUMBNAIL_WIDTH)
+        self.assertIsNone(thumbnails.thumbnail_url(1408, thumbnails.LIST_THUMBNAIL_WIDTH))
+
+        # В пределах TTL метаданные берутся из памяти, даже если файл заменили в обход админки.
+        self._write_image((0, 0, 200))
+        self.assertEqual(thumbnails.thumbnail_url(1205, thumbnails.LIST_THUMBNAIL_WIDTH), url)
+
+        digest = thumbnails.source_digest(1205)
+        path = thumbnails.get_thumbnail(1205, thumbnails.LIST_THUMBNAIL_WIDTH, digest)
+        thumbnails.invalidate_thumbnails(CardChangeEvent(frozenset({1205}), 'test'))
+        self.assertFalse(path.exists())
+        self.assertNotEqual(thumbnails.thumbnail_url(1205, thumbnails.LIST_THUMBNAIL_WIDTH), url)
+
+    def test_thumbnail_view(self):
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        url = thumbnails.thumbnail_url(1205, thumbnails.LIST_THUMBNAIL_WIDTH)
+        self.assertContains(self.client.get('/admin/cards/card/'), url)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], thumbnails.CACHE_CONTROL)
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as image:
+            self.assertEqual(image.width, thumbnails.LIST_THUMBNAIL_WIDTH)
+
+        # Устаревший хэш перенаправляет на актуальный URL, неподдерживаемая ширина — 404.
+        self.assertRedirects(
+            self.client.get(url.replace(thumbnails.source_digest(1205), '0' * 16)), url, fetch_redirect_response=False,
+        )
+        self.assertEqual(self.client.get(url.replace('/100/', '/64/')).status_code, 404)
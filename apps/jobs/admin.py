@@ -0,0 +1,33 @@
+from django.contrib import admin, messages
+from django.db.models import QuerySet
+from django.http import HttpRequest
+
+from .models import Job
+from .services import request_cancel
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Админ-панель для просмотра истории и статуса фоновых задач."""
+    list_display = ('id', 'kind', 'status', 'progress', 'current_stage', 'created_at', 'display_duration', 'requested_by')
+    list_filter = ('kind', 'status')
+    readonly_fields = (
+        'kind', 'status', 'stages', 'current_stage', 'progress', 'logs', 'cancel_requested',
+        'requested_by', 'worker', 'created_at', 'started_at', 'finished_at',
+    )
+    actions = ('cancel_jobs',)
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    @admin.display(description="Длительность")
+    def display_duration(self, obj: Job) -> str:
+        duration = obj.duration_seconds
+        return f"{duration:.1f} с" if duration is not None else "—"
+
+    @admin.action(description="Отменить выбранные задачи")
+    def cancel_jobs(self, request: HttpRequest, queryset: QuerySet) -> None:
+        active_jobs = [job for job in queryset if job.is_active]
+        for job in active_jobs:
+            request_cancel(job)
+        self.message_user(request, f"Запрошена отмена задач: {len(active_jobs)}.", messages.SUCCESS)
@@ -0,0 +1,59 @@
+import logging
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import close_old_connections
+
+from apps.jobs.services import claim_next_job, recover_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    """
+    Воркер фоновых задач. Забирает задачи из таблицы `Job` и выполняет их
+    в отдельном процессе, чтобы тяжелые операции не нагружали веб-сервер Django.
+
+    Пример использования:
+        docker compose up -d worker
+        docker compose run --rm web python manage.py runjobs --once
+    """
+    help = "Запускает воркер фоновых задач (обновление карт и т.д.)."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить все задачи из очереди и завершиться.'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Интервал опроса очереди в секундах.'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        )
+        poll_interval: float = options['poll_interval']
+
+        recovered = recover_stale_jobs()
+        if recovered:
+            self.stdout.write(self.style.WARNING(f"Помечено как упавшие зависших задач: {recovered}"))
+
+        self.stdout.write(self.style.SUCCESS("Воркер фоновых задач запущен."))
+        try:
+            while True:
+                # Воркер живет долго, поэтому закрываем устаревшие соединения перед каждой итерацией.
+                close_old_connections()
+                job = claim_next_job()
+                if job is not None:
+                    run_job(job)
+                    continue
+                if options['once']:
+                    break
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Воркер остановлен вручную."))
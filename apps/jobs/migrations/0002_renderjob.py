@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('deck_code', models.CharField(max_length=68, verbose_name='Код колоды')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('image', models.BinaryField(blank=True, null=True, verbose_name='Изображение (JPEG)')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('worker', models.CharField(blank=True, max_length=255, verbose_name='Воркер')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание выполнения')),
+            ],
+            options={
+                'verbose_name': 'Задача рендера',
+                'verbose_name_plural': 'Задачи рендера',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='renderjob_queue_idx')],
+            },
+        ),
+    ]
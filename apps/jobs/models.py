@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    Фоновая задача, выполняемая отдельным процессом-воркером (`runjobs`).
+    Хранит статус, прогресс по этапам, тайминги и лог выполнения.
+    """
+
+    class Kind(models.TextChoices):
+        CARD_UPDATE = 'card_update', 'Обновление карт из API'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        SUCCEEDED = 'succeeded', 'Завершено'
+        FAILED = 'failed', 'Ошибка'
+        CANCELLED = 'cancelled', 'Отменено'
+
+    ACTIVE_STATUSES = (Status.PENDING, Status.RUNNING)
+
+    kind = models.CharField(
+        max_length=32,
+        choices=Kind.choices,
+        db_index=True,
+        verbose_name="Тип задачи"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        db_index=True,
+        verbose_name="Статус"
+    )
+    stages = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Этапы",
+        help_text="Список этапов с их статусом и длительностью."
+    )
+    current_stage = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name="Текущий этап"
+    )
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Прогресс, %"
+    )
+    logs = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Лог выполнения"
+    )
+    cancel_requested = models.BooleanField(
+        default=False,
+        verbose_name="Запрошена отмена"
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Кто запустил"
+    )
+    worker = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Воркер"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Создана"
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Начало выполнения"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Окончание выполнения"
+    )
+
+    class Meta:
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        ordering = ['-created_at']
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in self.ACTIVE_STATUSES
+
+    @property
+    def duration_seconds(self) -> float | None:
+        """Длительность выполнения задачи в секундах (для завершенных и выполняющихся задач)."""
+        if not self.started_at:
+            return None
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
+
+
+class RenderJob(models.Model):
+    """
+    Задача рендера изображения колоды для отдельных процессов-рендереров (`renderworker`).
+    Бот создает задачу и ждет результат; воркер забирает ее через `SKIP LOCKED`,
+    записывает JPEG в `image` и уведомляет бота через NOTIFY. Прочитанные ботом задачи удаляются.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
+    deck_code = models.CharField(
+        max_length=68,
+        verbose_name="Код колоды"
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name="Статус"
+    )
+    image = models.BinaryField(
+        null=True,
+        blank=True,
+        verbose_name="Изображение (JPEG)"
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Ошибка"
+    )
+    worker = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Воркер"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Создана"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Окончание выполнения"
+    )
+
+    class Meta:
+        verbose_name = "Задача рендера"
+        verbose_name_plural = "Задачи рендера"
+        indexes = [
+            # Очередь выбирается по статусу в порядке создания.
+            models.Index(fields=['status', 'created_at'], name='renderjob_queue_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Рендер {self.deck_code} #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,321 @@
+import logging
+import os
+import socket
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Обработчики задач указываются строками и импортируются лениво, чтобы приложение `jobs`
+# не тянуло за собой тяжелые зависимости (httpx, asyncio-клиенты) при загрузке Django.
+JOB_HANDLERS: Dict[str, str] = {
+    Job.Kind.CARD_UPDATE: 'apps.cards.services.db_updater.run_card_update',
+}
+
+# Максимальное количество строк лога, отдаваемых в JSON-статусе для админки.
+STATUS_LOG_TAIL = 20
+
+
+class JobCancelled(Exception):
+    """Выбрасывается обработчиком задачи, когда администратор запросил отмену."""
+
+
+class JobAlreadyRunning(Exception):
+    """Выбрасывается при попытке поставить задачу, если задача того же типа уже активна."""
+
+    def __init__(self, job: Job):
+        super().__init__(f"Задача '{job.get_kind_display()}' уже {job.get_status_display().lower()} (#{job.pk}).")
+        self.job = job
+
+
+class NullReporter:
+    """
+    Репортер-заглушка с тем же интерфейсом, что и `JobReporter`.
+    Позволяет вызывать обработчики задач напрямую, без записи прогресса в БД.
+    """
+    failed: bool = False
+
+    def plan(self, stages: List[Tuple[str, str]]) -> None:
+        pass
+
+    @contextmanager
+    def stage(self, name: str, optional: bool = False) -> Iterator[None]:
+        yield
+
+    def log(self, line: str) -> None:
+        pass
+
+    def check_cancelled(self) -> None:
+        pass
+
+
+class JobReporter(NullReporter):
+    """
+    Записывает прогресс выполнения задачи в БД: этапы, их длительность,
+    процент выполнения и лог. Админка читает эти данные для отображения живого статуса.
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+        self.failed = False
+
+    def _save(self, *fields: str) -> None:
+        self.job.save(update_fields=list(fields))
+
+    def _get_stage(self, name: str) -> Dict[str, Any]:
+        for entry in self.job.stages:
+            if entry['name'] == name:
+                return entry
+        # Этап не был объявлен через `plan()` — добавляем его на лету.
+        entry = {'name': name, 'title': name, 'status': 'pending', 'started_at': None, 'duration': None}
+        self.job.stages.append(entry)
+        return entry
+
+    def plan(self, stages: List[Tuple[str, str]]) -> None:
+        """Объявляет список этапов задачи заранее, чтобы админка могла показать полный план."""
+        self.job.stages = [
+            {'name': name, 'title': title, 'status': 'pending', 'started_at': None, 'duration': None}
+            for name, title in stages
+        ]
+        self._save('stages')
+
+    @contextmanager
+    def stage(self, name: str, optional: bool = False) -> Iterator[None]:
+        """
+        Контекстный менеджер этапа: фиксирует статус, время начала и длительность.
+        Ошибка необязательного этапа (`optional=True`) отмечает его статусом 'warning',
+        но не делает всю задачу неуспешной.
+        """
+        entry = self._get_stage(name)
+        entry['status'] = 'running'
+        entry['started_at'] = timezone.now().isoformat()
+        self.job.current_stage = name
+        self._save('stages', 'current_stage')
+
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            if optional:
+                entry['status'] = 'warning'
+            else:
+                entry['status'] = 'failed'
+                self.failed = True
+            raise
+        except BaseException:
+            entry['status'] = 'failed'
+            self.failed = True
+            raise
+        else:
+            entry['status'] = 'done'
+        finally:
+            entry['duration'] = round(time.perf_counter() - start, 3)
+            done = sum(1 for e in self.job.stages if e['status'] in ('done', 'warning', 'failed'))
+            self.job.progress = int(done * 100 / len(self.job.stages))
+            self._save('stages', 'progress')
+
+    def log(self, line: str) -> None:
+        self.job.logs.append(line)
+        self._save('logs')
+
+    def check_cancelled(self) -> None:
+        """Проверяет флаг отмены в БД (его выставляет админка из другого процесса)."""
+        if Job.objects.filter(pk=self.job.pk, cancel_requested=True).exists():
+            raise JobCancelled()
+
+
+def _advisory_lock_key(name: str) -> int:
+    # `pg_try_advisory_lock` принимает bigint; crc32 дает стабильный ключ для имени блокировки.
+    return zlib.crc32(name.encode('utf-8'))
+
+
+def _try_advisory_lock(name: str) -> bool:
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [_advisory_lock_key(name)])
+        return cursor.fetchone()[0]
+
+
+def _advisory_unlock(name: str) -> None:
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", [_advisory_lock_key(name)])
+
+
+@contextmanager
+def advisory_lock(name: str) -> Iterator[bool]:
+    """
+    Сессионная advisory-блокировка PostgreSQL. Возвращает True, если блокировка получена.
+    Гарантирует, что две задачи одного типа не выполняются одновременно,
+    даже если их запустили разные процессы (воркер и `populate_db`).
+    На других СУБД блокировка не поддерживается и всегда считается полученной.
+    """
+    acquired = _try_advisory_lock(name)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            _advisory_unlock(name)
+
+
+def _lock_name(kind: str) -> str:
+    return f"kkbot:job:{kind}"
+
+
+def _worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_job(kind: str, requested_by=None) -> Job:
+    """
+    Ставит задачу в очередь для воркера. Если задача того же типа уже
+    ожидает или выполняется, выбрасывает `JobAlreadyRunning`.
+    """
+    with transaction.atomic():
+        active_job = Job.objects.select_for_update().filter(kind=kind, status__in=Job.ACTIVE_STATUSES).first()
+        if active_job:
+            raise JobAlreadyRunning(active_job)
+        return Job.objects.create(kind=kind, requested_by=requested_by)
+
+
+def request_cancel(job: Job) -> None:
+    """
+    Запрашивает отмену задачи. Задача в очереди отменяется сразу,
+    выполняющаяся — остановится перед следующим этапом.
+    """
+    cancelled_now = Job.objects.filter(pk=job.pk, status=Job.Status.PENDING).update(
+        status=Job.Status.CANCELLED, cancel_requested=True, finished_at=timezone.now()
+    )
+    if not cancelled_now:
+        Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING).update(cancel_requested=True)
+
+
+def claim_next_job(worker: Optional[str] = None) -> Optional[Job]:
+    """
+    Атомарно забирает самую старую задачу из очереди.
+    `SKIP LOCKED` позволяет запускать несколько воркеров без конфликтов.
+
+    Advisory-блокировка типа задачи берется до перевода задачи в RUNNING и остается
+    у процесса до конца `run_job`: иначе `recover_stale_jobs` другого воркера мог бы увидеть
+    свободную блокировку у только что захваченной задачи и пометить ее упавшей.
+    Если задача этого типа уже выполняется другим процессом, задача остается в очереди.
+    """
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.PENDING)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None or not _try_advisory_lock(_lock_name(job.kind)):
+            return None
+        try:
+            job.status = Job.Status.RUNNING
+            job.started_at = timezone.now()
+            job.worker = worker or _worker_name()
+            job.save(update_fields=['status', 'started_at', 'worker'])
+        except Exception:
+            _advisory_unlock(_lock_name(job.kind))
+            raise
+        return job
+
+
+def _finish(job: Job, status: str, message: Optional[str] = None) -> None:
+    if message:
+        job.logs.append(message)
+    job.status = status
+    job.finished_at = timezone.now()
+    job.current_stage = ''
+    if status == Job.Status.SUCCEEDED:
+        job.progress = 100
+    job.save(update_fields=['status', 'finished_at', 'current_stage', 'progress', 'logs'])
+
+
+def _execute(job: Job) -> None:
+    handler = import_string(JOB_HANDLERS[job.kind])
+    reporter = JobReporter(job)
+
+    logger.info(f"Запуск задачи {job}")
+    try:
+        handler(reporter=reporter)
+    except JobCancelled:
+        _finish(job, Job.Status.CANCELLED, "[WARNING] Задача отменена администратором.")
+    except Exception as e:
+        logger.exception(f"Ошибка при выполнении задачи {job.pk}")
+        _finish(job, Job.Status.FAILED, f"[CRITICAL] Необработанная ошибка: {e}")
+    else:
+        _finish(job, Job.Status.FAILED if reporter.failed else Job.Status.SUCCEEDED)
+    logger.info(f"Задача {job.pk} завершена со статусом {job.status}")
+
+
+def run_job(job: Job) -> Job:
+    """
+    Выполняет задачу, захваченную `claim_next_job` (advisory-блокировка ее типа уже взята),
+    записывает итоговый статус и освобождает блокировку.
+    """
+    try:
+        _execute(job)
+    finally:
+        _advisory_unlock(_lock_name(job.kind))
+    return job
+
+
+def run_job_inline(kind: str) -> Job:
+    """
+    Создает и сразу выполняет задачу в текущем процессе (для management-команд).
+    Задача создается в статусе RUNNING только после получения блокировки ее типа.
+    """
+    worker = f"{_worker_name()} (inline)"
+    with advisory_lock(_lock_name(kind)) as acquired:
+        if not acquired:
+            job = Job.objects.create(kind=kind, status=Job.Status.RUNNING, started_at=timezone.now(), worker=worker)
+            _finish(job, Job.Status.FAILED, "[CRITICAL] Задача этого типа уже выполняется другим процессом.")
+            return job
+        job = Job.objects.create(kind=kind, status=Job.Status.RUNNING, started_at=timezone.now(), worker=worker)
+        _execute(job)
+    return job
+
+
+def recover_stale_jobs() -> int:
+    """
+    Помечает как упавшие задачи в статусе RUNNING, чья advisory-блокировка свободна:
+    это значит, что выполнявший их процесс завершился аварийно.
+    """
+    recovered = 0
+    for job in Job.objects.filter(status=Job.Status.RUNNING):
+        with advisory_lock(_lock_name(job.kind)) as acquired:
+            if acquired and connection.vendor == 'postgresql':
+                _finish(job, Job.Status.FAILED, "[CRITICAL] Процесс воркера завершился во время выполнения задачи.")
+                recovered += 1
+    return recovered
+
+
+def job_status_payload(job: Optional[Job]) -> Dict[str, Any]:
+    """Сериализует состояние задачи для JSON-эндпоинта живого статуса в админке."""
+    if job is None:
+        return {'job': None}
+    return {
+        'job': {
+            'id': job.pk,
+            'kind': job.kind,
+            'status': job.status,
+            'status_display': job.get_status_display(),
+            'is_active': job.is_active,
+            'progress': job.progress,
+            'current_stage': job.current_stage,
+            'stages': job.stages,
+            'cancel_requested': job.cancel_requested,
+            'duration': job.duration_seconds,
+            'logs': job.logs[-STATUS_LOG_TAIL:],
+        }
+    }
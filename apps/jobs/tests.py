@@ -0,0 +1,104 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from apps.jobs.models import Job
+from apps.jobs.services import (
+    JobAlreadyRunning, JobCancelled, claim_next_job, enqueue_job, request_cancel, run_job,
+)
+
+
+def _successful_handler(reporter):
+    reporter.plan([('first', "Первый этап"), ('second', "Второй этап")])
+    with reporter.stage('first'):
+        reporter.log("[INFO] первый этап")
+    with reporter.stage('second'):
+        reporter.log("[INFO] второй этап")
+
+
+def _cancelled_handler(reporter):
+    raise JobCancelled()
+
+
+class JobServicesTest(TestCase):
+    """Тестирует очередь фоновых задач: постановку, захват, выполнение и отмену."""
+
+    def test_enqueue_rejects_concurrent_job_of_same_kind(self):
+        enqueue_job(Job.Kind.CARD_UPDATE)
+        with self.assertRaises(JobAlreadyRunning):
+            enqueue_job(Job.Kind.CARD_UPDATE)
+
+    def test_run_job_records_stages_and_progress(self):
+        enqueue_job(Job.Kind.CARD_UPDATE)
+        job = claim_next_job(worker="test")
+        self.assertEqual(job.status, Job.Status.RUNNING)
+        self.assertIsNone(claim_next_job(worker="test"), "Задача не должна захватываться дважды")
+
+        with patch('apps.jobs.services.import_string', return_value=_successful_handler):
+            run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual([stage['status'] for stage in job.stages], ['done', 'done'])
+        self.assertTrue(all(stage['duration'] is not None for stage in job.stages))
+        self.assertIn("[INFO] второй этап", job.logs)
+
+    def test_optional_stage_failure_keeps_job_succeeded(self):
+        enqueue_job(Job.Kind.CARD_UPDATE)
+        job = claim_next_job(worker="test")
+        updater = 'apps.cards.services.db_updater'
+
+        async def fetch():
+            return {'1101': {}}, {}
+
+        async def db_operations(all_cards_data, new_ids):
+            return [1101], []
+
+        async def images_to_download(card_ids, all_cards_data):
+            raise OSError("диск недоступен")
+
+        with patch(f'{updater}._fetch_all_data_async', fetch), \
+                patch(f'{updater}._db_operations_async', db_operations), \
+                patch(f'{updater}._get_images_to_download_async', images_to_download), \
+                patch('apps.bot.services.snapshot.write_snapshot'):
+            run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(
+            {stage['name']: stage['status'] for stage in job.stages},
+            {'fetch': 'done', 'database': 'done', 'images': 'warning', 'snapshot': 'done'},
+        )
+        self.assertTrue(any("диск недоступен" in line for line in job.logs))
+
+    def test_claim_takes_kind_lock_before_running(self):
+        job = enqueue_job(Job.Kind.CARD_UPDATE)
+        # Блокировку типа держит другой процесс — задача остается в очереди, а не уходит в RUNNING.
+        with patch('apps.jobs.services._try_advisory_lock', return_value=False):
+            self.assertIsNone(claim_next_job(worker="test"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.PENDING)
+
+        claimed = claim_next_job(worker="test")
+        with patch('apps.jobs.services.import_string', return_value=_successful_handler), \
+                patch('apps.jobs.services._advisory_unlock') as unlock:
+            run_job(claimed)
+        unlock.assert_called_once_with(f"kkbot:job:{Job.Kind.CARD_UPDATE}")
+
+    def test_cancel_pending_and_running_jobs(self):
+        pending_job = enqueue_job(Job.Kind.CARD_UPDATE)
+        request_cancel(pending_job)
+        pending_job.refresh_from_db()
+        self.assertEqual(pending_job.status, Job.Status.CANCELLED)
+
+        enqueue_job(Job.Kind.CARD_UPDATE)
+        running_job = claim_next_job(worker="test")
+        request_cancel(running_job)
+        running_job.refresh_from_db()
+        self.assertTrue(running_job.cancel_requested)
+
+        with patch('apps.jobs.services.import_string', return_value=_cancelled_handler):
+            run_job(running_job)
+        running_job.refresh_from_db()
+        self.assertEqual(running_job.status, Job.Status.CANCELLED)
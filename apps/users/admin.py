@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.db.models import QuerySet
 from django.http import HttpRequest
-from .models import TelegramUser, Deck, UserActivity
+
+from core.admin_mixins import ReplicaReadAdminMixin
+from .models import TelegramUser, Deck, UserActivity, ChatSettings
 
 
 class DeckInline(admin.TabularInline):
@@ -34,7 +36,7 @@ class UserActivityInline(admin.TabularInline):
 
 
 @admin.register(TelegramUser)
-class TelegramUserAdmin(admin.ModelAdmin):
+class TelegramUserAdmin(ReplicaReadAdminMixin, admin.ModelAdmin):
     """Админ-панель для модели TelegramUser."""
     list_display = ('user_id', 'username', 'first_name', 'deck_count', 'created_at')
     search_fields = ('user_id', 'username', 'first_name')
@@ -49,19 +51,28 @@ class TelegramUserAdmin(admin.ModelAdmin):
 
 
 @admin.register(Deck)
-class DeckAdmin(admin.ModelAdmin):
+class DeckAdmin(ReplicaReadAdminMixin, admin.ModelAdmin):
     """Админ-панель для модели Deck."""
-    list_display = ('deck_code', 'owner_link', 'created_at')
+    list_display = ('deck_code', 'owner_link', 'usage_count', 'created_at')
     search_fields = ('deck_code', 'owner__username', 'owner__user_id')
     list_filter = ('created_at', 'owner')
-    readonly_fields = ('deck_code', 'owner', 'created_at', 'character_card_ids', 'action_card_ids')
+    readonly_fields = (
+        'deck_code', 'owner', 'created_at', 'character_card_ids', 'action_card_ids',
+        'resonances', 'usage_count', 'is_anonymous',
+    )
 
     def has_add_permission(self, request: HttpRequest) -> bool:
         return False
 
+    def lookup_allowed(self, lookup: str, value: str, request: HttpRequest = None) -> bool:
+        # Разрешаем фильтр по обратному индексу, на который ссылается страница карты.
+        if lookup == 'card_index__card_id':
+            return True
+        return super().lookup_allowed(lookup, value, request)
+
 
 @admin.register(UserActivity)
-class UserActivityAdmin(admin.ModelAdmin):
+class UserActivityAdmin(ReplicaReadAdminMixin, admin.ModelAdmin):
     """Админ-панель для модели UserActivity."""
     list_display = ('user', 'activity_type', 'created_at')
     search_fields = ('user__username', 'user__user_id', 'details')
@@ -72,4 +83,12 @@ class UserActivityAdmin(admin.ModelAdmin):
         return False
 
     def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(ChatSettings)
+class ChatSettingsAdmin(admin.ModelAdmin):
+    """Админ-панель для настроек чатов. Бот применяет изменения в течение нескольких минут (кэш)."""
+    list_display = ('chat_id', 'deck_output', 'updated_at')
+    list_filter = ('deck_output',)
+    search_fields = ('chat_id',)
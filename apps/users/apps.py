@@ -0,0 +1,24 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_save
+
+
+class UsersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.users'
+
+    def ready(self):
+        """
+        Подключает сигналы приложения.
+        """
+        from .models import Deck  # Импортируем модель здесь, чтобы избежать циклических импортов
+        from .services import index_deck_cards
+
+        def index_new_deck(sender, instance: Deck, created: bool, **kwargs):
+            """
+            Добавляет новую колоду в обратный индекс «карта → колоды».
+            `bulk_create` сигналы не отправляет, поэтому массовый импорт индексирует колоды сам.
+            """
+            if created:
+                index_deck_cards([instance])
+
+        post_save.connect(index_new_deck, sender=Deck, weak=False, dispatch_uid='users_index_new_deck')
@@ -0,0 +1,136 @@
+import csv
+import json
+import time
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils.dateparse import parse_date, parse_datetime
+
+from apps.users.models import Deck
+from core.db_routers import read_alias
+from apps.users.services import DECK_CSV_FIELDS, deck_file_format, deck_to_row, open_deck_file
+
+# Поля, выбираемые из БД: `values()` вместо моделей, чтобы не создавать объекты на каждую строку.
+EXPORT_VALUES = (
+    'id', 'deck_code', 'character_card_ids', 'action_card_ids', 'resonances',
+    'usage_count', 'created_at', 'is_anonymous',
+)
+
+
+def _parse_bound(value: Optional[str], end_of_day: bool = False) -> Optional[datetime]:
+    """Разбирает границу периода: дату (YYYY-MM-DD) или дату со временем (в UTC, если без зоны)."""
+    if not value:
+        return None
+    # Сначала дата без времени: `parse_datetime` принимает и ее, но как полночь, без учета `end_of_day`.
+    date_value = parse_date(value)
+    if date_value is not None:
+        parsed = datetime.combine(date_value, dt_time.max if end_of_day else dt_time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f"Некорректная дата: {value!r}. Ожидается YYYY-MM-DD или YYYY-MM-DD HH:MM:SS.")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+class Command(BaseCommand):
+    """
+    Потоково выгружает колоды из базы данных в CSV (формат `data/decks.csv`) или NDJSON.
+
+    Строки читаются через серверный курсор (`iterator(chunk_size=...)`), поэтому
+    потребление памяти не зависит от количества колод. Полученный файл можно
+    загрузить обратно командой `import_decks`.
+
+    Примеры использования:
+        docker compose run --rm web python manage.py export_decks --output data/export.csv.gz
+        docker compose run --rm web python manage.py export_decks --output decks.ndjson --since 2025-03-01
+    """
+    help = "Выгружает колоды из базы данных в CSV или NDJSON (опционально в gzip)."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='data/decks_export.csv',
+            help="Путь к файлу относительно корня проекта. Расширение .gz включает сжатие."
+        )
+        parser.add_argument(
+            '--format',
+            choices=['auto', 'csv', 'ndjson'],
+            default='auto',
+            help="Формат файла. 'auto' определяет его по расширению (.ndjson/.jsonl или .csv)."
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help="Сжать файл gzip (к имени добавляется .gz, если его нет)."
+        )
+        parser.add_argument(
+            '--since',
+            type=str,
+            default=None,
+            help="Выгрузить колоды, добавленные начиная с даты (YYYY-MM-DD или YYYY-MM-DD HH:MM:SS)."
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            default=None,
+            help="Выгрузить колоды, добавленные не позднее даты (включительно)."
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help="Размер порции, читаемой из серверного курсора."
+        )
+        parser.add_argument(
+            '--database',
+            type=str,
+            default=None,
+            help="Алиас базы для чтения. По умолчанию реплика, если она настроена (POSTGRES_REPLICA_HOST)."
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        output_path: Path = settings.BASE_DIR / options['output']
+        if options['gzip'] and output_path.suffix.lower() != '.gz':
+            output_path = output_path.with_name(output_path.name + '.gz')
+        file_format = deck_file_format(output_path) if options['format'] == 'auto' else options['format']
+
+        database = options['database'] or read_alias()
+        queryset = Deck.objects.using(database).order_by('id')
+        since = _parse_bound(options['since'])
+        until = _parse_bound(options['until'], end_of_day=True)
+        if since:
+            queryset = queryset.filter(created_at__gte=since)
+        if until:
+            queryset = queryset.filter(created_at__lte=until)
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Выгрузка колод в {output_path} (формат: {file_format}, база: {database})"
+        ))
+
+        started = time.perf_counter()
+        exported = 0
+        rows = queryset.values(*EXPORT_VALUES).iterator(chunk_size=options['chunk_size'])
+
+        with open_deck_file(output_path, 'w') as f:
+            if file_format == 'ndjson':
+                for values in rows:
+                    f.write(json.dumps(deck_to_row(values, as_json=True), ensure_ascii=False))
+                    f.write("\n")
+                    exported += 1
+            else:
+                writer = csv.DictWriter(f, fieldnames=DECK_CSV_FIELDS, quoting=csv.QUOTE_ALL)
+                writer.writeheader()
+                for values in rows:
+                    writer.writerow(deck_to_row(values))
+                    exported += 1
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Выгружено колод: {exported} за {elapsed:.1f} с ({exported / max(elapsed, 1e-9):,.0f} строк/с)")
+        self.stdout.write(self.style.SUCCESS("Выгрузка завершена."))
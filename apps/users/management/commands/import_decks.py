@@ -1,36 +1,156 @@
-import asyncio
 import csv
-import logging
+import json
+import os
+import time
+from itertools import islice
 from pathlib import Path
-from typing import Any, List, Set
-from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, Iterator, List
 
-from asgiref.sync import sync_to_async
-from django.core.management.base import BaseCommand, CommandParser
 from django.conf import settings
-from django.db import transaction
-from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection, transaction
 
-from apps.users.models import Deck
+from apps.users.models import Deck, DeckCard
+from apps.users.services import (
+    DECK_CSV_REQUIRED_FIELDS, DeckRow, deck_file_format, index_deck_cards, open_deck_file, parse_deck_row,
+)
 
-logger = logging.getLogger(__name__)
+# Колонки временной таблицы для загрузки через COPY (в порядке передачи значений).
+_COPY_COLUMNS = (
+    'deck_code', 'character_card_ids', 'action_card_ids', 'resonances', 'usage_count', 'is_anonymous', 'created_at',
+)
 
 
-@sync_to_async
-@transaction.atomic
-def _save_decks_in_transaction(decks_to_save: List[Deck]) -> None:
+def _copy_chunk(rows: List[DeckRow]) -> int:
     """
-    Синхронная обертка для атомарного массового создания объектов Deck.
-    Декоратор @sync_to_async позволяет вызывать эту функцию из асинхронного кода.
-    Декоратор @transaction.atomic обеспечивает, что все операции внутри
-    будут выполнены в одной транзакции.
+    Загружает пачку колод через PostgreSQL `COPY` во временную таблицу и переносит их
+    в `Deck` одним `INSERT ... ON CONFLICT DO NOTHING`, сразу заполняя обратный индекс.
+    Возвращает количество добавленных колод. Вызывается внутри транзакции.
     """
-    Deck.objects.bulk_create(decks_to_save, batch_size=500)
+    deck_table = connection.ops.quote_name(Deck._meta.db_table)
+    index_table = connection.ops.quote_name(DeckCard._meta.db_table)
+    columns = ", ".join(_COPY_COLUMNS)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS deck_import_chunk ("
+            " deck_code varchar(100), character_card_ids jsonb, action_card_ids jsonb, resonances jsonb,"
+            " usage_count integer, is_anonymous boolean, created_at timestamptz"
+            ") ON COMMIT DELETE ROWS"
+        )
+        with cursor.cursor.copy(f"COPY deck_import_chunk ({columns}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row((
+                    row.deck_code,
+                    json.dumps(row.character_card_ids),
+                    json.dumps(row.action_card_ids),
+                    json.dumps(row.resonances),
+                    row.usage_count,
+                    row.is_anonymous,
+                    row.created_at,
+                ))
+        cursor.execute(f"""
+            WITH inserted AS (
+                INSERT INTO {deck_table} ({columns}, owner_id)
+                SELECT DISTINCT ON (deck_code) {columns}, NULL FROM deck_import_chunk
+                ON CONFLICT (deck_code) DO NOTHING
+                RETURNING id, character_card_ids, action_card_ids
+            ), indexed AS (
+                INSERT INTO {index_table} (deck_id, card_id)
+                SELECT DISTINCT inserted.id, card.card_id::integer
+                FROM inserted
+                CROSS JOIN LATERAL jsonb_array_elements_text(
+                    inserted.character_card_ids || inserted.action_card_ids
+                ) AS card(card_id)
+                ON CONFLICT DO NOTHING
+            )
+            SELECT count(*) FROM inserted
+        """)
+        return cursor.fetchone()[0]
+
+
+def _upsert_chunk(rows: List[DeckRow]) -> int:
+    """
+    Переносимый вариант загрузки пачки через `bulk_create(ignore_conflicts=True)`
+    для СУБД без `COPY`. Возвращает количество добавленных колод.
+    """
+    codes = [row.deck_code for row in rows]
+    existing_codes = set(Deck.objects.filter(deck_code__in=codes).values_list('deck_code', flat=True))
+    Deck.objects.bulk_create(
+        [Deck(owner=None, **row._asdict()) for row in rows if row.deck_code not in existing_codes],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    # При `ignore_conflicts` первичные ключи не возвращаются, поэтому перечитываем колоды пачки.
+    created_decks = list(
+        Deck.objects.filter(deck_code__in=codes).exclude(deck_code__in=existing_codes)
+        .only('id', 'deck_code', 'character_card_ids', 'action_card_ids')
+    )
+    # `auto_now_add` перезаписывает `created_at` при создании, поэтому восстанавливаем даты из файла.
+    created_at_by_code = {row.deck_code: row.created_at for row in rows}
+    for deck in created_decks:
+        deck.created_at = created_at_by_code[deck.deck_code]
+    Deck.objects.bulk_update(created_decks, ['created_at'], batch_size=1000)
+    index_deck_cards(created_decks)
+    return len(created_decks)
+
+
+class ImportState:
+    """
+    Состояние возобновляемого импорта: сколько строк файла уже зафиксировано в БД.
+    Хранится в JSON-файле и перезаписывается атомарно после каждой пачки.
+    """
+
+    def __init__(self, state_path: Path, source_path: Path):
+        self.state_path = state_path
+        stat = source_path.stat()
+        self.fingerprint = {'source': str(source_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+        self.rows_committed = 0
+        self.inserted = 0
+        self.invalid = 0
+
+    def load(self) -> bool:
+        """Загружает сохраненное состояние, если оно относится к этому же файлу."""
+        try:
+            data = json.loads(self.state_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return False
+        if data.get('fingerprint') != self.fingerprint:
+            return False
+        self.rows_committed = data['rows_committed']
+        self.inserted = data['inserted']
+        self.invalid = data.get('invalid', 0)
+        return True
+
+    def save(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({
+            'fingerprint': self.fingerprint,
+            'rows_committed': self.rows_committed,
+            'inserted': self.inserted,
+            'invalid': self.invalid,
+        }), encoding='utf-8')
+        os.replace(tmp_path, self.state_path)
+
+    def clear(self) -> None:
+        self.state_path.unlink(missing_ok=True)
 
 
 class Command(BaseCommand):
     """
-    Импортирует предустановленные колоды из CSV-файла в базу данных.
+    Потоково импортирует колоды из CSV-файла (или NDJSON, созданного `export_decks`) в базу данных.
+    Файлы с расширением .gz распаковываются на лету.
+
+    Файл читается пачками фиксированного размера, поэтому потребление памяти не зависит
+    от размера файла. В PostgreSQL пачки загружаются через `COPY`, в остальных СУБД —
+    через `bulk_create`. Каждая пачка фиксируется отдельной транзакцией, а прогресс
+    сохраняется в файл состояния, поэтому прерванный импорт можно продолжить с `--resume`.
+    Уже существующие колоды (по `deck_code`) пропускаются.
+
+    Примеры использования:
+        docker compose run --rm web python manage.py import_decks
+        docker compose run --rm web python manage.py import_decks --path dump.csv --chunk-size 20000 --resume
     """
     help = "Импортирует колоды из CSV-файла в базу данных."
 
@@ -42,90 +162,137 @@ class Command(BaseCommand):
             default='data/decks.csv',
             help='Путь к CSV-файлу с колодами относительно корня проекта.'
         )
+        parser.add_argument(
+            '--format',
+            choices=['auto', 'csv', 'ndjson'],
+            default='auto',
+            help="Формат файла. 'auto' определяет его по расширению (.ndjson/.jsonl или .csv, возможно с .gz)."
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Количество строк в одной пачке (одна транзакция).'
+        )
+        parser.add_argument(
+            '--method',
+            choices=['auto', 'copy', 'upsert'],
+            default='auto',
+            help="Способ загрузки: 'copy' (PostgreSQL COPY), 'upsert' (bulk_create) или 'auto'."
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить прерванный импорт с последней зафиксированной пачки.'
+        )
+        parser.add_argument(
+            '--state-file',
+            type=str,
+            default=None,
+            help='Путь к файлу состояния импорта (по умолчанию в MEDIA_ROOT/imports/).'
+        )
 
     def handle(self, *args: Any, **options: Any) -> None:
-        """Синхронная точка входа, которая запускает асинхронную логику."""
-        try:
-            asyncio.run(self.ahandle(*args, **options))
-        except FileNotFoundError:
-            self.stderr.write(self.style.ERROR(
+        file_path: Path = settings.BASE_DIR / options['path']
+        if not file_path.is_file():
+            raise CommandError(
                 f"Файл не найден по пути: {options['path']}. "
                 "Убедитесь, что файл существует и путь указан верно."
+            )
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size должен быть положительным числом.")
+
+        method = options['method']
+        if method == 'auto':
+            method = 'copy' if connection.vendor == 'postgresql' else 'upsert'
+        elif method == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError("Загрузка через COPY поддерживается только в PostgreSQL.")
+        load_chunk = _copy_chunk if method == 'copy' else _upsert_chunk
+
+        state_path = (
+            Path(options['state_file']) if options['state_file']
+            else settings.MEDIA_ROOT / 'imports' / f"{file_path.name}.state.json"
+        )
+        state = ImportState(state_path, file_path)
+        if options['resume'] and state.load():
+            self.stdout.write(self.style.WARNING(
+                f"Продолжение импорта: пропускается {state.rows_committed} уже обработанных строк."
             ))
-        except Exception as e:
-            logger.exception("Критическая ошибка во время импорта колод.")
-            self.stderr.write(self.style.ERROR(f"Произошла непредвиденная ошибка: {e}"))
 
-    async def ahandle(self, *args: Any, **options: Any) -> None:
-        """Основная асинхронная логика команды."""
-        file_path: Path = settings.BASE_DIR / options['path']
-        self.stdout.write(self.style.SUCCESS(f"Начинаю импорт колод из файла: {file_path}"))
+        file_format = deck_file_format(file_path) if options['format'] == 'auto' else options['format']
+        self.stdout.write(self.style.SUCCESS(
+            f"Начинаю импорт колод из файла: {file_path} (формат: {file_format}, метод: {method})"
+        ))
+        started = time.perf_counter()
+        rows_at_start = state.rows_committed
 
-        try:
-            with open(file_path, mode='r', encoding='utf-8') as f:
+        with open_deck_file(file_path, 'r') as f:
+            if file_format == 'ndjson':
+                # Строки разбираются вместе с остальными данными: некорректный JSON и объекты
+                # без обязательных полей пропускаются как ошибки данных.
+                reader = (line for line in f if line.strip())
+            else:
                 reader = csv.DictReader(f)
-                required_fields = ['deck_code', 'character_cards', 'action_cards', 'created_at']
-                if not all(field in reader.fieldnames for field in required_fields):
-                    self.stderr.write(self.style.ERROR(
-                        f"CSV-файл должен содержать обязательные колонки: {', '.join(required_fields)}"))
-                    return
-                csv_data = list(reader)
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f"Ошибка чтения CSV файла: {e}"))
-            return
-
-        if not csv_data:
-            self.stdout.write(self.style.WARNING("CSV-файл пуст."))
-            return
-
-        csv_deck_codes = {row['deck_code'] for row in csv_data}
-        existing_codes_qs = Deck.objects.filter(deck_code__in=csv_deck_codes).values_list('deck_code', flat=True)
-        existing_codes: Set[str] = {code async for code in existing_codes_qs}
-        self.stdout.write(f"Найдено {len(existing_codes)} уже существующих колод в БД. Они будут пропущены.")
-
-        decks_to_create: List[Deck] = []
-        for row in csv_data:
-            deck_code = row['deck_code']
-            if not deck_code or deck_code in existing_codes:
-                continue
-
-            try:
-                character_ids = [int(id_str) for id_str in row['character_cards'].split(',') if id_str.isdigit()]
-                action_ids = [int(id_str) for id_str in row['action_cards'].split(',') if id_str.isdigit()]
-                created_at_naive = datetime.strptime(row['created_at'], '%Y-%m-%d %H:%M:%S')
-                created_at_dt = timezone.make_aware(created_at_naive, dt_timezone.utc)
-                decks_to_create.append(
-                    Deck(
-                        deck_code=deck_code,
-                        character_card_ids=character_ids,
-                        action_card_ids=action_ids,
-                        created_at=created_at_dt,
-                        owner=None
-                    )
-                )
-            except (ValueError, TypeError) as e:
-                self.stderr.write(self.style.WARNING(f"Пропуск строки для кода {deck_code} из-за ошибки данных: {e}"))
+                missing_fields = [
+                    field for field in DECK_CSV_REQUIRED_FIELDS if field not in (reader.fieldnames or [])
+                ]
+                if missing_fields:
+                    raise CommandError(f"CSV-файл должен содержать обязательные колонки: {', '.join(missing_fields)}")
 
-        if not decks_to_create:
-            self.stdout.write(
-                self.style.SUCCESS("\nВсе колоды из файла уже есть в базе данных. Обновление не требуется."))
-            return
+            for raw_rows in self._iter_chunks(reader, options['chunk_size'], skip=state.rows_committed):
+                chunk_started = time.perf_counter()
+                rows: List[DeckRow] = []
+                for raw_row in raw_rows:
+                    record = raw_row
+                    try:
+                        if file_format == 'ndjson':
+                            record = json.loads(raw_row)
+                            if not isinstance(record, dict):
+                                raise TypeError(f"ожидался JSON-объект, получено: {type(record).__name__}")
+                        rows.append(parse_deck_row(record))
+                    except (ValueError, TypeError, KeyError, AttributeError) as e:
+                        state.invalid += 1
+                        deck_code = record.get('deck_code') if isinstance(record, dict) else None
+                        self.stderr.write(self.style.WARNING(
+                            f"Пропуск строки для кода {deck_code!r} из-за ошибки данных: {e}"
+                        ))
 
-        try:
-            await _save_decks_in_transaction(decks_to_create)
-            self.stdout.write(self.style.SUCCESS(f"\nУспешно импортировано {len(decks_to_create)} новых колод."))
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f"\nОшибка при массовом добавлении в БД: {e}"))
-            # В случае ошибки выводим промежуточную статистику для отладки.
-            self.stdout.write("-" * 30)
-            self.stdout.write(f"Всего обработано строк в файле: {len(csv_data)}")
-            self.stdout.write(f"Пропущено (уже в БД): {len(existing_codes)}")
-            self.stdout.write(f"Подготовлено к добавлению: {len(decks_to_create)}")
-            return
-
-        # Выводим итоговую статистику по результатам импорта.
+                with transaction.atomic():
+                    inserted = load_chunk(rows) if rows else 0
+
+                state.rows_committed += len(raw_rows)
+                state.inserted += inserted
+                state.save()
+
+                chunk_rate = len(raw_rows) / max(time.perf_counter() - chunk_started, 1e-9)
+                self.stdout.write(
+                    f"  строк обработано: {state.rows_committed}, добавлено колод: {state.inserted} "
+                    f"({chunk_rate:,.0f} строк/с)"
+                )
+
+        state.clear()
+        elapsed = time.perf_counter() - started
+        processed_now = state.rows_committed - rows_at_start
         self.stdout.write("-" * 30)
-        self.stdout.write(f"Всего обработано строк в файле: {len(csv_data)}")
-        self.stdout.write(f"Пропущено (уже в БД): {len(existing_codes)}")
-        self.stdout.write(f"Добавлено новых колод: {len(decks_to_create)}")
-        self.stdout.write(self.style.SUCCESS("Импорт завершен."))
\ No newline at end of file
+        self.stdout.write(f"Всего обработано строк в файле: {state.rows_committed}")
+        self.stdout.write(f"Добавлено новых колод: {state.inserted}")
+        self.stdout.write(f"Пропущено (уже в БД): {state.rows_committed - state.inserted - state.invalid}")
+        self.stdout.write(f"Пропущено (ошибки данных): {state.invalid}")
+        self.stdout.write(f"Скорость: {processed_now / max(elapsed, 1e-9):,.0f} строк/с за {elapsed:.1f} с")
+        self.stdout.write(self.style.SUCCESS("Импорт завершен."))
+
+    @staticmethod
+    def _iter_chunks(
+            reader: Iterator[Any], chunk_size: int, skip: int = 0
+    ) -> Iterator[List[Any]]:
+        """
+        Пропускает `skip` строк и отдает остальные пачками не больше `chunk_size`.
+        Строки — словари CSV или неразобранные строки NDJSON.
+        """
+        if skip:
+            next(islice(reader, skip, skip), None)
+        while True:
+            chunk = list(islice(reader, chunk_size))
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-19 10:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_deck_card_index(apps, schema_editor):
+    """Заполняет обратный индекс «карта → колоды» для уже существующих колод."""
+    Deck = apps.get_model('users', 'Deck')
+    DeckCard = apps.get_model('users', 'DeckCard')
+    entries = []
+    for deck in Deck.objects.only('id', 'character_card_ids', 'action_card_ids').iterator(chunk_size=2000):
+        card_ids = set(deck.character_card_ids) | set(deck.action_card_ids)
+        entries.extend(DeckCard(deck_id=deck.id, card_id=card_id) for card_id in card_ids)
+        if len(entries) >= 10000:
+            DeckCard.objects.bulk_create(entries, ignore_conflicts=True)
+            entries = []
+    DeckCard.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_useractivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeckCard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('card_id', models.PositiveIntegerField(db_index=True, verbose_name='ID карты')),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='card_index', to='users.deck', verbose_name='Колода')),
+            ],
+            options={
+                'verbose_name': 'Карта в колоде',
+                'verbose_name_plural': 'Индекс карт в колодах',
+                'constraints': [models.UniqueConstraint(fields=('card_id', 'deck'), name='unique_deck_card')],
+            },
+        ),
+        migrations.RunPython(build_deck_card_index, migrations.RunPython.noop),
+    ]
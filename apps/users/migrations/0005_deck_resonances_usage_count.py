@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_deckcard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deck',
+            name='is_anonymous',
+            field=models.BooleanField(default=False, verbose_name='Анонимная колода'),
+        ),
+        migrations.AddField(
+            model_name='deck',
+            name='resonances',
+            field=models.JSONField(blank=True, default=list, verbose_name='Резонансы'),
+        ),
+        migrations.AddField(
+            model_name='deck',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество использований'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-19 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_deck_resonances_usage_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSettings',
+            fields=[
+                ('chat_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Telegram Chat ID')),
+                ('deck_output', models.CharField(choices=[('progressive', 'Сводка и изображения по мере готовности'), ('album', 'Альбом'), ('collage', 'Коллаж')], max_length=16, verbose_name='Вывод нескольких колод')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Настройки чата',
+                'verbose_name_plural': 'Настройки чатов',
+            },
+        ),
+    ]
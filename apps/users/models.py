@@ -70,6 +70,19 @@ class Deck(models.Model):
         default=list,
         verbose_name="ID карт действий"
     )
+    resonances = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Резонансы"
+    )
+    usage_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество использований"
+    )
+    is_anonymous = models.BooleanField(
+        default=False,
+        verbose_name="Анонимная колода"
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Дата добавления"
@@ -94,6 +107,34 @@ class Deck(models.Model):
         return self.deck_code
 
 
+class DeckCard(models.Model):
+    """
+    Обратный индекс «карта → колоды». Строится из списков ID карт в `Deck`
+    и позволяет найти все колоды (и их отрендеренные изображения), которые
+    нужно обновить при изменении одной карты.
+    """
+    deck = models.ForeignKey(
+        Deck,
+        on_delete=models.CASCADE,
+        related_name='card_index',
+        verbose_name="Колода"
+    )
+    card_id = models.PositiveIntegerField(
+        db_index=True,
+        verbose_name="ID карты"
+    )
+
+    class Meta:
+        verbose_name = "Карта в колоде"
+        verbose_name_plural = "Индекс карт в колодах"
+        constraints = [
+            models.UniqueConstraint(fields=['card_id', 'deck'], name='unique_deck_card'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.card_id} → {self.deck_id}"
+
+
 class UserActivity(models.Model):
     """Модель для логирования действий пользователя."""
 
@@ -133,4 +174,34 @@ class UserActivity(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.user} - {self.get_activity_type_display()} at {self.created_at:%Y-%m-%d %H:%M}"
\ No newline at end of file
+        return f"{self.user} - {self.get_activity_type_display()} at {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class ChatSettings(models.Model):
+    """Настройки бота для конкретного чата (личного или группы)."""
+
+    class DeckOutput(models.TextChoices):
+        PROGRESSIVE = 'progressive', 'Сводка и изображения по мере готовности'
+        ALBUM = 'album', 'Альбом'
+        COLLAGE = 'collage', 'Коллаж'
+
+    chat_id = models.BigIntegerField(
+        primary_key=True,
+        verbose_name="Telegram Chat ID"
+    )
+    deck_output = models.CharField(
+        max_length=16,
+        choices=DeckOutput.choices,
+        verbose_name="Вывод нескольких колод"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения"
+    )
+
+    class Meta:
+        verbose_name = "Настройки чата"
+        verbose_name_plural = "Настройки чатов"
+
+    def __str__(self) -> str:
+        return f"Chat {self.chat_id}: {self.get_deck_output_display()}"
@@ -1,6 +1,11 @@
-from typing import Dict, Any
+import gzip
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, NamedTuple, Set, TextIO, Union
 
-from apps.users.models import TelegramUser, UserActivity
+from django.db.models import QuerySet
+
+from apps.users.models import TelegramUser, Deck, DeckCard, UserActivity
 
 
 async def log_user_activity(
@@ -20,4 +25,122 @@ async def log_user_activity(
         user=user,
         activity_type=activity_type,
         details=details
-    )
\ No newline at end of file
+    )
+
+
+def index_deck_cards(decks: Iterable[Deck]) -> int:
+    """
+    Синхронно добавляет колоды в обратный индекс «карта → колоды».
+    Повторная индексация безопасна: существующие пары пропускаются.
+    Возвращает количество подготовленных записей индекса.
+    """
+    entries: List[DeckCard] = []
+    for deck in decks:
+        card_ids: Set[int] = set(deck.character_card_ids) | set(deck.action_card_ids)
+        entries.extend(DeckCard(deck_id=deck.pk, card_id=card_id) for card_id in card_ids)
+    DeckCard.objects.bulk_create(entries, batch_size=2000, ignore_conflicts=True)
+    return len(entries)
+
+
+def decks_with_cards(card_ids: Iterable[int]) -> QuerySet:
+    """Возвращает колоды, содержащие хотя бы одну из указанных карт (по обратному индексу)."""
+    return Deck.objects.filter(card_index__card_id__in=list(card_ids)).distinct()
+
+
+# --- Формат файлов с колодами (`data/decks.csv`) ---
+
+DECK_CSV_FIELDS: List[str] = [
+    'id', 'deck_code', 'character_cards', 'action_cards', 'resonances', 'usage_count', 'created_at', 'anonymous',
+]
+DECK_CSV_REQUIRED_FIELDS: List[str] = ['deck_code', 'character_cards', 'action_cards', 'created_at']
+DECK_CSV_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def deck_file_format(path: Path) -> str:
+    """Определяет формат файла с колодами по расширению: 'ndjson' (.ndjson/.jsonl) или 'csv'."""
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    if suffixes and suffixes[-1] == '.gz':
+        suffixes.pop()
+    return 'ndjson' if suffixes and suffixes[-1] in ('.ndjson', '.jsonl') else 'csv'
+
+
+def open_deck_file(path: Path, mode: str) -> TextIO:
+    """
+    Открывает файл с колодами на чтение ('r') или запись ('w') в текстовом режиме.
+    Файлы с расширением .gz прозрачно (рас)паковываются. При чтении пропускается BOM.
+    """
+    encoding = 'utf-8-sig' if mode == 'r' else 'utf-8'
+    if path.suffix.lower() == '.gz':
+        return gzip.open(path, f"{mode}t", encoding=encoding, newline='')
+    return open(path, mode, encoding=encoding, newline='')
+
+
+class DeckRow(NamedTuple):
+    """Строка файла с колодами, приведенная к типам модели `Deck`."""
+    deck_code: str
+    character_card_ids: List[int]
+    action_card_ids: List[int]
+    resonances: List[str]
+    usage_count: int
+    is_anonymous: bool
+    created_at: datetime
+
+
+def _split_ids(value: Union[str, List[int]]) -> List[int]:
+    # В CSV списки хранятся строкой "1103,1113", в NDJSON — массивом чисел.
+    if isinstance(value, list):
+        return [int(card_id) for card_id in value]
+    return [int(id_str) for id_str in value.split(',') if id_str.strip().isdigit()]
+
+
+def _split_names(value: Union[str, List[str], None]) -> List[str]:
+    if isinstance(value, list):
+        return [str(name) for name in value]
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def parse_deck_row(row: Dict[str, Any]) -> DeckRow:
+    """
+    Разбирает строку CSV (или объект NDJSON) с колодой. Необязательные колонки
+    (`resonances`, `usage_count`, `anonymous`) могут отсутствовать.
+    При некорректных данных выбрасывает ValueError.
+    """
+    deck_code = (row.get('deck_code') or '').strip()
+    if not deck_code:
+        raise ValueError("пустой код колоды")
+    created_at = datetime.strptime(row['created_at'], DECK_CSV_DATETIME_FORMAT).replace(tzinfo=dt_timezone.utc)
+    return DeckRow(
+        deck_code=deck_code,
+        character_card_ids=_split_ids(row['character_cards']),
+        action_card_ids=_split_ids(row['action_cards']),
+        resonances=_split_names(row.get('resonances')),
+        usage_count=int(row.get('usage_count') or 0),
+        is_anonymous=str(row.get('anonymous') or '0').strip().lower() in ('1', 'true', 't'),
+        created_at=created_at,
+    )
+
+
+def deck_to_row(values: Dict[str, Any], as_json: bool = False) -> Dict[str, Any]:
+    """
+    Сериализует колоду (словарь из `values()`) в строку формата `data/decks.csv`.
+    Для NDJSON (`as_json=True`) списки сохраняются массивами, а числа — числами.
+    """
+    character_ids, action_ids, resonances = (
+        values['character_card_ids'], values['action_card_ids'], values['resonances']
+    )
+    created_at = values['created_at'].astimezone(dt_timezone.utc).strftime(DECK_CSV_DATETIME_FORMAT)
+    if as_json:
+        return {
+            'id': values['id'], 'deck_code': values['deck_code'],
+            'character_cards': character_ids, 'action_cards': action_ids, 'resonances': resonances,
+            'usage_count': values['usage_count'], 'created_at': created_at,
+            'anonymous': int(values['is_anonymous']),
+        }
+    return {
+        'id': values['id'], 'deck_code': values['deck_code'],
+        'character_cards': ",".join(map(str, character_ids)),
+        'action_cards': ",".join(map(str, action_ids)),
+        'resonances': ",".join(resonances),
+        'usage_count': values['usage_count'], 'created_at': created_at,
+        'anonymous': int(values['is_anonymous']),
+    }
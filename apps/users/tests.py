@@ -0,0 +1,283 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+import warnings
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from apps.users.management.commands.import_decks import ImportState
+from apps.users.models import Deck, DeckCard
+from apps.users.services import DECK_CSV_FIELDS, open_deck_file, parse_deck_row
+from core.db_routers import REPLICA_ALIAS, ReplicaRouter, read_alias, use_replica
+
+DECK_ROWS = [
+    {'deck_code': 'DECK-A', 'character_cards': '1103,1201,1303', 'action_cards': '311101,311101',
+     'resonances': 'Cryo', 'usage_count': '5', 'created_at': '2025-01-02 10:00:00', 'anonymous': '0'},
+    {'deck_code': 'DECK-B', 'character_cards': '1101,1102,1103', 'action_cards': '311201',
+     'resonances': '', 'usage_count': '1', 'created_at': '2025-02-03 11:30:00', 'anonymous': '1'},
+    # Повтор кода в той же пачке — колода добавляется один раз.
+    {'deck_code': 'DECK-B', 'character_cards': '1101,1102,1103', 'action_cards': '311201',
+     'resonances': '', 'usage_count': '1', 'created_at': '2025-02-03 11:30:00', 'anonymous': '1'},
+    {'deck_code': 'DECK-BAD', 'character_cards': '1101', 'action_cards': '311201',
+     'resonances': '', 'usage_count': '1', 'created_at': 'не дата', 'anonymous': '0'},
+    {'deck_code': 'DECK-C', 'character_cards': '1201,1202,1203', 'action_cards': '',
+     'resonances': 'Pyro,Liyue', 'usage_count': '0', 'created_at': '2025-03-04 12:45:00', 'anonymous': '0'},
+]
+
+
+def write_deck_csv(path: Path, rows: List[dict]) -> None:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=DECK_CSV_FIELDS, quoting=csv.QUOTE_ALL)
+    writer.writeheader()
+    for number, row in enumerate(rows, start=1):
+        writer.writerow({'id': number, **row})
+    if path.suffix == '.gz':
+        path.write_bytes(gzip.compress(buffer.getvalue().encode('utf-8')))
+    else:
+        path.write_text(buffer.getvalue(), encoding='utf-8')
+
+
+class ImportDecksTest(TestCase):
+    """Тестирует потоковый импорт колод (`import_decks`) через переносимую загрузку `bulk_create`."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+
+    def _import(self, path: Path, **options) -> str:
+        stdout = io.StringIO()
+        call_command(
+            'import_decks', path=str(path), method='upsert', chunk_size=2,
+            state_file=str(self.tmp / 'import.state.json'), stdout=stdout, stderr=io.StringIO(), **options
+        )
+        return stdout.getvalue()
+
+    def test_import_csv_and_gzip(self):
+        for name in ('decks.csv', 'decks.csv.gz'):
+            with self.subTest(file=name):
+                Deck.objects.all().delete()
+                path = self.tmp / name
+                write_deck_csv(path, DECK_ROWS)
+
+                output = self._import(path)
+
+                self.assertIn("Добавлено новых колод: 3", output)
+                self.assertIn("Пропущено (ошибки данных): 1", output)
+                self.assertEqual(
+                    dict(Deck.objects.values_list('deck_code', 'created_at')),
+                    {
+                        'DECK-A': datetime(2025, 1, 2, 10, 0, tzinfo=dt_timezone.utc),
+                        'DECK-B': datetime(2025, 2, 3, 11, 30, tzinfo=dt_timezone.utc),
+                        'DECK-C': datetime(2025, 3, 4, 12, 45, tzinfo=dt_timezone.utc),
+                    },
+                )
+                deck_a = Deck.objects.get(deck_code='DECK-A')
+                self.assertEqual(deck_a.action_card_ids, [311101, 311101])
+                self.assertEqual(
+                    set(DeckCard.objects.filter(deck=deck_a).values_list('card_id', flat=True)),
+                    {1103, 1201, 1303, 311101},
+                )
+                self.assertEqual(DeckCard.objects.count(), 11)
+
+                # Повторный запуск ничего не добавляет.
+                self.assertIn("Добавлено новых колод: 0", self._import(path))
+                self.assertEqual(Deck.objects.count(), 3)
+                self.assertEqual(DeckCard.objects.count(), 11)
+
+    def test_resume_from_saved_state(self):
+        path = self.tmp / 'decks.csv'
+        write_deck_csv(path, DECK_ROWS)
+        # Первая пачка (2 строки) уже зафиксирована прерванным импортом.
+        self._import_rows(DECK_ROWS[:2])
+        state = ImportState(self.tmp / 'import.state.json', path)
+        state.rows_committed, state.inserted = 2, 2
+        state.save()
+
+        output = self._import(path, resume=True)
+
+        self.assertIn("пропускается 2 уже обработанных строк", output)
+        self.assertIn("Добавлено новых колод: 3", output)
+        self.assertEqual(Deck.objects.count(), 3)
+        self.assertEqual(DeckCard.objects.count(), 11)
+        self.assertFalse((self.tmp / 'import.state.json').exists(), "После завершения состояние удаляется")
+
+    def test_changed_source_invalidates_state(self):
+        path = self.tmp / 'decks.csv'
+        write_deck_csv(path, DECK_ROWS)
+        state = ImportState(self.tmp / 'import.state.json', path)
+        state.rows_committed = 2
+        state.save()
+        self.assertTrue(ImportState(self.tmp / 'import.state.json', path).load())
+
+        write_deck_csv(path, DECK_ROWS[:2])
+        self.assertFalse(ImportState(self.tmp / 'import.state.json', path).load())
+
+        output = self._import(path, resume=True)
+        self.assertNotIn("Продолжение импорта", output)
+        self.assertEqual(set(Deck.objects.values_list('deck_code', flat=True)), {'DECK-A', 'DECK-B'})
+
+    def test_ndjson_invalid_lines_are_counted(self):
+        path = self.tmp / 'decks.ndjson'
+        path.write_text("\n".join([
+            json.dumps(DECK_ROWS[0]),
+            '{"deck_code": "BROKEN",',
+            '["not", "an", "object"]',
+            '',
+            json.dumps(DECK_ROWS[4]),
+        ]) + "\n", encoding='utf-8')
+
+        output = self._import(path)
+
+        self.assertIn("Добавлено новых колод: 2", output)
+        self.assertIn("Пропущено (ошибки данных): 2", output)
+        self.assertEqual(set(Deck.objects.values_list('deck_code', flat=True)), {'DECK-A', 'DECK-C'})
+
+    def _import_rows(self, rows: List[dict]) -> None:
+        path = self.tmp / 'first_chunk.csv'
+        write_deck_csv(path, rows)
+        self._import(path)
+
+
+class ExportDecksTest(TestCase):
+    """Тестирует выгрузку колод (`export_decks`) и обратную загрузку файла через `import_decks`."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        decks = [
+            ('DECK-A', [1103, 1201, 1303], [311101, 311101], ['Cryo'], 5, False, datetime(2025, 1, 2, 10, 0)),
+            ('DECK-B', [1101, 1102, 1103], [311201], [], 1, True, datetime(2025, 2, 3, 11, 30)),
+            ('DECK-C', [1201, 1202, 1203], [], ['Liyue', 'Pyro'], 0, False, datetime(2025, 3, 4, 12, 45)),
+        ]
+        for code, characters, actions, resonances, usage_count, anonymous, created_at in decks:
+            deck = Deck.objects.create(
+                deck_code=code, character_card_ids=characters, action_card_ids=actions,
+                resonances=resonances, usage_count=usage_count, is_anonymous=anonymous,
+            )
+            # `auto_now_add` не дает задать дату при создании.
+            Deck.objects.filter(pk=deck.pk).update(created_at=created_at.replace(tzinfo=dt_timezone.utc))
+
+    def _export(self, name: str, **options) -> Path:
+        call_command('export_decks', output=str(self.tmp / name), stdout=io.StringIO(), **options)
+        return self.tmp / name
+
+    def _snapshot(self):
+        return {
+            deck.deck_code: (
+                deck.character_card_ids, deck.action_card_ids, deck.resonances,
+                deck.usage_count, deck.is_anonymous, deck.created_at,
+            )
+            for deck in Deck.objects.all()
+        }
+
+    def test_round_trip(self):
+        expected = self._snapshot()
+        for name in ('decks.csv', 'decks.csv.gz', 'decks.ndjson'):
+            with self.subTest(file=name):
+                path = self._export(name)
+                if name.endswith('.csv') or name.endswith('.gz'):
+                    with open_deck_file(path, 'r') as f:
+                        reader = csv.DictReader(f)
+                        self.assertEqual(reader.fieldnames, DECK_CSV_FIELDS)
+                        rows = {row.deck_code: row for row in map(parse_deck_row, reader)}
+                    self.assertEqual(rows['DECK-B'].is_anonymous, True)
+                    self.assertEqual(rows['DECK-C'].resonances, ['Liyue', 'Pyro'])
+                    self.assertEqual(rows['DECK-A'].usage_count, 5)
+
+                Deck.objects.all().delete()
+                call_command(
+                    'import_decks', path=str(path), method='upsert', state_file=str(self.tmp / 'state.json'),
+                    stdout=io.StringIO(), stderr=io.StringIO(),
+                )
+                self.assertEqual(self._snapshot(), expected)
+
+    def test_since_until_filters(self):
+        path = self._export('period.csv', since='2025-02-01', until='2025-02-03')
+        with open_deck_file(path, 'r') as f:
+            self.assertEqual([row['deck_code'] for row in csv.DictReader(f)], ['DECK-B'])
+
+        path = self._export('since.csv.gz', since='2025-02-03 12:00:00')
+        with open_deck_file(path, 'r') as f:
+            self.assertEqual([row['deck_code'] for row in csv.DictReader(f)], ['DECK-C'])
+
+    def test_reads_from_read_alias_by_default(self):
+        with patch('apps.users.management.commands.export_decks.read_alias', wraps=read_alias) as alias:
+            self._export('default.csv')
+            alias.assert_called_once_with()
+            self._export('explicit.csv', database='default')
+            alias.assert_called_once_with()
+
+
+# Реплика-зеркало: роутеру важно только наличие алиаса в настройках.
+MIRRORED_DATABASES = {
+    **settings.DATABASES,
+    REPLICA_ALIAS: {**settings.DATABASES['default'], 'TEST': {'MIRROR': 'default'}},
+}
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    """Тестирует маршрутизацию чтения в реплику."""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    @contextmanager
+    def _with_replica(self):
+        # Django предупреждает о подмене DATABASES: соединения не пересоздаются, но роутеру они и не нужны.
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message="Overriding setting DATABASES")
+            with override_settings(DATABASES=MIRRORED_DATABASES):
+                yield
+
+    def test_reads_go_to_replica_only_inside_use_replica(self):
+        with self._with_replica():
+            self.assertEqual(read_alias(), REPLICA_ALIAS)
+            self.assertIsNone(self.router.db_for_read(Deck))
+            with use_replica():
+                self.assertEqual(self.router.db_for_read(Deck), REPLICA_ALIAS)
+                self.assertEqual(self.router.db_for_write(Deck), 'default')
+            self.assertIsNone(self.router.db_for_read(Deck))
+
+        # Без настроенной реплики `use_replica()` ничего не меняет.
+        self.assertEqual(read_alias(), 'default')
+        with use_replica():
+            self.assertIsNone(self.router.db_for_read(Deck))
+
+    def test_writes_and_migrations_use_default(self):
+        with self._with_replica(), use_replica():
+            self.assertEqual(self.router.db_for_write(Deck), 'default')
+            self.assertTrue(self.router.allow_migrate('default', 'users'))
+            self.assertFalse(self.router.allow_migrate(REPLICA_ALIAS, 'users'))
+
+
+class ReplicaReadAdminMixinTest(TestCase):
+    """Тестирует, что списки в админке читаются внутри `use_replica()`, а POST — нет."""
+
+    def test_changelist_get_uses_replica(self):
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        changelist_url = reverse('admin:users_deck_changelist')
+        entered = []
+
+        def spy():
+            entered.append(True)
+            return use_replica()
+
+        with patch('core.admin_mixins.use_replica', side_effect=spy):
+            self.assertEqual(self.client.get(changelist_url).status_code, 200)
+            self.assertEqual(len(entered), 1)
+            self.client.post(changelist_url, {'action': 'delete_selected', '_selected_action': []})
+            self.assertEqual(len(entered), 1)
@@ -0,0 +1,23 @@
+from django.http import HttpRequest
+from django.template.response import TemplateResponse
+
+from core.db_routers import use_replica
+
+
+class ReplicaReadAdminMixin:
+    """
+    Выполняет просмотр списка объектов в админке (GET) на реплике только для чтения.
+    Подходит для больших таблиц, которые пишет бот (колоды, пользователи, активность):
+    небольшое отставание реплики там незаметно, а тяжелые `COUNT` и фильтры не нагружают основную базу.
+    Действия над объектами (POST) выполняются как обычно на `default`.
+    """
+
+    def changelist_view(self, request: HttpRequest, extra_context: dict | None = None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with use_replica():
+            response = super().changelist_view(request, extra_context)
+            # Список объектов вычисляется при рендеринге шаблона, поэтому рендерим его внутри блока.
+            if isinstance(response, TemplateResponse) and not response.is_rendered:
+                response.render()
+        return response
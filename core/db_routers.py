@@ -0,0 +1,54 @@
+"""
+Маршрутизация запросов между основной базой и репликой только для чтения.
+
+По умолчанию все запросы идут в `default`. Чтение из реплики включается явно
+контекстным менеджером `use_replica()` для кода, которому допустимо небольшое
+отставание репликации: списки в админке, выгрузки и статистика.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+
+_use_replica: ContextVar[bool] = ContextVar('use_replica', default=False)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def read_alias() -> str:
+    """Алиас базы для тяжелого чтения: реплика, если она настроена, иначе `default`."""
+    return REPLICA_ALIAS if replica_configured() else 'default'
+
+
+@contextmanager
+def use_replica() -> Iterator[None]:
+    """Направляет чтение внутри блока в реплику (если она настроена). Запись всегда идет в `default`."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Роутер Django: чтение в реплику только внутри `use_replica()`, миграции только в `default`."""
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        if _use_replica.get() and replica_configured():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # Реплика содержит те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, model_name: Optional[str] = None, **hints) -> Optional[bool]:
+        return db == 'default'
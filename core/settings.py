@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'apps.cards',
     'apps.users',
     'apps.bot',
+    'apps.jobs',
 ]
 
 MIDDLEWARE = [
@@ -86,6 +87,40 @@ DATABASES = {
     }
 }
 
+# Пул соединений psycopg (Django 5.1+). Пул несовместим с постоянными соединениями,
+# поэтому при DB_POOL=True `CONN_MAX_AGE` всегда 0; иначе соединения живут `DB_CONN_MAX_AGE`
+# секунд и проверяются перед повторным использованием (`CONN_HEALTH_CHECKS`).
+DB_POOL = os.getenv('DB_POOL', 'False').lower() in ('true', '1', 't')
+if DB_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Реплика только для чтения. Если POSTGRES_REPLICA_HOST не задан, все запросы идут в `default`.
+# Остальные параметры подключения по умолчанию совпадают с основной базой.
+if os.getenv('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('POSTGRES_REPLICA_DB', DATABASES['default']['NAME']),
+        'USER': os.getenv('POSTGRES_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('POSTGRES_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('POSTGRES_REPLICA_HOST'),
+        'PORT': os.getenv('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Чтение из реплики включается явно (`core.db_routers.use_replica`): админские списки, выгрузки.
+# Бот и запись всегда работают с `default`, чтобы не видеть отставание репликации.
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -135,9 +170,96 @@ STORAGES = {
 # Настройки для медиа-файлов (загруженные/скачанные изображения).
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Сколько секунд админка доверяет закэшированным в памяти метаданным изображений карт
+# (хэш содержимого для URL превью в MEDIA_ROOT/thumbs). Изменения из админки применяются сразу.
+ADMIN_THUMBNAIL_TTL = float(os.getenv('ADMIN_THUMBNAIL_TTL', '300'))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Настройки для Телеграм-бота
 BOT_TOKEN = os.getenv('BOT_TOKEN')
-ADMIN_ID = int(os.getenv('ADMIN_ID')) if os.getenv('ADMIN_ID') and os.getenv('ADMIN_ID').isdigit() else None
\ No newline at end of file
+ADMIN_ID = int(os.getenv('ADMIN_ID')) if os.getenv('ADMIN_ID') and os.getenv('ADMIN_ID').isdigit() else None
+
+# Кэши рендера изображений в процессе бота.
+# Записи сбрасываются по событиям шины инвалидации (LISTEN/NOTIFY), поэтому могут жить долго.
+RENDER_TILE_CACHE_SIZE = int(os.getenv('RENDER_TILE_CACHE_SIZE', '1024'))
+# Максимальное количество готовых изображений колод в памяти бота.
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '256'))
+# Максимальное количество верхних полос (персонажи и резонансы, ~0,8 МБ каждая), общих для колод с одними персонажами.
+RENDER_TOP_BAND_CACHE_SIZE = int(os.getenv('RENDER_TOP_BAND_CACHE_SIZE', '64'))
+# Сколько самых популярных колод перерисовывать в фоне после изменения их карт (0 — отключено).
+RENDER_REFRESH_TOP_N = int(os.getenv('RENDER_REFRESH_TOP_N', '5'))
+# Снимок справочника карт и тайлов (MEDIA_ROOT/snapshot), который пишется после обновления карт
+# и командой `build_snapshot`. Бот и `renderworker` отображают тайлы из него в память при запуске.
+BOT_USE_SNAPSHOT = os.getenv('BOT_USE_SNAPSHOT', 'True').lower() in ('true', '1', 't')
+# Прогрев кэшей при запуске бота: 'off', 'blocking' (до приема апдейтов) или 'background'.
+# Загружает справочник карт, строит тайлы и рендерит BOT_WARMUP_TOP_DECKS самых популярных колод
+# (по обработкам за последние BOT_WARMUP_DAYS дней, затем по общему числу использований).
+BOT_WARMUP = os.getenv('BOT_WARMUP', 'background')
+BOT_WARMUP_TOP_DECKS = int(os.getenv('BOT_WARMUP_TOP_DECKS', '50'))
+BOT_WARMUP_DAYS = int(os.getenv('BOT_WARMUP_DAYS', '7'))
+# Кодирование изображений колод: формат (JPEG или WEBP), качество, оптимизация таблиц Хаффмана
+# и субдискретизация цвета JPEG (4:4:4, 4:2:2, 4:2:0). Если RENDER_MAX_BYTES > 0, качество
+# понижается (не ниже 50), пока файл не уложится в бюджет. Варианты сравнивает `bench_render --encoders`.
+RENDER_FORMAT = os.getenv('RENDER_FORMAT', 'JPEG')
+RENDER_QUALITY = int(os.getenv('RENDER_QUALITY', '90'))
+RENDER_OPTIMIZE = os.getenv('RENDER_OPTIMIZE', 'True').lower() in ('true', '1', 't')
+RENDER_SUBSAMPLING = os.getenv('RENDER_SUBSAMPLING', '4:2:0')
+RENDER_MAX_BYTES = int(os.getenv('RENDER_MAX_BYTES', '0'))
+# Прогрессивная отправка для сообщений с несколькими кодами: сначала текстовая сводка,
+# затем изображения небольшими партиями по мере готовности. False — один альбом в конце.
+BOT_PROGRESSIVE_DELIVERY = os.getenv('BOT_PROGRESSIVE_DELIVERY', 'True').lower() in ('true', '1', 't')
+
+# HTTP-эндпоинт `/metrics` (формат Prometheus) в процессе бота. Порт 0 отключает эндпоинт.
+# Эндпоинт без авторизации: 0.0.0.0 — адрес внутри контейнера, на хосте порт опубликован только на 127.0.0.1.
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+# Мониторинг задержки event loop бота: период замера и порог, после которого снимается стек
+# заблокированного потока (в секундах). Период 0 отключает мониторинг.
+LOOP_MONITOR_INTERVAL = float(os.getenv('LOOP_MONITOR_INTERVAL', '0.1'))
+LOOP_LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', '0.25'))
+# Доля сообщений с кодами колод, обработка которых профилируется (0 — отключено, 1 — все).
+# Профили сохраняются в MEDIA_ROOT/profiles; сводку строит команда `profile_report`.
+BOT_PROFILE_SAMPLE_RATE = float(os.getenv('BOT_PROFILE_SAMPLE_RATE', '0'))
+
+# Нативный асинхронный доступ к PostgreSQL (psycopg_pool) для горячего пути бота вместо Django ORM.
+# Админка и management-команды всегда используют ORM.
+BOT_NATIVE_DB = os.getenv('BOT_NATIVE_DB', 'False').lower() in ('true', '1', 't')
+BOT_DB_POOL_MIN_SIZE = int(os.getenv('BOT_DB_POOL_MIN_SIZE', '2'))
+BOT_DB_POOL_MAX_SIZE = int(os.getenv('BOT_DB_POOL_MAX_SIZE', '10'))
+
+# Лимиты исходящих запросов к Telegram (сообщений в секунду): на весь бот, на личный чат и на группу.
+# Telegram допускает около 30 сообщений/с на бота, 1 сообщение/с в чат и 20 сообщений/мин в группу.
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_GROUP_RATE = float(os.getenv('TELEGRAM_GROUP_RATE', '0.33'))
+# Сколько сообщений подряд можно отправить в чат без ожидания.
+TELEGRAM_CHAT_BURST = float(os.getenv('TELEGRAM_CHAT_BURST', '5'))
+# Сколько раз повторять запрос после ответа 429 (retry_after).
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', '3'))
+
+# Контроль допуска сообщений с кодами колод: число параллельно обрабатываемых сообщений
+# (0 — без очереди и лимитов), размер очереди ожидания и лимит кодов на пользователя
+# (кодов в секунду и запас, который можно израсходовать сразу).
+ADMISSION_WORKERS = int(os.getenv('ADMISSION_WORKERS', '4'))
+ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', '200'))
+ADMISSION_USER_RATE = float(os.getenv('ADMISSION_USER_RATE', '0.5'))
+ADMISSION_USER_BURST = float(os.getenv('ADMISSION_USER_BURST', '40'))
+
+# Способ получения апдейтов: 'polling' (long polling) или 'webhook' (HTTP-сервер aiohttp).
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+# Публичный адрес, на который Telegram будет отправлять апдейты (https://bot.example.com), и путь обработчика.
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+# Адрес и порт, на которых бот слушает вебхук внутри контейнера (за обратным прокси с TLS).
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+# Секрет заголовка X-Telegram-Bot-Api-Secret-Token. Если не задан, выводится из BOT_TOKEN.
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# Сколько секунд при остановке ждать обработки уже принятых сообщений.
+BOT_DRAIN_TIMEOUT = float(os.getenv('BOT_DRAIN_TIMEOUT', '30'))
+
+# Рендер изображений колод в отдельных процессах `renderworker` (очередь в таблице RenderJob).
+# Если воркеры не ответили за REMOTE_RENDER_TIMEOUT секунд, бот рендерит колоду сам.
+BOT_REMOTE_RENDER = os.getenv('BOT_REMOTE_RENDER', 'False').lower() in ('true', '1', 't')
+REMOTE_RENDER_TIMEOUT = float(os.getenv('REMOTE_RENDER_TIMEOUT', '30'))